@@ -0,0 +1,31 @@
+"""Add chat_summaries table
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_summaries',
+    sa.Column('chat_id', sa.String(length=255), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=False),
+    sa.Column('summarized_until', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['chat_id'], ['processing_jobs.chat_id'], ),
+    sa.PrimaryKeyConstraint('chat_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('chat_summaries')
@@ -0,0 +1,27 @@
+"""Add composite index for chat history reads and keyset pagination
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-02-15 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_chat_history_chat_created_message',
+        'chat_history',
+        ['chat_id', 'created_at', 'message_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_history_chat_created_message', table_name='chat_history')
@@ -1,9 +1,14 @@
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from app.services.llm_service import LLMService
+from app.services.llm_resilience import LLMUnavailableError
 from app.services.rag_service import RAGService
 from app.services.chat_service import ChatService
+from app.services.message_writer import message_writer
+from app.services.metrics import timed_node
+from app.config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,10 +18,13 @@ class AgentState(TypedDict):
     """Estado del agente que se pasa entre nodos"""
     question: str
     chat_history: List[tuple[str, str]]
+    history_summary: str
     intent: str
     documents: List[Dict[str, Any]]
     response: str
     chat_id: str
+    search_chat_ids: List[str]  # chat_id y otros chats cuya documentación se consulta
+    chat_service: ChatService  # Servicio con la sesión de base de datos de la petición
 
 
 class DocumentationAgent:
@@ -25,22 +33,21 @@ class DocumentationAgent:
     def __init__(self):
         self.llm_service = LLMService()
         self.rag_service = RAGService()
-        self.chat_service = ChatService()
         self.graph = self._build_graph()
     
     def _build_graph(self) -> StateGraph:
         """Construir el grafo de LangGraph"""
         workflow = StateGraph(AgentState)
         
-        # Agregar nodos
-        workflow.add_node("input_node", self._input_node)
-        workflow.add_node("intent_analysis_node", self._intent_analysis_node)
-        workflow.add_node("rag_node", self._rag_node)
-        workflow.add_node("code_analysis_node", self._code_analysis_node)
-        workflow.add_node("response_generation_node", self._response_generation_node)
-        workflow.add_node("code_formatting_node", self._code_formatting_node)
-        workflow.add_node("memory_node", self._memory_node)
-        workflow.add_node("clarification_node", self._clarification_node)
+        # Agregar nodos (cada uno mide su duración en /metrics)
+        workflow.add_node("input_node", timed_node("input_node", self._input_node))
+        workflow.add_node("intent_analysis_node", timed_node("intent_analysis_node", self._intent_analysis_node))
+        workflow.add_node("rag_node", timed_node("rag_node", self._rag_node))
+        workflow.add_node("code_analysis_node", timed_node("code_analysis_node", self._code_analysis_node))
+        workflow.add_node("response_generation_node", timed_node("response_generation_node", self._response_generation_node))
+        workflow.add_node("code_formatting_node", timed_node("code_formatting_node", self._code_formatting_node))
+        workflow.add_node("memory_node", timed_node("memory_node", self._memory_node))
+        workflow.add_node("clarification_node", timed_node("clarification_node", self._clarification_node))
         
         # Agregar enrutamiento condicional
         workflow.add_conditional_edges(
@@ -54,6 +61,7 @@ class DocumentationAgent:
         )
         
         # Agregar edges
+        workflow.set_entry_point("input_node")
         workflow.add_edge("input_node", "intent_analysis_node")
         workflow.add_edge("rag_node", "response_generation_node")
         workflow.add_edge("code_analysis_node", "response_generation_node")
@@ -69,12 +77,22 @@ class DocumentationAgent:
         chat_id = state["chat_id"]
         question = state["question"]
         
-        # Cargar historial de chat
-        chat_history = self.chat_service.get_chat_history(chat_id)
+        # Cargar los últimos intercambios y el resumen de los anteriores
+        chat_service = state["chat_service"]
+        chat_history = await chat_service.get_chat_history(chat_id)
+        history_summary = await chat_service.get_history_summary(chat_id)
+        # No retener la conexión mientras se consulta el RAG y el LLM
+        await chat_service.release_connection()
+        
+        # Incluir intercambios encolados que aún no se han escrito en la base de datos
+        pending = message_writer.pending_exchanges(chat_id)
+        if pending:
+            chat_history = (chat_history + pending)[-settings.chat_history_window:]
         
         return {
             **state,
-            "chat_history": chat_history
+            "chat_history": chat_history,
+            "history_summary": history_summary
         }
     
     async def _intent_analysis_node(self, state: AgentState) -> AgentState:
@@ -106,8 +124,14 @@ class DocumentationAgent:
         question = state["question"]
         chat_id = state["chat_id"]
         
-        # Recuperar documentos usando RAG
-        documents = self.rag_service.retrieve_documents(question, chat_id)
+        # Recuperar documentos usando RAG (en paralelo si hay varios chats)
+        if len(state["search_chat_ids"]) > 1:
+            documents = await asyncio.to_thread(
+                self.rag_service.retrieve_from_collections, question, state["search_chat_ids"]
+            )
+        else:
+            # Embeber la pregunta y consultar Chroma bloquean: fuera del event loop
+            documents = await asyncio.to_thread(self.rag_service.retrieve_documents, question, chat_id)
         
         return {
             **state,
@@ -120,7 +144,12 @@ class DocumentationAgent:
         chat_id = state["chat_id"]
         
         # Recuperar documentos específicos de código
-        documents = self.rag_service.retrieve_code_documents(question, chat_id)
+        if len(state["search_chat_ids"]) > 1:
+            documents = await asyncio.to_thread(
+                self.rag_service.retrieve_code_from_collections, question, state["search_chat_ids"]
+            )
+        else:
+            documents = await asyncio.to_thread(self.rag_service.retrieve_code_documents, question, chat_id)
         
         return {
             **state,
@@ -136,14 +165,14 @@ class DocumentationAgent:
         # Formatear contexto
         context = self.rag_service.format_context(documents)
         
-        # Formatear historial
-        history_text = ""
-        if chat_history:
-            history_parts = []
-            for user_msg, agent_msg in chat_history[-3:]:  # Últimos 3 intercambios
-                history_parts.append(f"Usuario: {user_msg}")
-                history_parts.append(f"Asistente: {agent_msg}")
-            history_text = "\n".join(history_parts)
+        # Formatear historial: resumen de lo anterior + últimos intercambios
+        history_parts = []
+        if state.get("history_summary"):
+            history_parts.append(f"Resumen de la conversación anterior:\n{state['history_summary']}")
+        for user_msg, agent_msg in chat_history:
+            history_parts.append(f"Usuario: {user_msg}")
+            history_parts.append(f"Asistente: {agent_msg}")
+        history_text = "\n".join(history_parts)
         
         # Generar prompt
         prompt = f"""
@@ -164,8 +193,8 @@ class DocumentationAgent:
         Responde de manera útil y concisa:
         """
         
-        # Generar respuesta
-        response = await self.llm_service.generate_response(prompt)
+        # Generar respuesta con el modelo configurado para la intención
+        response = await self.llm_service.generate_response(prompt, route=state["intent"])
         
         return {
             **state,
@@ -205,16 +234,14 @@ class DocumentationAgent:
         }
     
     async def _memory_node(self, state: AgentState) -> AgentState:
-        """Nodo de memoria: guardar en base de datos"""
+        """Nodo de memoria: encolar el intercambio para guardarlo en segundo plano"""
         question = state["question"]
         response = state["response"]
         chat_id = state["chat_id"]
         
-        # Guardar mensaje del usuario
-        self.chat_service.save_message(chat_id, "user", question)
-        
-        # Guardar respuesta del agente
-        self.chat_service.save_message(chat_id, "agent", response)
+        # La cola write-behind guarda pregunta y respuesta en una transacción
+        # y actualiza el resumen después de devolver la respuesta
+        await message_writer.enqueue(chat_id, question, response)
         
         return state
     
@@ -227,11 +254,18 @@ class DocumentationAgent:
             "response": response
         }
     
-    async def process_question(self, question: str, chat_id: str) -> str:
-        """Procesar una pregunta del usuario"""
+    async def process_question(
+        self, question: str, chat_id: str, chat_service: ChatService, extra_chat_ids: Optional[List[str]] = None
+    ) -> str:
+        """
+        Procesar una pregunta del usuario
+        
+        Con ``extra_chat_ids`` la pregunta se responde también con la
+        documentación de esos chats (p.ej. los plugins de un framework).
+        """
         try:
             # Verificar estado de procesamiento
-            status = self.chat_service.check_processing_status(chat_id)
+            status = await chat_service.check_processing_status(chat_id)
             if status != "COMPLETED":
                 if status == "PENDING" or status == "IN_PROGRESS":
                     return "La documentación aún se está procesando. Por favor, espera un momento y vuelve a intentar."
@@ -240,14 +274,24 @@ class DocumentationAgent:
                 else:
                     return "No se encontró documentación procesada para este chat. Por favor, procesa una documentación primero."
             
+            extra_chat_ids = [extra for extra in dict.fromkeys(extra_chat_ids or []) if extra != chat_id]
+            if extra_chat_ids:
+                jobs = {job.chat_id: job.status for job in await chat_service.get_processing_jobs(extra_chat_ids)}
+                not_ready = [extra for extra in extra_chat_ids if jobs.get(extra) != "COMPLETED"]
+                if not_ready:
+                    return f"La documentación de estos chats no está disponible: {', '.join(not_ready)}. Procésala primero o quítalos de la consulta."
+            
             # Estado inicial
             initial_state = AgentState(
                 question=question,
                 chat_history=[],
+                history_summary="",
                 intent="",
                 documents=[],
                 response="",
-                chat_id=chat_id
+                chat_id=chat_id,
+                search_chat_ids=[chat_id] + extra_chat_ids,
+                chat_service=chat_service
             )
             
             # Ejecutar grafo
@@ -255,6 +299,9 @@ class DocumentationAgent:
             
             return final_state["response"]
             
+        except LLMUnavailableError:
+            # El llamador decide cómo informar de la indisponibilidad (HTTP 503)
+            raise
         except Exception as e:
             logger.error(f"Error processing question: {str(e)}")
             return f"Lo siento, hubo un error procesando tu pregunta: {str(e)}" 
\ No newline at end of file
@@ -1,5 +1,9 @@
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_ready
+from prometheus_client import multiprocess, start_http_server
 from app.config import settings
+from app.services.metrics import metrics_registry
+import os
 
 # Crear instancia de Celery
 celery_app = Celery(
@@ -21,4 +25,44 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutos
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-) 
\ No newline at end of file
+    # Prioridades en Redis: 0 (interactiva) se sirve antes que 6 (lote)
+    task_default_priority=3,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+)
+
+# Enrutado por tipo de carga: cada cola se escala con su propio pool de workers
+#   celery -A app.celery_app worker -Q io -P threads -c 50      (descarga)
+#   celery -A app.celery_app worker -Q cpu -P prefork            (embeddings, un proceso por núcleo)
+celery_app.conf.task_default_queue = settings.celery_io_queue
+celery_app.conf.task_routes = {
+    "app.tasks.processing_tasks.fetch_documentation_task": {"queue": settings.celery_io_queue},
+    "app.tasks.processing_tasks.embed_documentation_task": {"queue": settings.celery_cpu_queue},
+    "app.tasks.processing_tasks.maintain_collections_task": {"queue": settings.celery_cpu_queue},
+    "app.tasks.processing_tasks.rebalance_collections_task": {"queue": settings.celery_cpu_queue},
+}
+
+# Tareas periódicas (celery -A app.celery_app beat): ciclo de vida de las colecciones
+celery_app.conf.beat_schedule = {
+    "maintain-collections": {
+        "task": "app.tasks.processing_tasks.maintain_collections_task",
+        "schedule": settings.collection_maintenance_interval_seconds,
+    },
+}
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """Exponer las métricas del worker (las mismas que /metrics en la API)"""
+    if settings.celery_metrics_port:
+        start_http_server(settings.celery_metrics_port, registry=metrics_registry())
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    """Descartar los ficheros de métricas de los procesos hijo que terminan (prefork)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -1,7 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from app.models.database import get_db, engine
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import AsyncSessionLocal, get_async_db, get_pool_status, engine
 from app.models import Base
 from app.schemas import (
     ProcessDocumentationRequest,
@@ -9,20 +12,35 @@ from app.schemas import (
     ChatRequest,
     ChatResponse,
     ChatHistoryResponse,
-    ProcessingStatusResponse
+    ProcessingStatusResponse,
+    BatchProcessRequest,
+    BatchProcessResponse,
+    BatchStatusResponse
 )
 from app.services.chat_service import ChatService
-from app.agents.documentation_agent import DocumentationAgent
-from app.tasks.processing_tasks import process_documentation_task
+from app.services.llm_resilience import LLMUnavailableError
+from app.services.message_writer import message_writer
+from app.services.metrics import CONTENT_TYPE_LATEST, render_metrics
+from app.services.warmup import ComponentUnavailableError, LazyComponent, readiness, warm_up
+from app.services.progress import load_progress, stream_progress
+from app.services.ingestion_registry import IdempotencyKeyMismatchError, ingestion_registry, request_fingerprint
+from app.services.collection_lifecycle import collection_lifecycle
+from app.services.snapshots import SnapshotError, export_snapshot, import_snapshot
+from app.services.vector_store import is_missing_collection
+from app.tasks.processing_tasks import start_ingestion
 from app.config import settings
+import asyncio
+import json
 import logging
+import os
+import tempfile
+import uuid
 
 # Configurar logging
 logging.basicConfig(level=getattr(logging, settings.log_level))
 logger = logging.getLogger(__name__)
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+EXPORT_PAGE_SIZE = 500
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -40,9 +58,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar servicios
-chat_service = ChatService()
-documentation_agent = DocumentationAgent()
+
+def _create_tables():
+    """Crear tablas (en producción las gestiona alembic)"""
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _build_agent():
+    """Cargar el modelo de embeddings, ChromaDB y los clientes de LLM"""
+    from app.agents.documentation_agent import DocumentationAgent
+    
+    return DocumentationAgent()
+
+
+# Componentes pesados: nada se conecta ni se carga al importar el módulo. Se
+# inician en segundo plano al arrancar y /ready refleja su estado.
+database = LazyComponent("database", _create_tables)
+documentation_agent = LazyComponent("documentation_agent", _build_agent)
+COMPONENTS = [database, documentation_agent]
+_warmup_task: Optional[asyncio.Task] = None
+
+
+async def get_chat_service(db: AsyncSession = Depends(get_async_db)) -> ChatService:
+    """Dependency: servicio de chat sobre la sesión de la petición"""
+    return ChatService(db)
+
+
+async def get_documentation_agent():
+    """Dependency: agente listo (espera a que termine su warm-up si está en curso)"""
+    try:
+        return await documentation_agent.get()
+    except ComponentUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.on_event("startup")
+async def startup():
+    """Arrancar la escritura en segundo plano del historial y el warm-up"""
+    global _warmup_task
+    await message_writer.start()
+    if settings.warmup_on_startup:
+        _warmup_task = asyncio.create_task(warm_up(COMPONENTS, retry_seconds=settings.warmup_retry_seconds))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Persistir los mensajes pendientes antes de salir"""
+    if _warmup_task and not _warmup_task.done():
+        _warmup_task.cancel()
+    await message_writer.stop()
 
 
 @app.get("/")
@@ -61,48 +126,206 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready_check():
+    """
+    Readiness: 200 cuando la base de datos y el agente están listos y la
+    escritura del historial sigue activa, 503 mientras se inician (o si
+    fallaron), con el estado de cada componente
+    """
+    state = readiness(COMPONENTS + [message_writer])
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ready" if state["ready"] else "warming_up", "components": state["components"]}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato Prometheus"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/api/v1/process-documentation", response_model=ProcessDocumentationResponse)
 async def process_documentation(
     request: ProcessDocumentationRequest,
-    db: Session = Depends(get_db)
+    chat_service: ChatService = Depends(get_chat_service),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Procesar documentación desde una URL
     
+    Un reenvío para un chat que ya se está procesando se une a la tarea en
+    curso, y varios chats que piden la misma URL a la vez comparten una sola
+    ingesta. Con la cabecera `Idempotency-Key` los reintentos devuelven la
+    respuesta original; reutilizar la clave con otra petición devuelve 422.
+    
     - **url**: URL de la documentación a procesar
     - **chatId**: ID único del chat
+    - **priority**: interactive (por defecto), normal o batch
     """
+    fingerprint = request_fingerprint({"url": str(request.url), "chatId": request.chatId, "priority": request.priority})
     try:
-        # Crear trabajo de procesamiento
-        success = chat_service.create_processing_job(request.chatId, str(request.url))
-        if not success:
-            raise HTTPException(status_code=500, detail="Error creating processing job")
+        if idempotency_key:
+            cached = await ingestion_registry.get_idempotent_response(idempotency_key, fingerprint)
+            if cached:
+                return ProcessDocumentationResponse(**cached)
         
-        # Lanzar tarea de Celery
-        task = process_documentation_task.delay(str(request.url), request.chatId)
+        response = await _submit_ingestion(chat_service, request.chatId, str(request.url), request.priority)
         
-        logger.info(f"Processing task started for chat_id: {request.chatId}, task_id: {task.id}")
+        if idempotency_key:
+            await ingestion_registry.store_idempotent_response(idempotency_key, fingerprint, response.model_dump())
+        return response
         
-        return ProcessDocumentationResponse(
-            message="Processing started",
-            status="IN_PROGRESS",
-            chatId=request.chatId
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting processing: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/v1/process-documentation/batch", response_model=BatchProcessResponse)
+async def process_documentation_batch(
+    request: BatchProcessRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """
+    Procesar varias URLs en un solo envío
+    
+    Los trabajos se encolan con prioridad `batch` por defecto, de modo que las
+    peticiones interactivas se adelantan. Las descargas respetan los límites
+    de concurrencia e intervalo por dominio. Un error en un elemento no
+    impide encolar el resto.
+    
+    - **items**: lista de `{url, chatId}`
+    - **priority**: interactive, normal o batch (por defecto)
+    - **batchId**: ID del lote; si se omite se genera uno
+    """
+    chat_ids = [item.chatId for item in request.items]
+    if len(set(chat_ids)) != len(chat_ids):
+        raise HTTPException(status_code=400, detail="Duplicate chatId in batch")
+    
+    batch_id = request.batchId or str(uuid.uuid4())
+    try:
+        await ingestion_registry.add_to_batch(batch_id, chat_ids)
+    except Exception as e:
+        logger.error(f"Error registering batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    jobs = []
+    for item in request.items:
+        try:
+            jobs.append(await _submit_ingestion(chat_service, item.chatId, str(item.url), request.priority))
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Error starting processing for chat_id {item.chatId} in batch {batch_id}: {detail}")
+            jobs.append(ProcessDocumentationResponse(message=detail, status="FAILED", chatId=item.chatId))
+    
+    logger.info(f"Batch {batch_id} submitted with {len(jobs)} jobs")
+    return BatchProcessResponse(batchId=batch_id, jobs=jobs)
+
+
+@app.get("/api/v1/batches/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(batch_id: str, chat_service: ChatService = Depends(get_chat_service)):
+    """
+    Progreso agregado de un lote
+    
+    - **batch_id**: ID devuelto al enviar el lote
+    """
+    try:
+        chat_ids = await ingestion_registry.get_batch(batch_id)
+        if not chat_ids:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        
+        jobs = {job.chat_id: job for job in await chat_service.get_processing_jobs(chat_ids)}
+        progress = await load_progress(chat_ids)
+        
+        counts = {status: 0 for status in ("PENDING", "IN_PROGRESS", "COMPLETED", "FAILED")}
+        items = []
+        for chat_id in chat_ids:
+            job = jobs.get(chat_id)
+            status = job.status if job else "FAILED"
+            counts[status] = counts.get(status, 0) + 1
+            items.append({"chatId": chat_id, "status": status, "source_url": job.source_url if job else None})
+        
+        # Un trabajo desalojado (EVICTED) también terminó en su momento
+        finished = len(chat_ids) - counts["PENDING"] - counts["IN_PROGRESS"]
+        return BatchStatusResponse(
+            batchId=batch_id,
+            status="COMPLETED" if finished == len(chat_ids) else "IN_PROGRESS",
+            total=len(chat_ids),
+            counts=counts,
+            progress=round(finished / len(chat_ids), 4),
+            chunks_total=sum(p.get("chunks_total", 0) for p in progress.values()),
+            chunks_embedded=sum(p.get("chunks_embedded", 0) for p in progress.values()),
+            jobs=items
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error starting processing: {str(e)}")
+        logger.error(f"Error getting batch status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _submit_ingestion(chat_service: ChatService, chat_id: str, url: str, priority: str) -> ProcessDocumentationResponse:
+    """Unirse a la ingesta en curso del chat o empezar una nueva"""
+    task_id = str(uuid.uuid4())
+    running = await ingestion_registry.claim_chat(chat_id, url, task_id)
+    if running:
+        logger.info(f"Chat {chat_id} already processing, attached to task {running['task_id']}")
+        return ProcessDocumentationResponse(
+            message="Processing already in progress",
+            status="IN_PROGRESS",
+            chatId=chat_id,
+            taskId=running["task_id"],
+            deduplicated=True
+        )
+    return await _start_ingestion(chat_service, chat_id, url, task_id, priority)
+
+
+async def _start_ingestion(chat_service: ChatService, chat_id: str, url: str, task_id: str, priority: str) -> ProcessDocumentationResponse:
+    """Crear el trabajo y lanzar la tarea, o unirse a la ingesta en curso de la misma URL"""
+    is_leader = False
+    try:
+        # Crear (o reiniciar) trabajo de procesamiento
+        success = await chat_service.upsert_processing_job(chat_id, url)
+        if not success:
+            raise HTTPException(status_code=500, detail="Error creating processing job")
+        
+        is_leader, leader_task_id = await ingestion_registry.join_url(url, chat_id, task_id)
+        if is_leader:
+            # Lanzar tarea de Celery
+            start_ingestion(url, chat_id, task_id, priority)
+            logger.info(f"Processing task started for chat_id: {chat_id}, task_id: {task_id}")
+        else:
+            logger.info(f"Chat {chat_id} shares ingestion of {url} with task {leader_task_id}")
+    except Exception:
+        await ingestion_registry.release_chat_async(chat_id, task_id)
+        if is_leader:
+            await ingestion_registry.release_url_async(url)
+        raise
+    
+    return ProcessDocumentationResponse(
+        message="Processing started" if is_leader else "Attached to ingestion in progress for the same URL",
+        status="IN_PROGRESS",
+        chatId=chat_id,
+        taskId=leader_task_id,
+        deduplicated=not is_leader
+    )
+
+
 @app.get("/api/v1/processing-status/{chat_id}", response_model=ProcessingStatusResponse)
-async def get_processing_status(chat_id: str, db: Session = Depends(get_db)):
+async def get_processing_status(chat_id: str, chat_service: ChatService = Depends(get_chat_service)):
     """
     Obtener el estado de procesamiento de un chat
     
     - **chat_id**: ID del chat
     """
     try:
-        job = chat_service.get_processing_job(chat_id)
+        job = await chat_service.get_processing_job(chat_id)
         if not job:
             raise HTTPException(status_code=404, detail="Chat not found")
         
@@ -119,61 +342,232 @@ async def get_processing_status(chat_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/processing-progress/{chat_id}")
+async def stream_processing_progress(chat_id: str):
+    """
+    Progreso de la ingesta en tiempo real (Server-Sent Events)
+    
+    Emite un evento `progress` con páginas descargadas, chunks embebidos y ETA
+    en cada avance, y termina cuando el procesamiento finaliza (con un único
+    evento si ya había terminado, desalojado incluido).
+    
+    - **chat_id**: ID del chat
+    """
+    # Sesión corta: la respuesta puede durar minutos y no debe retener una conexión
+    async with AsyncSessionLocal() as session:
+        job = await ChatService(session).get_processing_job(chat_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    async def event_stream():
+        async for event in stream_progress(chat_id, job.status):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/api/v1/chats/{chat_id}")
+async def delete_chat(chat_id: str, chat_service: ChatService = Depends(get_chat_service)):
+    """
+    Eliminar un chat: su colección de ChromaDB, su historial y su trabajo de procesamiento
+    
+    Devuelve 409 si la documentación del chat se está procesando.
+    
+    - **chat_id**: ID del chat
+    """
+    owner = f"delete:{uuid.uuid4()}"
+    running = await ingestion_registry.claim_chat(chat_id, None, owner)
+    if running:
+        raise HTTPException(status_code=409, detail="Processing in progress")
+    try:
+        collection_deleted = await asyncio.to_thread(collection_lifecycle.delete_collection, chat_id)
+        rows_deleted = await chat_service.delete_chat(chat_id)
+        if not (collection_deleted or rows_deleted):
+            raise HTTPException(status_code=404, detail="Chat not found")
+        
+        logger.info(f"Deleted chat {chat_id}")
+        return {"chatId": chat_id, "status": "DELETED"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting chat: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await ingestion_registry.release_chat_async(chat_id, owner)
+
+
+@app.get("/api/v1/chats/{chat_id}/snapshot")
+async def export_chat_snapshot(chat_id: str):
+    """
+    Exportar la documentación procesada de un chat como snapshot (zip)
+    
+    El snapshot contiene los chunks, sus metadatos y sus embeddings, y se
+    importa en otra instancia con el mismo modelo de embeddings sin volver a
+    descargar ni embeber la documentación.
+    
+    - **chat_id**: ID del chat
+    """
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as destination:
+            await asyncio.to_thread(export_snapshot, chat_id, destination)
+    except Exception as e:
+        os.remove(path)
+        if is_missing_collection(e):
+            raise HTTPException(status_code=404, detail="Chat not found")
+        logger.error(f"Error exporting snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return FileResponse(
+        path, media_type="application/zip", filename=f"{chat_id}.snapshot.zip",
+        background=BackgroundTask(os.remove, path)
+    )
+
+
+@app.post("/api/v1/chats/{chat_id}/snapshot")
+async def import_chat_snapshot(chat_id: str, request: Request):
+    """
+    Importar un snapshot (cuerpo de la petición, application/zip) en un chat
+    
+    Reemplaza la documentación del chat y lo deja en estado COMPLETED. Devuelve
+    409 si el chat se está procesando, 413 si el snapshot supera
+    `SNAPSHOT_MAX_BYTES` y 422 si está dañado o sus embeddings son de otro modelo.
+    
+    - **chat_id**: ID del chat
+    """
+    owner = f"snapshot:{uuid.uuid4()}"
+    running = await ingestion_registry.claim_chat(chat_id, None, owner)
+    if running:
+        raise HTTPException(status_code=409, detail="Processing in progress")
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=settings.snapshot_spool_bytes) as upload:
+            size = 0
+            async for data in request.stream():
+                size += len(data)
+                if size > settings.snapshot_max_bytes:
+                    raise HTTPException(status_code=413, detail="Snapshot too large")
+                upload.write(data)
+            upload.seek(0)
+            manifest = await asyncio.to_thread(import_snapshot, chat_id, upload)
+        
+        # Sesión corta: la subida y la carga del snapshot no retienen una conexión
+        async with AsyncSessionLocal() as session:
+            recorded = await ChatService(session).upsert_processing_job(chat_id, manifest["source_url"], status="COMPLETED")
+        if not recorded:
+            raise HTTPException(status_code=500, detail="Could not record the imported chat")
+        logger.info(f"Imported snapshot into chat {chat_id}")
+        return {
+            "chatId": chat_id,
+            "status": "COMPLETED",
+            "chunks": manifest["count"],
+            "embeddingModel": manifest["embedding_model"],
+            "sourceUrl": manifest["source_url"]
+        }
+        
+    except HTTPException:
+        raise
+    except SnapshotError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await ingestion_registry.release_chat_async(chat_id, owner)
+
+
 @app.post("/api/v1/chat/{chat_id}", response_model=ChatResponse)
-async def chat(chat_id: str, request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(
+    chat_id: str,
+    request: ChatRequest,
+    chat_service: ChatService = Depends(get_chat_service),
+    agent=Depends(get_documentation_agent)
+):
     """
     Hacer una pregunta al agente de documentación
     
     - **chat_id**: ID del chat
     - **question**: Pregunta del usuario
+    - **chatIds**: otros chats en cuya documentación buscar también (opcional)
     """
     try:
         # Procesar pregunta con el agente
-        response = await documentation_agent.process_question(request.question, chat_id)
+        response = await agent.process_question(request.question, chat_id, chat_service, request.chatIds)
         
         return ChatResponse(
             response=response,
             chatId=chat_id
         )
         
+    except LLMUnavailableError as e:
+        logger.error(f"LLM unavailable for chat {chat_id}: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/llm/route-stats")
+async def get_llm_route_stats(agent=Depends(get_documentation_agent)):
+    """
+    Latencia y uso de tokens por ruta de LLM (nodo/intención)
+    """
+    llm_service = agent.llm_service
+    return {
+        "routes": llm_service.get_route_stats(),
+        "circuit_breakers": {name: breaker.state for name, breaker in llm_service.breakers.items()}
+    }
+
+
+@app.get("/api/v1/db/pool-stats")
+async def get_db_pool_stats():
+    """
+    Saturación del pool de conexiones y espera de checkout
+    """
+    return get_pool_status()
+
+
 @app.get("/api/v1/chat-history/{chat_id}", response_model=ChatHistoryResponse)
-async def get_chat_history(chat_id: str, db: Session = Depends(get_db)):
+async def get_chat_history(
+    chat_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    chat_service: ChatService = Depends(get_chat_service)
+):
     """
-    Obtener el historial de chat
+    Obtener el historial de chat paginado
     
     - **chat_id**: ID del chat
+    - **cursor**: cursor devuelto en `next_cursor` por la página anterior
+    - **limit**: número máximo de mensajes por página
     """
     try:
         # Verificar que el chat existe
-        job = chat_service.get_processing_job(chat_id)
+        job = await chat_service.get_processing_job(chat_id)
         if not job:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        # Obtener historial
-        messages = db.query(chat_service.db.query.__class__).filter(
-            chat_service.db.query.__class__.chat_id == chat_id
-        ).order_by(chat_service.db.query.__class__.created_at).all()
+        # Obtener una página del historial
+        messages, next_cursor = await chat_service.get_messages_page(chat_id, cursor, limit)
         
         # Convertir a formato de respuesta
-        history_items = []
-        for msg in messages:
-            history_items.append({
-                "message_id": msg.message_id,
-                "sender": msg.sender,
-                "message_text": msg.message_text,
-                "created_at": msg.created_at
-            })
+        history_items = [_history_item(msg) for msg in messages]
         
         return ChatHistoryResponse(
             chatId=chat_id,
-            history=history_items
+            history=history_items,
+            next_cursor=next_cursor
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -181,6 +575,44 @@ async def get_chat_history(chat_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/chat-history/{chat_id}/export")
+async def export_chat_history(chat_id: str):
+    """
+    Exportar el historial completo como NDJSON (un mensaje por línea)
+    
+    - **chat_id**: ID del chat
+    """
+    async with AsyncSessionLocal() as session:
+        job = await ChatService(session).get_processing_job(chat_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    async def stream_history():
+        # Sesión del generador: solo toma una conexión mientras lee cada página
+        async with AsyncSessionLocal() as session:
+            export_service = ChatService(session)
+            cursor = None
+            while True:
+                messages, cursor = await export_service.get_messages_page(chat_id, cursor, EXPORT_PAGE_SIZE)
+                # Devolver la conexión mientras el cliente consume la página
+                await export_service.release_connection()
+                for msg in messages:
+                    yield json.dumps(_history_item(msg), default=str, ensure_ascii=False) + "\n"
+                if cursor is None:
+                    break
+    
+    return StreamingResponse(stream_history(), media_type="application/x-ndjson")
+
+
+def _history_item(msg) -> dict:
+    return {
+        "message_id": msg.message_id,
+        "sender": msg.sender,
+        "message_text": msg.message_text,
+        "created_at": msg.created_at
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
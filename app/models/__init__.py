@@ -1,5 +1,6 @@
 from .database import Base, engine, SessionLocal
 from .processing_jobs import ProcessingJobs
 from .chat_history import ChatHistory
+from .chat_summary import ChatSummary
 
-__all__ = ["Base", "engine", "SessionLocal", "ProcessingJobs", "ChatHistory"] 
\ No newline at end of file
+__all__ = ["Base", "engine", "SessionLocal", "ProcessingJobs", "ChatHistory", "ChatSummary"] 
\ No newline at end of file
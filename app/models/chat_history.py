@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    __table_args__ = (
+        # Lecturas recientes y paginación keyset por (created_at, message_id) dentro de un chat
+        Index("ix_chat_history_chat_created_message", "chat_id", "created_at", "message_id"),
+    )
     
     message_id = Column(Integer, primary_key=True, autoincrement=True)
     chat_id = Column(String(255), ForeignKey("processing_jobs.chat_id"), nullable=False)
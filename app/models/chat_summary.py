@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from .database import Base
+
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+    
+    chat_id = Column(String(255), ForeignKey("processing_jobs.chat_id"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    # Último message_id incorporado al resumen
+    summarized_until = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ChatSummary(chat_id={self.chat_id}, summarized_until={self.summarized_until})>"
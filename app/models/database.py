@@ -1,22 +1,133 @@
+from collections import deque
+from typing import Any, Deque, Dict
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+import time
 
-# Crear engine de SQLAlchemy
-engine = create_engine(settings.database_url)
+# Crear engine de SQLAlchemy (síncrono: workers de Celery y migraciones)
+engine = create_engine(
+    settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True
+)
 
 # Crear SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url(url: str) -> str:
+    """Derivar la URL con driver async a partir de DATABASE_URL"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+class PoolMetrics:
+    """Tiempo de espera para obtener una conexión del pool async"""
+    
+    def __init__(self, window: int = 1000):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits: Deque[float] = deque(maxlen=window)
+    
+    def record_wait(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.waits.append(wait)
+    
+    def percentile(self, q: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool async que mide la espera de cada checkout, también los que agotan
+    ``pool_timeout``. Las sesiones obtienen la conexión al ejecutar su
+    primera consulta y la devuelven al terminar la transacción, no al
+    empezar la petición.
+    """
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+# Engine async para la API: una sesión por petición sobre un pool dimensionado
+async_engine = create_async_engine(
+    settings.async_database_url or get_async_database_url(settings.database_url),
+    poolclass=TimedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 # Crear Base para los modelos
 Base = declarative_base()
 
 
+def get_pool_status() -> Dict[str, Any]:
+    """Ocupación del pool async y espera de checkout"""
+    pool = async_engine.sync_engine.pool
+    capacity = settings.db_pool_size + settings.db_max_overflow
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+        "saturation": checked_out / capacity if capacity else 0.0,
+        "checkouts": pool_metrics.checkouts,
+        "checkout_timeouts": pool_metrics.timeouts,
+        "checkout_wait_avg": pool_metrics.total_wait / pool_metrics.checkouts if pool_metrics.checkouts else 0.0,
+        "checkout_wait_p95": pool_metrics.percentile(0.95),
+        "checkout_wait_max": pool_metrics.max_wait,
+    }
+
+
 def get_db():
     """Dependency para obtener la sesión de base de datos"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """
+    Dependency para obtener una sesión async limitada a la petición
+    
+    La conexión se toma del pool con la primera consulta (ver ``TimedQueuePool``).
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
@@ -8,7 +8,7 @@ class ProcessingJobs(Base):
     
     chat_id = Column(String(255), primary_key=True)
     source_url = Column(Text, nullable=False)
-    status = Column(String(50), nullable=False)  # PENDING, IN_PROGRESS, COMPLETED, FAILED
+    status = Column(String(50), nullable=False)  # PENDING, IN_PROGRESS, COMPLETED, FAILED, EVICTED
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
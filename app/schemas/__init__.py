@@ -1,6 +1,11 @@
-from .processing import ProcessDocumentationRequest, ProcessDocumentationResponse
+from .processing import (
+    ProcessDocumentationRequest,
+    ProcessDocumentationResponse,
+    BatchProcessRequest,
+    BatchProcessResponse
+)
 from .chat import ChatRequest, ChatResponse, ChatHistoryResponse
-from .status import ProcessingStatusResponse
+from .status import ProcessingStatusResponse, BatchStatusResponse
 
 __all__ = [
     "ProcessDocumentationRequest",
@@ -8,5 +13,8 @@ __all__ = [
     "ChatRequest",
     "ChatResponse",
     "ChatHistoryResponse",
-    "ProcessingStatusResponse"
+    "ProcessingStatusResponse",
+    "BatchProcessRequest",
+    "BatchProcessResponse",
+    "BatchStatusResponse"
 ] 
\ No newline at end of file
@@ -1,10 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
 
 class ChatRequest(BaseModel):
     question: str
+    # Otros chats cuya documentación se consulta junto con la de este
+    chatIds: List[str] = Field(default_factory=list, max_length=20)
 
 
 class ChatResponse(BaseModel):
@@ -21,4 +23,5 @@ class ChatHistoryItem(BaseModel):
 
 class ChatHistoryResponse(BaseModel):
     chatId: str
-    history: List[ChatHistoryItem] 
\ No newline at end of file
+    history: List[ChatHistoryItem]
+    next_cursor: Optional[str] = None 
\ No newline at end of file
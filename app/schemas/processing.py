@@ -1,13 +1,36 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl
+from typing import List, Literal, Optional
+
+# Las peticiones interactivas se adelantan a los rastreos en lote
+IngestionPriority = Literal["interactive", "normal", "batch"]
 
 
 class ProcessDocumentationRequest(BaseModel):
     url: HttpUrl
     chatId: str
+    priority: IngestionPriority = "interactive"
 
 
 class ProcessDocumentationResponse(BaseModel):
     message: str
     status: str
-    chatId: str 
\ No newline at end of file
+    chatId: str
+    taskId: Optional[str] = None
+    # True si la petición se unió a una ingesta ya en curso en lugar de lanzar otra
+    deduplicated: bool = False
+
+
+class BatchItem(BaseModel):
+    url: HttpUrl
+    chatId: str
+
+
+class BatchProcessRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=500)
+    priority: IngestionPriority = "batch"
+    batchId: Optional[str] = None
+
+
+class BatchProcessResponse(BaseModel):
+    batchId: str
+    jobs: List[ProcessDocumentationResponse]
@@ -1,9 +1,26 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class ProcessingStatusResponse(BaseModel):
-    status: str  # PENDING, IN_PROGRESS, COMPLETED, FAILED
+    status: str  # PENDING, IN_PROGRESS, COMPLETED, FAILED, EVICTED
     chatId: str
     source_url: Optional[str] = None
-    error_message: Optional[str] = None 
\ No newline at end of file
+    error_message: Optional[str] = None
+
+
+class BatchJobStatus(BaseModel):
+    chatId: str
+    status: str
+    source_url: Optional[str] = None
+
+
+class BatchStatusResponse(BaseModel):
+    batchId: str
+    status: str  # IN_PROGRESS mientras quede algún trabajo sin terminar, COMPLETED después
+    total: int
+    counts: Dict[str, int]
+    progress: float  # fracción de trabajos terminados (completados o fallidos)
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    jobs: List[BatchJobStatus]
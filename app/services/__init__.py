@@ -1,5 +1,18 @@
-from .llm_service import LLMService
-from .rag_service import RAGService
-from .chat_service import ChatService
+from importlib import import_module
 
-__all__ = ["LLMService", "RAGService", "ChatService"] 
\ No newline at end of file
+# Exportaciones diferidas: importar un servicio ligero (p.ej. ChatService) no debe
+# cargar sentence-transformers ni los clientes de LLM
+_EXPORTS = {
+    "LLMService": ".llm_service",
+    "RAGService": ".rag_service",
+    "ChatService": ".chat_service",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["LLMService", "RAGService", "ChatService"]
@@ -1,47 +1,201 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.processing_jobs import ProcessingJobs
 from app.models.chat_history import ChatHistory
+from app.models.chat_summary import ChatSummary
+from app.utils.text_processing import clean_text, split_into_sentences
+from app.config import settings
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_FRAGMENT_CHARS = 160
+
+
+def _pair_messages(messages: Iterable[ChatHistory]) -> List[tuple[str, str]]:
+    """Emparejar cada mensaje de usuario con la respuesta del agente que lo sigue"""
+    history = []
+    pending_user = None
+    for message in messages:
+        if message.sender == "user":
+            pending_user = message.message_text
+        elif message.sender == "agent" and pending_user is not None:
+            history.append((pending_user, message.message_text))
+            pending_user = None
+    return history
+
+
+def _last_paired_id(messages: List[ChatHistory]) -> int:
+    """message_id de la última respuesta del agente que cierra un intercambio"""
+    for message in reversed(messages):
+        if message.sender == "agent":
+            return message.message_id
+    return messages[-1].message_id
+
+
+def _fragment(text: str) -> str:
+    """Primera oración del texto, recortada"""
+    text = clean_text(text)
+    sentences = split_into_sentences(text)
+    fragment = sentences[0] if sentences else text
+    if len(fragment) > SUMMARY_FRAGMENT_CHARS:
+        fragment = fragment[:SUMMARY_FRAGMENT_CHARS].rsplit(" ", 1)[0] + "…"
+    return fragment
+
+
+def encode_cursor(message: ChatHistory) -> str:
+    """Cursor opaco con la posición (created_at, message_id) del último mensaje devuelto"""
+    payload = json.dumps({"t": message.created_at.isoformat(), "id": message.message_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodificar un cursor; lanza ValueError si no es válido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _summarize_exchange(user_msg: str, agent_msg: str) -> str:
+    """Línea de resumen extractivo para un intercambio"""
+    return f"- Usuario preguntó: {_fragment(user_msg)} | Asistente: {_fragment(agent_msg)}"
+
 
 class ChatService:
     """Servicio para manejar operaciones de chat y base de datos"""
     
-    def __init__(self):
-        self.db = SessionLocal()
-    
-    def __del__(self):
-        if hasattr(self, 'db'):
-            self.db.close()
+    def __init__(self, db: AsyncSession):
+        # Sesión limitada a la petición (o al lote del writer); no se comparte entre peticiones
+        self.db = db
     
-    def get_chat_history(self, chat_id: str) -> List[tuple[str, str]]:
+    async def get_chat_history(self, chat_id: str, max_exchanges: Optional[int] = None) -> List[tuple[str, str]]:
         """
-        Obtener historial de chat como lista de tuplas (user_message, agent_response)
+        Obtener los últimos intercambios del chat como tuplas (user_message, agent_response)
+        
+        Solo se leen los ``max_exchanges`` intercambios más recientes, de modo
+        que el coste no crece con la longitud del chat.
         """
+        max_exchanges = max_exchanges or settings.chat_history_window
         try:
-            messages = self.db.query(ChatHistory).filter(
-                ChatHistory.chat_id == chat_id
-            ).order_by(ChatHistory.created_at).all()
-            
-            # Convertir a formato de tuplas
-            history = []
-            for i in range(0, len(messages), 2):
-                if i + 1 < len(messages):
-                    user_msg = messages[i].message_text
-                    agent_msg = messages[i + 1].message_text
-                    history.append((user_msg, agent_msg))
+            result = await self.db.execute(
+                select(ChatHistory).filter(
+                    ChatHistory.chat_id == chat_id
+                ).order_by(
+                    ChatHistory.created_at.desc(), ChatHistory.message_id.desc()
+                ).limit(max_exchanges * 2)
+            )
+            messages = result.scalars().all()
             
-            return history
+            return _pair_messages(reversed(messages))
             
         except Exception as e:
             logger.error(f"Error getting chat history: {str(e)}")
             return []
     
-    def save_message(self, chat_id: str, sender: str, message_text: str) -> bool:
+    async def get_messages_page(
+        self, chat_id: str, cursor: Optional[str] = None, limit: int = 50
+    ) -> Tuple[List[ChatHistory], Optional[str]]:
+        """
+        Obtener una página del historial en orden cronológico (paginación keyset)
+        
+        Devuelve los mensajes y el cursor de la página siguiente (None si no hay
+        más). Cada página es un rango sobre el índice (chat_id, created_at,
+        message_id), así que su coste no depende de la posición en el historial.
+        """
+        query = select(ChatHistory).filter(ChatHistory.chat_id == chat_id)
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            query = query.filter(
+                tuple_(ChatHistory.created_at, ChatHistory.message_id) > tuple_(created_at, message_id)
+            )
+        query = query.order_by(ChatHistory.created_at, ChatHistory.message_id).limit(limit + 1)
+        
+        result = await self.db.execute(query)
+        messages = result.scalars().all()
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        return messages, encode_cursor(messages[-1]) if has_more else None
+    
+    async def get_history_summary(self, chat_id: str) -> str:
+        """
+        Obtener el resumen acumulado de los intercambios anteriores a la ventana reciente
+        """
+        try:
+            summary = await self.db.get(ChatSummary, chat_id)
+            return summary.summary if summary else ""
+            
+        except Exception as e:
+            logger.error(f"Error getting chat summary: {str(e)}")
+            return ""
+    
+    async def update_rolling_summary(self, chat_id: str) -> bool:
+        """
+        Incorporar al resumen los mensajes que han salido de la ventana reciente
+        
+        Cada llamada procesa como mucho ``chat_summary_batch_size`` mensajes
+        nuevos, así que el coste por pregunta es constante.
+        """
+        try:
+            # Primer mensaje de la ventana reciente: lo anterior se resume
+            window_start = await self.db.scalar(
+                select(ChatHistory.message_id).filter(
+                    ChatHistory.chat_id == chat_id
+                ).order_by(
+                    ChatHistory.created_at.desc(), ChatHistory.message_id.desc()
+                ).offset(settings.chat_history_window * 2 - 1).limit(1)
+            )
+            if window_start is None:
+                return True
+            
+            summary = await self.db.get(ChatSummary, chat_id)
+            summarized_until = summary.summarized_until if summary else 0
+            
+            result = await self.db.execute(
+                select(ChatHistory).filter(
+                    ChatHistory.chat_id == chat_id,
+                    ChatHistory.message_id > summarized_until,
+                    ChatHistory.message_id < window_start
+                ).order_by(ChatHistory.message_id).limit(settings.chat_summary_batch_size)
+            )
+            messages = result.scalars().all()
+            if not messages:
+                return True
+            
+            # Un intercambio incompleto al final se deja para la próxima vez
+            exchanges = _pair_messages(messages)
+            if not exchanges and len(messages) < settings.chat_summary_batch_size:
+                return True
+            last_paired = _last_paired_id(messages)
+            
+            lines = summary.summary.splitlines() if summary and summary.summary else []
+            lines.extend(_summarize_exchange(user_msg, agent_msg) for user_msg, agent_msg in exchanges)
+            
+            # Mantener el resumen acotado descartando las líneas más antiguas
+            while len(lines) > 1 and sum(len(line) + 1 for line in lines) > settings.chat_summary_max_chars:
+                lines.pop(0)
+            
+            if summary is None:
+                summary = ChatSummary(chat_id=chat_id)
+                self.db.add(summary)
+            summary.summary = "\n".join(lines)
+            summary.summarized_until = last_paired
+            await self.db.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error updating chat summary: {str(e)}")
+            await self.db.rollback()
+            return False
+    
+    async def save_message(self, chat_id: str, sender: str, message_text: str) -> bool:
         """
         Guardar un mensaje en el historial
         """
@@ -52,22 +206,45 @@ class ChatService:
                 message_text=message_text
             )
             self.db.add(message)
-            self.db.commit()
+            await self.db.commit()
             return True
             
         except Exception as e:
             logger.error(f"Error saving message: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
+            return False
+    
+    async def save_exchanges(self, exchanges: List[tuple[str, str, str]]) -> bool:
+        """
+        Guardar varios intercambios (chat_id, user_message, agent_response) en una sola transacción
+        """
+        try:
+            for chat_id, user_msg, agent_msg in exchanges:
+                self.db.add(ChatHistory(chat_id=chat_id, sender="user", message_text=user_msg))
+                self.db.add(ChatHistory(chat_id=chat_id, sender="agent", message_text=agent_msg))
+            await self.db.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving {len(exchanges)} exchanges: {str(e)}")
+            await self.db.rollback()
             return False
     
-    def check_processing_status(self, chat_id: str) -> Optional[str]:
+    async def release_connection(self):
+        """
+        Terminar la transacción de lectura abierta para devolver la conexión al
+        pool (p.ej. antes de llamar al LLM). La siguiente consulta toma otra.
+        """
+        if self.db.in_transaction():
+            # expire_on_commit=False: los objetos ya cargados siguen siendo válidos
+            await self.db.commit()
+    
+    async def check_processing_status(self, chat_id: str) -> Optional[str]:
         """
         Verificar el estado de procesamiento de un chat
         """
         try:
-            job = self.db.query(ProcessingJobs).filter(
-                ProcessingJobs.chat_id == chat_id
-            ).first()
+            job = await self.db.get(ProcessingJobs, chat_id)
             
             return job.status if job else None
             
@@ -75,7 +252,7 @@ class ChatService:
             logger.error(f"Error checking processing status: {str(e)}")
             return None
     
-    def create_processing_job(self, chat_id: str, source_url: str) -> bool:
+    async def create_processing_job(self, chat_id: str, source_url: str) -> bool:
         """
         Crear un nuevo trabajo de procesamiento
         """
@@ -86,23 +263,69 @@ class ChatService:
                 status="PENDING"
             )
             self.db.add(job)
-            self.db.commit()
+            await self.db.commit()
             return True
             
         except Exception as e:
             logger.error(f"Error creating processing job: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
+            return False
+    
+    async def upsert_processing_job(self, chat_id: str, source_url: str, status: str = "PENDING") -> bool:
+        """
+        Crear el trabajo de procesamiento o reiniciarlo si el chat ya existía
+        """
+        try:
+            job = await self.db.get(ProcessingJobs, chat_id)
+            if job is None:
+                self.db.add(ProcessingJobs(chat_id=chat_id, source_url=source_url, status=status))
+            else:
+                job.source_url = source_url
+                job.status = status
+            await self.db.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error upserting processing job: {str(e)}")
+            await self.db.rollback()
             return False
     
-    def get_processing_job(self, chat_id: str) -> Optional[ProcessingJobs]:
+    async def get_processing_job(self, chat_id: str) -> Optional[ProcessingJobs]:
         """
         Obtener un trabajo de procesamiento
         """
         try:
-            return self.db.query(ProcessingJobs).filter(
-                ProcessingJobs.chat_id == chat_id
-            ).first()
+            return await self.db.get(ProcessingJobs, chat_id)
             
         except Exception as e:
             logger.error(f"Error getting processing job: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+    
+    async def get_processing_jobs(self, chat_ids: List[str]) -> List[ProcessingJobs]:
+        """
+        Obtener los trabajos de procesamiento de varios chats (p.ej. un lote)
+        """
+        if not chat_ids:
+            return []
+        result = await self.db.execute(
+            select(ProcessingJobs).where(ProcessingJobs.chat_id.in_(chat_ids))
+        )
+        return list(result.scalars().all())
+    
+    async def delete_chat(self, chat_id: str) -> bool:
+        """
+        Eliminar el trabajo de procesamiento del chat con su historial y su resumen
+        
+        Devuelve False si el chat no existía.
+        """
+        try:
+            await self.db.execute(delete(ChatSummary).where(ChatSummary.chat_id == chat_id))
+            await self.db.execute(delete(ChatHistory).where(ChatHistory.chat_id == chat_id))
+            result = await self.db.execute(delete(ProcessingJobs).where(ProcessingJobs.chat_id == chat_id))
+            await self.db.commit()
+            return result.rowcount > 0
+            
+        except Exception as e:
+            logger.error(f"Error deleting chat: {str(e)}")
+            await self.db.rollback()
+            raise
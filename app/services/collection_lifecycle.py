@@ -0,0 +1,297 @@
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.chunk_text_store import chunk_text_store
+from app.services.ingestion_registry import ingestion_registry
+from app.services.vector_store import (
+    ShardedVectorStore,
+    chat_id_from_collection,
+    collection_name,
+    get_vector_store,
+    is_missing_collection,
+)
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Último acceso de cada colección: sorted set chat_id -> timestamp (orden LRU)
+LAST_ACCESS_KEY = "vector:last_access"
+
+# Base de datos SQLite de ChromaDB dentro de chroma_persist_directory
+CHROMA_SQLITE_FILE = "chroma.sqlite3"
+
+# Directorios de segmento sin colección más recientes que esto no se tocan
+# (pueden pertenecer a una colección que se está creando)
+ORPHAN_MIN_AGE_SECONDS = 3600
+
+
+def plan_evictions(
+    last_access: Dict[str, float], now: float, idle_ttl_seconds: float
+) -> Tuple[List[str], List[str]]:
+    """
+    Separar las colecciones caducadas (sin acceso en ``idle_ttl_seconds``) del
+    resto, que se devuelve en orden LRU como candidatas si se supera la cuota.
+    """
+    by_age = sorted(last_access, key=lambda chat_id: (last_access[chat_id], chat_id))
+    if not idle_ttl_seconds:
+        return [], by_age
+    expired = [chat_id for chat_id in by_age if now - last_access[chat_id] > idle_ttl_seconds]
+    return expired, [chat_id for chat_id in by_age if chat_id not in expired]
+
+
+class CollectionLifecycle:
+    """
+    Ciclo de vida de las colecciones de ChromaDB por chat.
+    
+    - Registra el último acceso de cada colección en Redis (compartido entre
+      la API y los workers), con escrituras limitadas por proceso.
+    - Desaloja las colecciones sin uso durante ``collection_idle_ttl_seconds``
+      y, si el directorio de un shard local supera ``collection_disk_quota_bytes``,
+      sus colecciones menos usadas recientemente hasta volver por debajo de la cuota.
+    - Compacta el almacenamiento de cada shard local: elimina directorios de
+      segmento huérfanos y devuelve al disco el espacio libre de SQLite con VACUUM.
+    - Tras añadir shards, mueve cada colección al shard que le corresponde.
+    
+    Las colecciones con una ingesta en curso no se desalojan ni se mueven.
+    """
+    
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        store: Optional[ShardedVectorStore] = None,
+        persist_directory: Optional[str] = None
+    ):
+        self._client = client
+        self._store = store or (ShardedVectorStore([persist_directory]) if persist_directory else None)
+        # Último registro de acceso por chat, del más antiguo al más reciente
+        self._touched: "OrderedDict[str, float]" = OrderedDict()
+        self._touched_lock = Lock()
+    
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        return self._client
+    
+    @property
+    def store(self) -> ShardedVectorStore:
+        return self._store or get_vector_store()
+    
+    def touch(self, chat_id: str, now: Optional[float] = None):
+        """Registrar un acceso a la colección del chat (no falla si Redis no responde)"""
+        now = now or time.time()
+        interval = settings.collection_touch_interval_seconds
+        with self._touched_lock:
+            if now - self._touched.get(chat_id, 0.0) < interval:
+                return
+            # También tras un fallo, para no insistir contra Redis en cada consulta
+            self._touched[chat_id] = now
+            self._touched.move_to_end(chat_id)
+            # Las entradas que ya no limitan nada se descartan: el dict no crece con cada chat
+            while self._touched:
+                oldest = next(iter(self._touched))
+                if now - self._touched[oldest] < interval:
+                    break
+                del self._touched[oldest]
+        try:
+            self.client.zadd(LAST_ACCESS_KEY, {chat_id: now})
+        except Exception as e:
+            logger.warning(f"Could not record access for chat_id {chat_id}: {str(e)}")
+    
+    def forget(self, chat_id: str):
+        with self._touched_lock:
+            self._touched.pop(chat_id, None)
+        self.client.zrem(LAST_ACCESS_KEY, chat_id)
+    
+    def delete_collection(self, chat_id: str) -> bool:
+        """Eliminar la colección del chat (y sus textos, si están fuera de Chroma); False si no existía"""
+        try:
+            self.store.delete_collection(collection_name(chat_id))
+            deleted = True
+        except Exception as e:
+            if not is_missing_collection(e):
+                raise
+            deleted = False
+        chunk_text_store.delete(chat_id)
+        self.forget(chat_id)
+        return deleted
+    
+    def list_chat_ids(self, shard: Optional[str] = None) -> List[str]:
+        if shard is None:
+            names = [collection.name for collection in self.store.list_collections()]
+        else:
+            names = [collection.name for collection in self.store.client(shard).list_collections()]
+        chat_ids = (chat_id_from_collection(name) for name in names)
+        return [chat_id for chat_id in chat_ids if chat_id is not None]
+    
+    def last_access(self, chat_ids: List[str], now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Último acceso de cada colección. Las que no tienen registro (p.ej. creadas
+        antes de existir el seguimiento) se registran ahora y empiezan su TTL.
+        """
+        now = now or time.time()
+        if not chat_ids:
+            return {}
+        scores = self.client.zmscore(LAST_ACCESS_KEY, chat_ids)
+        untracked = {chat_id: now for chat_id, score in zip(chat_ids, scores) if score is None}
+        if untracked:
+            self.client.zadd(LAST_ACCESS_KEY, untracked, nx=True)
+        return {chat_id: score if score is not None else now for chat_id, score in zip(chat_ids, scores)}
+    
+    def disk_usage(self, shard: Optional[str] = None) -> Dict[str, int]:
+        """
+        Bytes en disco de un shard local (o la suma de todos). ``used_bytes``
+        descuenta las páginas libres de SQLite: es lo que ocupan los datos vivos
+        y baja en cuanto se elimina una colección, antes de compactar.
+        """
+        directories = self.store.local_directories()
+        if shard is not None:
+            directories = {shard: directories[shard]}
+        usage = {"total_bytes": 0, "free_bytes": 0, "used_bytes": 0}
+        for directory in directories.values():
+            total = 0
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            free = _sqlite_free_bytes(directory)
+            usage["total_bytes"] += total
+            usage["free_bytes"] += free
+            usage["used_bytes"] += total - free
+        return usage
+    
+    def evict(self, now: Optional[float] = None, on_evicted: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        Desalojar las colecciones caducadas y las LRU que excedan la cuota de disco
+        
+        ``on_evicted`` se llama con cada chat desalojado mientras aún está
+        reservado (p.ej. para marcar su trabajo como EVICTED sin que una
+        ingesta nueva pueda empezar antes y ver su estado sobrescrito).
+        """
+        now = now or time.time()
+        expired, by_age = plan_evictions(
+            self.last_access(self.list_chat_ids(), now), now, settings.collection_idle_ttl_seconds
+        )
+        
+        evicted = [chat_id for chat_id in expired if self._evict_one(chat_id, "idle", on_evicted)]
+        
+        quota = settings.collection_disk_quota_bytes
+        if quota:
+            for shard in self.store.local_directories():
+                on_shard = set(self.list_chat_ids(shard))
+                for chat_id in (chat_id for chat_id in by_age if chat_id in on_shard):
+                    if self.disk_usage(shard)["used_bytes"] <= quota:
+                        break
+                    if self._evict_one(chat_id, "disk quota", on_evicted):
+                        evicted.append(chat_id)
+        return evicted
+    
+    def rebalance(self) -> Dict[str, Any]:
+        """
+        Mover al shard que les corresponde las colecciones que están en otro
+        (p.ej. tras añadir un shard). Las que tienen una ingesta en curso se
+        dejan para la siguiente ejecución.
+        """
+        moved, skipped = [], []
+        for name, source, target in self.store.misplaced():
+            chat_id = chat_id_from_collection(name)
+            owner = f"rebalance:{uuid.uuid4()}"
+            if not ingestion_registry.try_claim_chat(chat_id, owner):
+                skipped.append(chat_id)
+                continue
+            try:
+                self.store.move_collection(name, source, target)
+                moved.append(chat_id)
+            except Exception as e:
+                logger.error(f"Error moving collection {name} from {source} to {target}: {str(e)}")
+                skipped.append(chat_id)
+            finally:
+                ingestion_registry.release_chat(chat_id, owner)
+        logger.info(f"Rebalanced shards: moved {len(moved)} collections, skipped {len(skipped)}")
+        return {"moved": moved, "skipped": skipped}
+    
+    def _evict_one(self, chat_id: str, reason: str, on_evicted: Optional[Callable[[str], None]] = None) -> bool:
+        # Reservar el chat impide que empiece una ingesta mientras se borra su colección
+        owner = f"evict:{uuid.uuid4()}"
+        if not ingestion_registry.try_claim_chat(chat_id, owner):
+            logger.info(f"Skipping eviction of chat_id {chat_id}: ingestion in progress")
+            return False
+        try:
+            self.delete_collection(chat_id)
+            if on_evicted:
+                on_evicted(chat_id)
+            logger.info(f"Evicted collection for chat_id {chat_id} ({reason})")
+            return True
+        except Exception as e:
+            logger.error(f"Error evicting collection for chat_id {chat_id}: {str(e)}")
+            return False
+        finally:
+            ingestion_registry.release_chat(chat_id, owner)
+    
+    def compact(self) -> Dict[str, Any]:
+        """Eliminar segmentos huérfanos y hacer VACUUM si hay suficiente espacio libre, por shard local"""
+        result = {"orphan_segments": 0, "vacuumed": 0, "reclaimed_bytes": 0}
+        for shard, directory in self.store.local_directories().items():
+            before = self.disk_usage(shard)
+            result["orphan_segments"] += _remove_orphan_segments(directory)
+            total = before["total_bytes"]
+            if total and before["free_bytes"] / total >= settings.collection_compaction_min_free_ratio:
+                with closing(_connect(directory)) as conn:
+                    conn.execute("VACUUM")
+                result["vacuumed"] += 1
+            result["reclaimed_bytes"] += before["total_bytes"] - self.disk_usage(shard)["total_bytes"]
+        logger.info(f"Compacted ChromaDB storage: {result}")
+        return result
+
+
+def _connect(directory: Path) -> sqlite3.Connection:
+    # Espera si un proceso de ChromaDB está escribiendo
+    return sqlite3.connect(directory / CHROMA_SQLITE_FILE, timeout=60)
+
+
+def _sqlite_free_bytes(directory: Path) -> int:
+    if not (directory / CHROMA_SQLITE_FILE).exists():
+        return 0
+    with closing(_connect(directory)) as conn:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return free_pages * page_size
+
+
+def _remove_orphan_segments(directory: Path) -> int:
+    """Directorios de índice cuyo segmento ya no existe (p.ej. un borrado interrumpido)"""
+    if not (directory / CHROMA_SQLITE_FILE).exists():
+        return 0
+    with closing(_connect(directory)) as conn:
+        segment_ids = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    removed = 0
+    for entry in directory.iterdir():
+        if not entry.is_dir() or entry.name in segment_ids or not _is_uuid(entry.name):
+            continue
+        if time.time() - entry.stat().st_mtime < ORPHAN_MIN_AGE_SECONDS:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
+collection_lifecycle = CollectionLifecycle()
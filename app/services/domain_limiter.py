@@ -0,0 +1,212 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+from app.config import settings
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Caducidad de un hueco cuyo worker murió sin liberarlo (time limit de las tareas)
+SLOT_TTL_SECONDS = 30 * 60
+
+# Respuestas con las que el servidor pide que se reduzca el ritmo
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Una sola reducción del límite por ventana: varias respuestas 429 simultáneas
+# son la misma señal y no deben dejar el límite en 1 de golpe
+DECREASE_COOLDOWN_SECONDS = 5
+
+# Reservar un hueco de descarga para el dominio si quedan libres y ha pasado el
+# intervalo mínimo desde la anterior. Cada hueco es un miembro del sorted set con
+# su caducidad como score; el límite es el ajustado por ``_FEEDBACK_SCRIPT`` o,
+# si no hay, el configurado. Devuelve -1 si se reserva o los ms que hay que esperar.
+_ACQUIRE_SCRIPT = """
+local limit = math.max(1, math.floor(tonumber(redis.call('GET', KEYS[3]) or ARGV[2])))
+local interval_ms = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now_ms = t[1] * 1000 + math.floor(t[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return math.max(interval_ms, 1000)
+end
+local next_at = tonumber(redis.call('GET', KEYS[2]) or '0')
+if now_ms < next_at then
+    return next_at - now_ms
+end
+redis.call('ZADD', KEYS[1], now_ms + tonumber(ARGV[4]) * 1000, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[4]) * 1000)
+if interval_ms > 0 then
+    redis.call('SET', KEYS[2], now_ms + interval_ms, 'PX', interval_ms)
+end
+return -1
+"""
+
+# Ajuste AIMD del límite de un dominio: suma ARGV[5] si la respuesta fue buena
+# ('up') o lo multiplica por ARGV[6] si no ('down', como mucho una vez por
+# ventana de ARGV[9] ms), entre ARGV[3] y ARGV[4]. Con Retry-After (ARGV[8] ms)
+# retrasa la siguiente descarga del dominio. Devuelve el nuevo límite.
+_FEEDBACK_SCRIPT = """
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[2])
+if ARGV[1] == 'down' then
+    if redis.call('SET', KEYS[3], '1', 'PX', tonumber(ARGV[9]), 'NX') then
+        limit = limit * tonumber(ARGV[6])
+    end
+else
+    limit = limit + tonumber(ARGV[5])
+end
+limit = math.min(math.max(limit, tonumber(ARGV[3])), tonumber(ARGV[4]))
+redis.call('SET', KEYS[1], tostring(limit), 'PX', tonumber(ARGV[7]))
+local retry_ms = tonumber(ARGV[8])
+if retry_ms > 0 then
+    local t = redis.call('TIME')
+    local now_ms = t[1] * 1000 + math.floor(t[2] / 1000)
+    local next_at = math.max(tonumber(redis.call('GET', KEYS[2]) or '0'), now_ms + retry_ms)
+    redis.call('SET', KEYS[2], next_at, 'PX', next_at - now_ms)
+end
+return tostring(limit)
+"""
+
+
+class DomainThrottledError(Exception):
+    """El dominio respondió 429/503: hay que esperar antes de volver a descargar"""
+    
+    def __init__(self, domain: str, retry_after: Optional[float] = None):
+        super().__init__(f"{domain} is throttling downloads (retry after {retry_after} s)")
+        self.domain = domain
+        self.retry_after = retry_after
+
+
+def url_domain(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def domain_active_key(domain: str) -> str:
+    return f"domain:{domain}:active"
+
+
+def domain_next_key(domain: str) -> str:
+    return f"domain:{domain}:next"
+
+
+def domain_limit_key(domain: str) -> str:
+    return f"domain:{domain}:limit"
+
+
+def domain_cooldown_key(domain: str) -> str:
+    return f"domain:{domain}:cooldown"
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Segundos de una cabecera Retry-After (en segundos o fecha HTTP), o None si no es válida"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class DomainLimiter:
+    """
+    Límite de cortesía por dominio compartido entre todos los workers.
+    
+    Cada dominio admite como mucho ``domain_max_concurrency`` descargas
+    simultáneas (o su valor en ``domain_concurrency_overrides``) separadas al
+    menos ``domain_min_interval_seconds``. Cada hueco caduca por separado si
+    el worker que lo tenía muere sin liberarlo.
+    
+    Con ``domain_adaptive_concurrency`` ese límite es solo el de partida: cada
+    respuesta lo ajusta (AIMD) con ``record_response``. Sube poco a poco
+    mientras el dominio responde por debajo de ``domain_latency_target_seconds``
+    y se reduce a la mitad con 429/503, errores de red o respuestas lentas; un
+    Retry-After retrasa además la siguiente descarga. El estado vive en Redis,
+    así que lo comparten todos los workers y las ingestas del mismo dominio.
+    """
+    
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self._client = client
+    
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.redis_url)
+        return self._client
+    
+    def limit_for(self, domain: str) -> int:
+        return settings.domain_concurrency_overrides.get(domain, settings.domain_max_concurrency)
+    
+    def ceiling_for(self, domain: str) -> int:
+        """Límite máximo del ajuste: el fijado para el dominio o ``domain_adaptive_max_concurrency``"""
+        if domain in settings.domain_concurrency_overrides:
+            return settings.domain_concurrency_overrides[domain]
+        return max(settings.domain_adaptive_max_concurrency, settings.domain_max_concurrency)
+    
+    def try_acquire(self, domain: str, token: str) -> Optional[float]:
+        """
+        Reservar un hueco de descarga para el dominio a nombre de ``token``.
+        
+        Devuelve None si se ha reservado, o los segundos que conviene esperar
+        antes de reintentar.
+        """
+        wait_ms = self.client.eval(
+            _ACQUIRE_SCRIPT, 3, domain_active_key(domain), domain_next_key(domain), domain_limit_key(domain),
+            token, self.limit_for(domain),
+            int(settings.domain_min_interval_seconds * 1000), SLOT_TTL_SECONDS
+        )
+        if int(wait_ms) < 0:
+            return None
+        return int(wait_ms) / 1000
+    
+    def record_response(
+        self,
+        domain: str,
+        status_code: Optional[int] = None,
+        latency: Optional[float] = None,
+        retry_after: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        Ajustar el límite del dominio con el resultado de una descarga.
+        
+        ``status_code`` None indica un error de red (timeout, conexión). Devuelve
+        el nuevo límite, o None si el ajuste está desactivado o Redis falla:
+        el ajuste nunca hace fallar una descarga.
+        """
+        if not settings.domain_adaptive_concurrency:
+            return None
+        healthy = (
+            status_code is not None
+            and status_code not in THROTTLE_STATUS_CODES
+            and (latency is None or latency <= settings.domain_latency_target_seconds)
+        )
+        retry_after = min(retry_after or 0.0, settings.domain_max_retry_after_seconds)
+        try:
+            limit = self.client.eval(
+                _FEEDBACK_SCRIPT, 3, domain_limit_key(domain), domain_next_key(domain), domain_cooldown_key(domain),
+                "up" if healthy else "down", self.limit_for(domain), 1, self.ceiling_for(domain),
+                settings.domain_concurrency_increase, settings.domain_concurrency_decrease_factor,
+                settings.domain_state_ttl_seconds * 1000, int(retry_after * 1000), DECREASE_COOLDOWN_SECONDS * 1000
+            )
+        except Exception as e:
+            logger.warning(f"Error updating download limit for {domain}: {str(e)}")
+            return None
+        limit = float(limit)
+        if not healthy:
+            logger.info(f"Reducing download concurrency for {domain} to {limit:g} (status {status_code}, latency {latency})")
+        return limit
+    
+    def release(self, domain: str, token: str):
+        try:
+            self.client.zrem(domain_active_key(domain), token)
+        except Exception as e:
+            logger.warning(f"Error releasing download slot for {domain}: {str(e)}")
+
+
+domain_limiter = DomainLimiter()
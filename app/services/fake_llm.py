@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain.llms.base import LLM
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.outputs import GenerationChunk
+
+_WORD_PATTERN = re.compile(r"\w{4,}", re.UNICODE)
+
+_BASE_VOCABULARY = (
+    "la", "documentación", "indica", "que", "puedes", "configurar", "el",
+    "servicio", "usando", "parámetros", "ejemplo", "función", "respuesta",
+    "según", "sección", "clase", "método", "valor", "opcional", "para",
+)
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal")
+
+
+class FakeLLM(LLM):
+    """
+    LLM determinista para pruebas de carga y latencia sin red.
+    
+    La respuesta depende solo del prompt (mismo prompt, mismo texto). La
+    latencia hasta el primer token sigue la distribución configurada y el
+    resto de tokens se emite a ``tokens_per_second``.
+    """
+    
+    response_tokens: int = 64
+    latency_ms: float = 200.0
+    latency_stddev_ms: float = 50.0
+    latency_distribution: str = "lognormal"
+    tokens_per_second: float = 50.0
+    seed: int = 0
+    intent_labels: Tuple[str, ...] = ("general_query", "code_query", "follow_up_question")
+    
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported latency distribution: {self.latency_distribution}")
+        # RNG propio para la latencia: reproducible entre ejecuciones con la misma semilla
+        object.__setattr__(self, "_latency_rng", random.Random(self.seed))
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "response_tokens": self.response_tokens,
+            "latency_ms": self.latency_ms,
+            "latency_distribution": self.latency_distribution,
+            "tokens_per_second": self.tokens_per_second,
+        }
+    
+    def _prompt_rng(self, prompt: str) -> random.Random:
+        """RNG derivado del prompt para que el texto sea reproducible"""
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big") ^ self.seed)
+    
+    def _generate_tokens(self, prompt: str) -> List[str]:
+        """Generar los tokens de la respuesta a partir del prompt"""
+        rng = self._prompt_rng(prompt)
+        
+        # Prompts de clasificación: devolver una de las etiquetas esperadas
+        if all(label in prompt for label in self.intent_labels):
+            return [rng.choice(self.intent_labels)]
+        
+        vocabulary = list(_BASE_VOCABULARY) + _WORD_PATTERN.findall(prompt.lower())[:256]
+        return [rng.choice(vocabulary) for _ in range(self.response_tokens)]
+    
+    def sample_latency(self) -> float:
+        """Muestrear la latencia hasta el primer token, en segundos"""
+        rng = self._latency_rng
+        mean = self.latency_ms
+        stddev = self.latency_stddev_ms
+        
+        if self.latency_distribution == "constant" or mean <= 0:
+            latency = mean
+        elif self.latency_distribution == "uniform":
+            latency = rng.uniform(mean - stddev, mean + stddev)
+        elif self.latency_distribution == "normal":
+            latency = rng.gauss(mean, stddev)
+        elif self.latency_distribution == "lognormal":
+            # Parámetros de la normal subyacente a partir de media y desviación
+            sigma2 = math.log1p((stddev / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            latency = rng.lognormvariate(mu, sigma2 ** 0.5)
+        else:
+            raise ValueError(f"Unsupported latency distribution: {self.latency_distribution}")
+        
+        return max(latency, 0.0) / 1000
+    
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+    
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        tokens = self._generate_tokens(prompt)
+        time.sleep(self.sample_latency() + self._token_delay() * (len(tokens) - 1))
+        return " ".join(tokens)
+    
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        tokens = self._generate_tokens(prompt)
+        await asyncio.sleep(self.sample_latency() + self._token_delay() * (len(tokens) - 1))
+        return " ".join(tokens)
+    
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        tokens = self._generate_tokens(prompt)
+        time.sleep(self.sample_latency())
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self._token_delay())
+            chunk = GenerationChunk(text=token if i == 0 else f" {token}")
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+    
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        tokens = self._generate_tokens(prompt)
+        await asyncio.sleep(self.sample_latency())
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = GenerationChunk(text=token if i == 0 else f" {token}")
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
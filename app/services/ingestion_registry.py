@@ -0,0 +1,209 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+import hashlib
+import json
+import logging
+import redis
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Unirse como seguidor solo si la ingesta de la URL sigue en curso (atómico en Redis)
+_JOIN_URL_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader then
+    redis.call('SADD', KEYS[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    return leader
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return false
+"""
+
+# Reservar el chat o, si ya está reservado, devolver quién lo tiene (atómico:
+# el lock no puede liberarse entre el SET y el GET)
+_CLAIM_CHAT_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return false
+end
+return redis.call('GET', KEYS[1])
+"""
+
+# Liberar el lock del chat solo si sigue siendo de quien lo reservó
+_RELEASE_CHAT_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['task_id'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def chat_lock_key(chat_id: str) -> str:
+    return f"ingest:chat:{chat_id}"
+
+
+def url_lock_key(url: str) -> str:
+    return f"ingest:url:{_url_hash(url)}"
+
+
+def url_followers_key(url: str) -> str:
+    return f"ingest:url:{_url_hash(url)}:chats"
+
+
+def idempotency_key(key: str) -> str:
+    return f"ingest:idempotency:{key}"
+
+
+def request_fingerprint(request: Dict[str, Any]) -> str:
+    """Huella de una petición normalizada (claves ordenadas) para vincularla a su clave de idempotencia"""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class IdempotencyKeyMismatchError(Exception):
+    """La clave de idempotencia ya se usó con una petición distinta"""
+
+
+def batch_key(batch_id: str) -> str:
+    return f"ingest:batch:{batch_id}"
+
+
+class IngestionRegistry:
+    """
+    Registro en Redis de las ingestas en curso.
+    
+    - Un lock por chat evita lanzar dos tareas sobre la misma colección.
+    - Un lock por URL hace que varios chats que piden la misma URL a la vez
+      compartan una sola descarga y un solo cálculo de embeddings: el primero
+      es el líder y el resto se registran como seguidores.
+    - Las claves de idempotencia devuelven la misma respuesta a reintentos.
+    - Los lotes guardan qué chats se enviaron juntos para agregar su progreso.
+    
+    Los métodos async los usa la API; los síncronos, los workers de Celery.
+    """
+    
+    def __init__(self):
+        self._async_client: Optional[aioredis.Redis] = None
+        self._sync_client: Optional[redis.Redis] = None
+    
+    @property
+    def async_client(self) -> aioredis.Redis:
+        if self._async_client is None:
+            self._async_client = aioredis.Redis.from_url(settings.redis_url, decode_responses=True)
+        return self._async_client
+    
+    @property
+    def sync_client(self) -> redis.Redis:
+        if self._sync_client is None:
+            self._sync_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        return self._sync_client
+    
+    async def get_idempotent_response(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Respuesta ya emitida para una clave de idempotencia. Lanza
+        ``IdempotencyKeyMismatchError`` si la clave se usó con otra petición.
+        """
+        cached = await self.async_client.get(idempotency_key(key))
+        if not cached:
+            return None
+        cached = json.loads(cached)
+        if "fingerprint" not in cached:
+            # Guardada antes de ligar las claves a la petición (caduca con idempotency_ttl_seconds)
+            return cached
+        if cached["fingerprint"] != fingerprint:
+            raise IdempotencyKeyMismatchError(f"Idempotency-Key {key} was already used with a different request")
+        return cached["response"]
+    
+    async def store_idempotent_response(self, key: str, fingerprint: str, response: Dict[str, Any]):
+        await self.async_client.set(
+            idempotency_key(key),
+            json.dumps({"fingerprint": fingerprint, "response": response}),
+            ex=settings.idempotency_ttl_seconds
+        )
+    
+    async def claim_chat(self, chat_id: str, url: str, task_id: str) -> Optional[Dict[str, str]]:
+        """
+        Reservar el chat para una nueva ingesta.
+        
+        Devuelve None si se ha reservado, o los datos de la ingesta que ya está
+        en curso para ese chat.
+        """
+        value = json.dumps({"task_id": task_id, "url": url})
+        current = await self.async_client.eval(
+            _CLAIM_CHAT_SCRIPT, 1, chat_lock_key(chat_id), value, settings.ingestion_lock_ttl_seconds
+        )
+        return json.loads(current) if current else None
+    
+    async def release_chat_async(self, chat_id: str, task_id: str) -> bool:
+        """
+        Liberar el chat reservado por ``task_id``. Si el lock expiró y otra
+        ingesta lo reservó después, se conserva. Devuelve si se liberó.
+        """
+        return bool(await self.async_client.eval(_RELEASE_CHAT_SCRIPT, 1, chat_lock_key(chat_id), task_id))
+    
+    async def join_url(self, url: str, chat_id: str, task_id: str) -> Tuple[bool, str]:
+        """
+        Unirse a la ingesta en curso de una URL o convertirse en su líder.
+        
+        Devuelve (es_lider, task_id de la ingesta que procesará la URL).
+        """
+        leader = await self.async_client.eval(
+            _JOIN_URL_SCRIPT, 2, url_lock_key(url), url_followers_key(url),
+            chat_id, task_id, settings.ingestion_lock_ttl_seconds
+        )
+        if leader:
+            return False, leader
+        return True, task_id
+    
+    async def add_to_batch(self, batch_id: str, chat_ids: List[str]):
+        """Registrar los chats de un lote (un mismo lote puede ampliarse)"""
+        key = batch_key(batch_id)
+        pipe = self.async_client.pipeline(transaction=True)
+        pipe.sadd(key, *chat_ids)
+        pipe.expire(key, settings.batch_ttl_seconds)
+        await pipe.execute()
+    
+    async def get_batch(self, batch_id: str) -> List[str]:
+        return sorted(await self.async_client.smembers(batch_key(batch_id)))
+    
+    async def release_url_async(self, url: str):
+        """Liberar el lock de una URL cuya tarea no llegó a lanzarse"""
+        await self.async_client.delete(url_lock_key(url), url_followers_key(url))
+    
+    def complete_url(self, url: str) -> List[str]:
+        """
+        Cerrar la ingesta de una URL (líder) y devolver los chats seguidores.
+        
+        Se ejecuta en una transacción: un chat que llegue después ya no
+        encuentra el lock y lanza su propia ingesta.
+        """
+        pipe = self.sync_client.pipeline(transaction=True)
+        pipe.smembers(url_followers_key(url))
+        pipe.delete(url_followers_key(url))
+        pipe.delete(url_lock_key(url))
+        followers, _, _ = pipe.execute()
+        return sorted(followers)
+    
+    def try_claim_chat(self, chat_id: str, task_id: str) -> bool:
+        """Reservar el chat desde un worker (p.ej. para borrar su colección); False si está ocupado"""
+        value = json.dumps({"task_id": task_id, "url": None})
+        return bool(self.sync_client.set(
+            chat_lock_key(chat_id), value, nx=True, ex=settings.ingestion_lock_ttl_seconds
+        ))
+    
+    def release_chat(self, chat_id: str, task_id: Optional[str] = None) -> bool:
+        """
+        Liberar el chat desde un worker. Con ``task_id``, solo si sigue siendo
+        suyo; sin él (fin de una ingesta, que libera también los chats de sus
+        seguidores) se libera sin comprobar el dueño.
+        """
+        if task_id is None:
+            return bool(self.sync_client.delete(chat_lock_key(chat_id)))
+        return bool(self.sync_client.eval(_RELEASE_CHAT_SCRIPT, 1, chat_lock_key(chat_id), task_id))
+
+
+ingestion_registry = IngestionRegistry()
@@ -0,0 +1,91 @@
+from collections import deque
+from typing import Deque, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """Ningún proveedor de LLM pudo responder dentro del plazo"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor.
+    
+    Tras ``failure_threshold`` fallos consecutivos se abre y deja de recibir
+    tráfico durante ``cooldown`` segundos; después admite una petición de
+    prueba (half-open) que lo cierra si tiene éxito o lo vuelve a abrir si falla.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+    
+    def allow_request(self) -> bool:
+        """Indicar si se puede enviar una petición a este proveedor"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+    
+    def release_probe(self):
+        """Liberar la petición de prueba si se canceló sin resultado"""
+        self._probe_in_flight = False
+    
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._probe_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Circuit breaker for {self.name} opened after "
+                    f"{self.consecutive_failures} consecutive failures"
+                )
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+class LatencyWindow:
+    """Ventana deslizante de latencias para estimar percentiles"""
+    
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+    
+    def add(self, latency: float):
+        self.samples.append(latency)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    
+    def __len__(self) -> int:
+        return len(self.samples)
@@ -1,28 +1,144 @@
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
 from langchain.llms.base import LLM
 from langchain_community.llms import Ollama
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
+from app.services.fake_llm import FakeLLM
+from app.services.llm_resilience import CircuitBreaker, LatencyWindow, LLMUnavailableError
+from app.services.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
 from app.config import settings
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_ROUTE = "default"
+
+ClientKey = Tuple[str, Optional[str]]
+
+
+@dataclass
+class RouteStats:
+    """Latencia y uso de tokens acumulados para una ruta de LLM"""
+    provider: str
+    model: str
+    calls: int = 0
+    errors: int = 0
+    hedged: int = 0
+    fallbacks: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_latency: float = 0.0
+    latencies: LatencyWindow = field(default_factory=lambda: LatencyWindow(1000))
+    
+    def record(self, latency: float, prompt_tokens: int, completion_tokens: int):
+        self.calls += 1
+        self.total_latency += latency
+        self.latencies.add(latency)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+    
+    def percentile(self, q: float) -> Optional[float]:
+        return self.latencies.percentile(q)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "hedged": self.hedged,
+            "fallbacks": self.fallbacks,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency": self.total_latency / self.calls if self.calls else None,
+            "p50_latency": self.percentile(0.5),
+            "p95_latency": self.percentile(0.95),
+        }
+
+
+def parse_route_spec(spec: str) -> Tuple[str, Optional[str]]:
+    """Convertir 'proveedor:modelo' (o solo 'proveedor') en una tupla"""
+    provider, _, model = spec.partition(":")
+    return provider.strip().lower(), model.strip() or None
+
+
+def _response_text(response: Any) -> str:
+    """Los chat models devuelven mensajes; los LLM de texto devuelven str"""
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _token_usage(prompt: str, response: Any, text: str) -> Tuple[int, int]:
+    """Uso de tokens reportado por el proveedor o una estimación por palabras"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or metadata.get("usage")
+    if usage:
+        return (
+            usage.get("prompt_tokens", usage.get("input_tokens", 0)),
+            usage.get("completion_tokens", usage.get("output_tokens", 0))
+        )
+    
+    return len(prompt.split()), len(text.split())
+
 
 class LLMService:
     """Servicio para manejar diferentes proveedores de LLM"""
     
     def __init__(self):
-        self.llm = self._initialize_llm()
+        self._clients: Dict[ClientKey, LLM] = {}
+        self._latencies: Dict[ClientKey, LatencyWindow] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.routes: Dict[str, Tuple[str, Optional[str]]] = {
+            DEFAULT_ROUTE: (settings.llm_provider.lower(), None)
+        }
+        for route, spec in settings.llm_routes.items():
+            self.routes[route] = parse_route_spec(spec)
+        
+        self.route_stats: Dict[str, RouteStats] = {}
+        for route, (provider, model) in self.routes.items():
+            llm = self._get_client(provider, model)
+            self.route_stats[route] = RouteStats(provider=provider, model=self._model_name(llm))
+        
+        self.llm = self._get_client(*self.routes[DEFAULT_ROUTE])
+        
+        # Proveedor de respaldo para hedging y circuitos abiertos
+        self.fallback: Optional[ClientKey] = None
+        if settings.llm_fallback:
+            self.fallback = parse_route_spec(settings.llm_fallback)
+            self._get_client(*self.fallback)
+    
+    def _get_client(self, provider: str, model: Optional[str]) -> LLM:
+        """Reutilizar un cliente por pareja proveedor/modelo"""
+        key = (provider, model)
+        if key not in self._clients:
+            self._clients[key] = self._initialize_llm(provider, model)
+            self._latencies[key] = LatencyWindow()
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker(
+                    provider,
+                    failure_threshold=settings.llm_circuit_failure_threshold,
+                    cooldown=settings.llm_circuit_cooldown_seconds
+                )
+        return self._clients[key]
     
-    def _initialize_llm(self) -> LLM:
+    @staticmethod
+    def _model_name(llm: LLM) -> str:
+        return getattr(llm, "model", None) or getattr(llm, "model_name", None) or getattr(llm, "_llm_type", type(llm).__name__)
+    
+    def _initialize_llm(self, provider: Optional[str] = None, model: Optional[str] = None) -> LLM:
         """Inicializar el LLM según la configuración"""
-        provider = settings.llm_provider.lower()
+        provider = (provider or settings.llm_provider).lower()
         
         if provider == "ollama":
             return Ollama(
                 base_url=settings.ollama_base_url,
-                model=settings.ollama_model,
+                model=model or settings.ollama_model,
                 temperature=0.7
             )
         elif provider == "openai":
@@ -30,7 +146,7 @@ class LLMService:
                 raise ValueError("OpenAI API key not configured")
             return ChatOpenAI(
                 api_key=settings.openai_api_key,
-                model="gpt-4o-mini",  # o gpt-4o para mejor calidad
+                model=model or settings.openai_model,
                 temperature=0.7
             )
         elif provider == "anthropic":
@@ -38,20 +154,152 @@ class LLMService:
                 raise ValueError("Anthropic API key not configured")
             return ChatAnthropic(
                 api_key=settings.anthropic_api_key,
-                model="claude-3-haiku-20240307",  # o claude-3-opus-20240229 para mejor calidad
+                model=model or settings.anthropic_model,
                 temperature=0.7
             )
+        elif provider == "fake":
+            return FakeLLM(
+                response_tokens=settings.fake_llm_response_tokens,
+                latency_ms=settings.fake_llm_latency_ms,
+                latency_stddev_ms=settings.fake_llm_latency_stddev_ms,
+                latency_distribution=settings.fake_llm_latency_distribution,
+                tokens_per_second=settings.fake_llm_tokens_per_second,
+                seed=settings.fake_llm_seed
+            )
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
     
-    async def generate_response(self, prompt: str) -> str:
-        """Generar respuesta usando el LLM configurado"""
+    def resolve_route(self, route: Optional[str]) -> str:
+        """Rutas sin configuración propia usan el modelo por defecto"""
+        return route if route in self.routes else DEFAULT_ROUTE
+    
+    def _hedge_delay(self, key: ClientKey) -> Optional[float]:
+        """Esperar el p95 del proveedor principal antes de duplicar la petición"""
+        window = self._latencies[key]
+        if len(window) < settings.llm_hedge_min_samples:
+            return settings.llm_hedge_initial_delay_seconds
+        return max(window.percentile(0.95), settings.llm_hedge_min_delay_seconds)
+    
+    async def _invoke(self, key: ClientKey, prompt: str) -> Tuple[Any, float]:
+        """Llamar a un proveedor registrando latencia y estado del circuito"""
+        breaker = self.breakers[key[0]]
+        llm = self._clients[key]
+        model = self._model_name(llm)
+        start = time.perf_counter()
         try:
-            response = await self.llm.ainvoke(prompt)
-            return response
+            response = await llm.ainvoke(prompt)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            LLM_REQUEST_SECONDS.labels(key[0], model, "cancelled").observe(time.perf_counter() - start)
+            raise
         except Exception as e:
-            logger.error(f"Error generating LLM response: {str(e)}")
+            breaker.record_failure()
+            LLM_REQUEST_SECONDS.labels(key[0], model, "error").observe(time.perf_counter() - start)
+            logger.warning(f"LLM provider {key[0]} failed: {str(e)}")
             raise
+        latency = time.perf_counter() - start
+        breaker.record_success()
+        self._latencies[key].add(latency)
+        LLM_REQUEST_SECONDS.labels(key[0], model, "success").observe(latency)
+        return response, latency
+    
+    async def generate_response(self, prompt: str, route: Optional[str] = None) -> str:
+        """
+        Generar respuesta usando el LLM configurado para la ruta.
+        
+        Cada llamada tiene un plazo máximo. Si el proveedor principal tarda
+        más que su p95 se envía una petición duplicada al proveedor de
+        respaldo y se usa la primera respuesta. Los proveedores con el
+        circuito abierto se omiten.
+        """
+        route = self.resolve_route(route)
+        stats = self.route_stats[route]
+        primary = self.routes[route]
+        fallback = self.fallback if self.fallback and self.fallback != primary else None
+        timeout = settings.llm_route_timeouts.get(route, settings.llm_timeout_seconds)
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending: Dict[asyncio.Task, ClientKey] = {}
+        launched = set()
+        
+        def launch(key: ClientKey) -> bool:
+            if key in launched or not self.breakers[key[0]].allow_request():
+                return False
+            launched.add(key)
+            pending[asyncio.ensure_future(self._invoke(key, prompt))] = key
+            return True
+        
+        start = time.perf_counter()
+        hedge_at: Optional[float] = None
+        if launch(primary):
+            if fallback and settings.llm_hedge_enabled:
+                hedge_at = loop.time() + self._hedge_delay(primary)
+        elif fallback:
+            launch(fallback)
+        
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = loop.time()
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                if now >= deadline:
+                    break
+                done, _ = await asyncio.wait(
+                    set(pending), timeout=wake_at - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    key = pending.pop(task)
+                    if task.exception() is None:
+                        response, _ = task.result()
+                        if key != primary:
+                            stats.fallbacks += 1
+                        return self._finish(route, key, prompt, response, time.perf_counter() - start)
+                    last_error = task.exception()
+                
+                # Fallo rápido del principal o p95 superado: duplicar en el respaldo
+                hedge_due = hedge_at is not None and loop.time() >= hedge_at
+                if fallback and (hedge_due or not pending):
+                    hedge_at = None
+                    if launch(fallback) and len(pending) > 1:
+                        stats.hedged += 1
+                        logger.info(f"Hedging LLM route={route} to {fallback[0]}")
+        finally:
+            for task, key in pending.items():
+                task.cancel()
+                # Agotar el plazo cuenta como fallo del proveedor
+                if loop.time() >= deadline:
+                    self.breakers[key[0]].record_failure()
+        
+        stats.errors += 1
+        if last_error is None and loop.time() >= deadline:
+            message = f"LLM route {route} exceeded its {timeout}s deadline"
+        elif last_error is None:
+            message = f"No LLM provider available for route {route} (circuit open)"
+        else:
+            message = f"LLM route {route} failed: {str(last_error)}"
+        logger.error(message)
+        raise LLMUnavailableError(message)
+    
+    def _finish(self, route: str, key: ClientKey, prompt: str, response: Any, latency: float) -> str:
+        """Registrar latencia y tokens de la respuesta ganadora"""
+        stats = self.route_stats[route]
+        text = _response_text(response)
+        prompt_tokens, completion_tokens = _token_usage(prompt, response, text)
+        stats.record(latency, prompt_tokens, completion_tokens)
+        model = self._model_name(self._clients[key])
+        LLM_TOKENS.labels(key[0], model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(key[0], model, "completion").inc(completion_tokens)
+        logger.debug(
+            f"LLM route={route} provider={stats.provider} model={stats.model} "
+            f"latency={latency:.3f}s tokens={prompt_tokens}/{completion_tokens}"
+        )
+        return text
+    
+    def get_route_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estadísticas por ruta para ajustar el mapeo de modelos"""
+        return {route: stats.to_dict() for route, stats in self.route_stats.items()}
     
     async def analyze_intent(self, question: str, chat_history: list) -> str:
         """Analizar la intención de la pregunta del usuario"""
@@ -69,8 +317,8 @@ class LLMService:
         """
         
         try:
-            intent = await self.generate_response(intent_prompt)
+            intent = await self.generate_response(intent_prompt, route="analyze_intent")
             return intent.strip().lower()
         except Exception as e:
             logger.error(f"Error analyzing intent: {str(e)}")
-            return "general_query"  # Fallback por defecto 
\ No newline at end of file
+            return "general_query"  # Fallback por defecto
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from app.models.database import AsyncSessionLocal
+from app.services.chat_service import ChatService
+from app.config import settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBehind:
+    """
+    Cola write-behind para el historial de chat.
+    
+    Los intercambios pregunta/respuesta se encolan en memoria y una tarea en
+    segundo plano los persiste por lotes (varias peticiones, una transacción),
+    fuera del camino de la respuesta. La cola está acotada: si se llena, el
+    productor espera (backpressure) en lugar de crecer sin límite.
+    
+    Expone ``name``, ``ready`` y ``status()`` como los componentes de
+    ``warmup`` para que ``/ready`` informe si la tarea de escritura murió.
+    """
+    
+    name = "message_writer"
+    
+    def __init__(
+        self,
+        max_queue: int = settings.chat_write_queue_max,
+        batch_size: int = settings.chat_write_batch_size,
+        flush_interval: float = settings.chat_write_flush_interval
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Intercambios encolados aún no persistidos, para lecturas coherentes
+        self._pending: Dict[str, List[tuple[str, str]]] = defaultdict(list)
+        self.errors = 0
+        self.last_error: Optional[str] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    @property
+    def ready(self) -> bool:
+        return self.running
+    
+    def status(self) -> Dict[str, Any]:
+        if self.running:
+            state = "ready"
+        elif self._task is not None and not self._stopping:
+            # La tarea terminó sin que se llamara a stop()
+            state = "failed"
+        else:
+            state = "stopped"
+        return {"state": state, "error": self.last_error, "errors": self.errors, "queued": self._queue.qsize() if self._queue else 0}
+    
+    async def start(self):
+        """Arrancar la tarea de escritura en el event loop actual"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Chat message write-behind queue started")
+    
+    async def stop(self):
+        """Vaciar la cola y detener la tarea (llamar al apagar la aplicación)"""
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Chat message write-behind queue flushed and stopped")
+    
+    async def enqueue(self, chat_id: str, user_message: str, agent_message: str):
+        """Encolar un intercambio; sin tarea activa se escribe directamente"""
+        if not self.running:
+            await self._flush([(chat_id, user_message, agent_message)])
+            return
+        
+        if self._queue.full():
+            logger.warning("Chat message write-behind queue is full, applying backpressure")
+        self._pending[chat_id].append((user_message, agent_message))
+        await self._queue.put((chat_id, user_message, agent_message))
+    
+    def pending_exchanges(self, chat_id: str) -> List[tuple[str, str]]:
+        """Intercambios de un chat encolados pero aún no persistidos"""
+        return list(self._pending.get(chat_id, ()))
+    
+    async def _run(self):
+        while True:
+            if self._stopping and self._queue.empty():
+                return
+            try:
+                await self._write_next_batch()
+            except Exception as e:
+                # Un error inesperado no debe detener la escritura del historial
+                self.errors += 1
+                self.last_error = str(e)
+                logger.exception(f"Chat message write-behind error: {str(e)}")
+    
+    async def _write_next_batch(self):
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        if item is None:
+            return
+        
+        # Agrupar lo que llegue durante la ventana de flush
+        batch = [item]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = 0 if self._stopping else deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is not None:
+                batch.append(item)
+        
+        try:
+            await self._flush(batch)
+        finally:
+            # Escritos o descartados, dejan de estar pendientes
+            for chat_id, user_message, agent_message in batch:
+                pending = self._pending.get(chat_id)
+                if pending:
+                    pending.remove((user_message, agent_message))
+                    if not pending:
+                        del self._pending[chat_id]
+    
+    async def _flush(self, batch: List[tuple[str, str, str]]):
+        """
+        Persistir un lote en una transacción y actualizar los resúmenes
+        
+        Si el lote falla dos veces se escribe intercambio a intercambio: una
+        fila inválida solo descarta su intercambio, no los de otros chats.
+        """
+        async with AsyncSessionLocal() as session:
+            chat_service = ChatService(session)
+            saved = batch
+            if not await chat_service.save_exchanges(batch):
+                # Reintentar una vez (p.ej. un fallo transitorio de conexión)
+                if not await chat_service.save_exchanges(batch):
+                    saved = [exchange for exchange in batch if await chat_service.save_exchanges([exchange])]
+                    if len(saved) < len(batch):
+                        logger.error(f"Dropping {len(batch) - len(saved)} of {len(batch)} chat exchanges after failed write")
+            
+            for chat_id in {chat_id for chat_id, _, _ in saved}:
+                await chat_service.update_rolling_summary(chat_id)
+
+
+message_writer = MessageWriteBehind()
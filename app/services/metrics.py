@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from functools import wraps
+from typing import Awaitable, Callable, Iterator, TypeVar
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+import os
+import time
+
+T = TypeVar("T")
+
+# Solo etiquetas de cardinalidad acotada (nodo, etapa, proveedor...): nunca chat_id ni URLs
+
+AGENT_NODE_SECONDS = Histogram(
+    "agent_node_duration_seconds",
+    "Duración de cada nodo del grafo de DocumentationAgent",
+    ["node"],
+)
+
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_duration_seconds",
+    "Duración de cada etapa de la ingesta de documentación",
+    ["stage"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+EMBEDDING_BATCH_SECONDS = Histogram(
+    "embedding_batch_duration_seconds",
+    "Duración de cada lote de embeddings",
+)
+
+EMBEDDED_CHUNKS = Counter(
+    "embedding_chunks",
+    "Chunks embebidos (rate() da el throughput)",
+)
+
+CHROMA_QUERY_SECONDS = Histogram(
+    "chroma_query_duration_seconds",
+    "Latencia de las consultas a ChromaDB",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds",
+    "Latencia de las llamadas a cada proveedor de LLM",
+    ["provider", "model", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens consumidos por proveedor de LLM",
+    ["provider", "model", "kind"],
+)
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Medir la duración de un bloque en el histograma (también si falla)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
+
+
+def timed_node(name: str, node: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Envolver un nodo async del grafo para medir su duración"""
+    
+    @wraps(node)
+    async def wrapper(*args, **kwargs) -> T:
+        with observe(AGENT_NODE_SECONDS, node=name):
+            return await node(*args, **kwargs)
+    
+    return wrapper
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registro a exportar.
+    
+    Con varios procesos (gunicorn o el pool prefork de Celery) cada uno escribe
+    sus métricas en PROMETHEUS_MULTIPROC_DIR y aquí se agregan todas.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> bytes:
+    return generate_latest(metrics_registry())
+
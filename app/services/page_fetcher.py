@@ -0,0 +1,164 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.html_sections import SectionParser, TextSectionParser
+import codecs
+import logging
+import re
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Analizador incremental por tipo de contenido; el resto (imágenes, PDF,
+# binarios) se rechaza antes de leer el cuerpo
+CONTENT_HANDLERS: Dict[str, Callable] = {
+    "text/html": SectionParser,
+    "application/xhtml+xml": SectionParser,
+    "text/plain": TextSectionParser,
+}
+
+# Sin cabecera Content-Type se asume HTML
+DEFAULT_CONTENT_TYPE = "text/html"
+
+# Bytes iniciales en los que se busca el <meta charset> antes de decodificar
+CHARSET_SNIFF_BYTES = 4096
+
+# <meta charset="..."> y <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+class UnsupportedContentError(Exception):
+    """La URL devuelve un tipo de contenido que no se sabe procesar"""
+
+
+@dataclass
+class FetchedPage:
+    """Resultado de una descarga: secciones extraídas y datos de la respuesta"""
+    url: str
+    content_type: str
+    encoding: str
+    bytes_read: int
+    truncated: bool
+    status_code: int = 200
+    # Segundos hasta recibir las cabeceras (no depende del tamaño de la página)
+    latency_seconds: float = 0.0
+    sections: List[Dict] = field(default_factory=list)
+
+
+def parse_content_type(header: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Tipo MIME y charset (o None) de una cabecera Content-Type"""
+    if not header:
+        return DEFAULT_CONTENT_TYPE, None
+    mime, _, params = header.partition(";")
+    charset = None
+    for param in params.split(";"):
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            charset = value.strip().strip("\"'") or None
+    return mime.strip().lower() or DEFAULT_CONTENT_TYPE, charset
+
+
+def known_encoding(name: Optional[str]) -> Optional[str]:
+    """Nombre canónico de una codificación, o None si Python no la conoce"""
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def detect_charset(head: bytes, declared: Optional[str] = None) -> str:
+    """
+    Codificación de un documento a partir de sus primeros bytes
+    
+    Por orden: BOM, charset de la cabecera Content-Type, ``<meta charset>``
+    en ``head`` y, si nada de eso es válido, UTF-8.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    encoding = known_encoding(declared)
+    if encoding:
+        return encoding
+    match = META_CHARSET_PATTERN.search(head)
+    if match:
+        encoding = known_encoding(match.group(1).decode("ascii", "ignore"))
+        if encoding:
+            return encoding
+    return "utf-8"
+
+
+async def fetch_page(url: str, client: Optional[httpx.AsyncClient] = None, max_bytes: Optional[int] = None) -> FetchedPage:
+    """
+    Descargar una página en streaming y extraer sus secciones según llega
+    
+    El tipo de contenido se comprueba antes de leer el cuerpo, que se
+    decodifica y analiza por trozos: la memoria por página no depende del
+    tamaño del documento. Al superar ``max_bytes`` (``scrape_max_bytes`` por
+    defecto) la descarga se corta y se usa lo leído hasta ahí. Lanza
+    ``UnsupportedContentError`` si no hay analizador para el tipo de contenido.
+    """
+    if client is None:
+        async with httpx.AsyncClient() as client:
+            return await fetch_page(url, client, max_bytes)
+    
+    max_bytes = settings.scrape_max_bytes if max_bytes is None else max_bytes
+    started = time.perf_counter()
+    async with client.stream("GET", url, timeout=30.0) as response:
+        latency = time.perf_counter() - started
+        response.raise_for_status()
+        content_type, declared = parse_content_type(response.headers.get("content-type"))
+        handler = CONTENT_HANDLERS.get(content_type)
+        if handler is None:
+            raise UnsupportedContentError(f"Unsupported content type {content_type} for {url}")
+        
+        parser = handler()
+        decoder = None
+        encoding = ""
+        head = b""
+        bytes_read = 0
+        truncated = False
+        async for chunk in response.aiter_bytes(settings.scrape_read_chunk_bytes):
+            if bytes_read + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - bytes_read]
+                truncated = True
+            bytes_read += len(chunk)
+            if decoder is None:
+                # Acumular el principio del documento hasta poder detectar su codificación
+                head += chunk
+                if len(head) < CHARSET_SNIFF_BYTES and not truncated:
+                    continue
+                encoding = detect_charset(head, declared)
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                chunk, head = head, b""
+            parser.feed(decoder.decode(chunk))
+            if truncated:
+                break
+        
+        if decoder is None:
+            encoding = detect_charset(head, declared)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            parser.feed(decoder.decode(head))
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+    
+    if truncated:
+        logger.warning(f"Page {url} exceeds {max_bytes} bytes, keeping only the first {bytes_read}")
+    return FetchedPage(
+        url=url,
+        content_type=content_type,
+        encoding=encoding,
+        bytes_read=bytes_read,
+        truncated=truncated,
+        status_code=response.status_code,
+        latency_seconds=latency,
+        sections=parser.sections,
+    )
@@ -0,0 +1,62 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+import json
+import logging
+import uuid
+import zlib
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+def payload_key(ref: str) -> str:
+    return f"ingest:payload:{ref}"
+
+
+class PayloadStore:
+    """
+    Almacén temporal en Redis para pasar datos entre etapas de la ingesta.
+    
+    Las tareas encadenadas reciben solo una referencia corta; los chunks viajan
+    comprimidos por Redis en lugar de copiarse en cada mensaje del broker.
+    """
+    
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self._client = client
+    
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.redis_url)
+        return self._client
+    
+    def put_chunks(self, chunks: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Guardar los chunks (y sus metadatos, si los hay) y devolver su referencia"""
+        ref = uuid.uuid4().hex
+        payload = {"chunks": chunks, "metadatas": metadatas or []}
+        data = zlib.compress(json.dumps(payload).encode("utf-8"))
+        self.client.set(payload_key(ref), data, ex=settings.ingestion_payload_ttl_seconds)
+        return ref
+    
+    def get_payload(self, ref: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Chunks y metadatos de una referencia"""
+        data = self.client.get(payload_key(ref))
+        if data is None:
+            raise KeyError(f"Ingestion payload {ref} not found or expired")
+        payload = json.loads(zlib.decompress(data).decode("utf-8"))
+        # Payloads encolados antes de guardar metadatos: solo la lista de chunks
+        if isinstance(payload, list):
+            return payload, []
+        return payload["chunks"], payload["metadatas"]
+    
+    def get_chunks(self, ref: str) -> List[str]:
+        return self.get_payload(ref)[0]
+    
+    def delete(self, ref: str):
+        try:
+            self.client.delete(payload_key(ref))
+        except Exception as e:
+            logger.warning(f"Error deleting ingestion payload {ref}: {str(e)}")
+
+
+payload_store = PayloadStore()
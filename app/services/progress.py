@@ -0,0 +1,141 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.config import settings
+import json
+import logging
+import time
+import redis
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "EVICTED")
+
+# Etapa del evento final según el estado del trabajo
+TERMINAL_STAGES = {"COMPLETED": "done", "FAILED": "failed", "EVICTED": "evicted"}
+
+
+def progress_channel(chat_id: str) -> str:
+    return f"progress:{chat_id}"
+
+
+def progress_key(chat_id: str) -> str:
+    return f"progress:last:{chat_id}"
+
+
+class ProgressReporter:
+    """
+    Publicar el progreso de la ingesta de un chat en Redis.
+    
+    Cada actualización se publica en el canal ``progress:{chat_id}`` y se guarda
+    como último estado, para que un cliente que se conecta tarde lo reciba de
+    inmediato. Los fallos de Redis no interrumpen la ingesta.
+    """
+    
+    def __init__(self, chat_id: str, client: Optional[redis.Redis] = None):
+        self.chat_id = chat_id
+        self.client = client or redis.Redis.from_url(settings.redis_url)
+        self.started_at = time.time()
+        self.state: Dict[str, Any] = {
+            "chat_id": chat_id,
+            "status": "PENDING",
+            "stage": "queued",
+            "pages_fetched": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "eta_seconds": None,
+        }
+        self._embed_started_at: Optional[float] = None
+    
+    def update(self, **fields):
+        """Actualizar campos del progreso y publicarlo"""
+        self.state.update(fields)
+        self.state["elapsed_seconds"] = round(time.time() - self.started_at, 2)
+        self.state["updated_at"] = time.time()
+        payload = json.dumps(self.state)
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(progress_key(self.chat_id), payload, ex=settings.progress_ttl_seconds)
+            pipe.publish(progress_channel(self.chat_id), payload)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error publishing progress for chat_id {self.chat_id}: {str(e)}")
+    
+    def chunks_embedded(self, embedded: int):
+        """Registrar chunks embebidos y estimar el tiempo restante"""
+        now = time.time()
+        if self._embed_started_at is None:
+            self._embed_started_at = now
+        total = self.state["chunks_total"]
+        elapsed = now - self._embed_started_at
+        eta = None
+        if embedded and total:
+            eta = round(elapsed / embedded * (total - embedded), 1)
+        self.update(chunks_embedded=embedded, eta_seconds=eta)
+
+
+async def load_progress(chat_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Último estado conocido de varios chats en una sola consulta"""
+    if not chat_ids:
+        return {}
+    client = aioredis.Redis.from_url(settings.redis_url)
+    try:
+        values = await client.mget([progress_key(chat_id) for chat_id in chat_ids])
+    finally:
+        await client.aclose()
+    return {chat_id: json.loads(value) for chat_id, value in zip(chat_ids, values) if value}
+
+
+def final_progress(chat_id: str, status: str, last: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Evento final de un trabajo ya terminado según la base de datos: el último
+    estado publicado si coincide, o uno mínimo si expiró o nunca se publicó
+    (p.ej. chats importados de un snapshot o desalojados)
+    """
+    if last and last.get("status") == status:
+        return last
+    return {"chat_id": chat_id, "status": status, "stage": TERMINAL_STAGES[status], "eta_seconds": None}
+
+
+async def stream_progress(
+    chat_id: str, job_status: Optional[str] = None, keepalive: float = 15.0
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Emitir el último estado conocido y después cada actualización publicada,
+    hasta que el procesamiento termina. Produce ``None`` como keepalive.
+    
+    Si ``job_status`` (el estado del trabajo en la base de datos) ya es final
+    se emite un único evento sin suscribirse: puede no llegar ninguno más.
+    """
+    client = aioredis.Redis.from_url(settings.redis_url)
+    if job_status in TERMINAL_STATUSES:
+        try:
+            last = await client.get(progress_key(chat_id))
+            yield final_progress(chat_id, job_status, json.loads(last) if last else None)
+        finally:
+            await client.aclose()
+        return
+    
+    pubsub = client.pubsub()
+    try:
+        # Suscribirse antes de leer el último estado para no perder eventos
+        await pubsub.subscribe(progress_channel(chat_id))
+        last = await client.get(progress_key(chat_id))
+        if last:
+            event = json.loads(last)
+            yield event
+            if event.get("status") in TERMINAL_STATUSES:
+                return
+        
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive)
+            if message is None:
+                yield None
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event.get("status") in TERMINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe(progress_channel(chat_id))
+        await pubsub.aclose()
+        await client.aclose()
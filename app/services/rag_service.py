@@ -1,47 +1,82 @@
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Sequence
 from sentence_transformers import SentenceTransformer
-import chromadb
+from app.services.chunk_text_store import chunk_text_store
+from app.services.collection_lifecycle import collection_lifecycle
+from app.utils.text_processing import languages_in_question
+from app.services.metrics import CHROMA_QUERY_SECONDS, observe
+from app.services.vector_store import TEXT_STORE_KEY, collection_name, distance_to_similarity, get_vector_store
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+_fanout_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_fanout_executor() -> ThreadPoolExecutor:
+    """Hilos compartidos para consultar varias colecciones a la vez (hnswlib libera el GIL)"""
+    global _fanout_executor
+    if _fanout_executor is None:
+        _fanout_executor = ThreadPoolExecutor(max_workers=settings.rag_fanout_workers, thread_name_prefix="rag-fanout")
+    return _fanout_executor
+
+
+def code_filters(question: str) -> List[Optional[Dict[str, Any]]]:
+    """
+    Filtros ``where`` de una pregunta de código, del más al menos específico:
+    chunks con código en los lenguajes mencionados, chunks con algún bloque
+    de código y, por último, sin filtro (colecciones sin esos metadatos o
+    documentación sin bloques ``<pre>``).
+    """
+    filters: List[Optional[Dict[str, Any]]] = []
+    by_language = [{f"lang_{language}": True} for language in languages_in_question(question)]
+    if by_language:
+        filters.append(by_language[0] if len(by_language) == 1 else {"$or": by_language})
+    return filters + [{"has_code": True}, None]
+
+
+def merge_results(documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Mezclar resultados de varias colecciones por similitud coseno y quedarse
+    con los ``top_k`` mejores. Un mismo texto indexado en dos colecciones
+    (p.ej. páginas compartidas entre un framework y sus plugins) aparece una
+    vez; se compara su ``content_hash`` si lo tiene, sin necesidad del texto.
+    Los que no tienen ni huella ni texto se identifican por chat y chunk.
+    """
+    merged, seen = [], set()
+    for doc in sorted(documents, key=lambda doc: doc["similarity_score"], reverse=True):
+        key = doc["metadata"].get("content_hash") or doc["content"] or (doc["metadata"].get("chat_id"), doc.get("chunk_id"))
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(doc)
+        if len(merged) == top_k:
+            break
+    return merged
+
 
 class RAGService:
     """Servicio RAG implementado desde cero"""
     
-    def __init__(self):
-        self.embedding_model = SentenceTransformer(settings.embedding_model)
-        self.client = chromadb.PersistentClient(path=settings.chroma_persist_directory)
+    def __init__(self, embedding_model=None, client=None, text_store=None):
+        self.embedding_model = embedding_model or SentenceTransformer(settings.embedding_model)
+        # Store repartido en shards con la misma interfaz que un cliente de Chroma
+        self.client = client or get_vector_store()
+        # Textos de las colecciones creadas con chunk_text_store
+        self.text_store = text_store or chunk_text_store
     
-    def retrieve_documents(self, question: str, chat_id: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def retrieve_documents(
+        self, question: str, chat_id: str, top_k: int = 5, filters: Sequence[Optional[Dict[str, Any]]] = (None,)
+    ) -> List[Dict[str, Any]]:
         """
         Recuperar documentos relevantes usando similitud de embeddings
         """
         try:
-            # Obtener colección
-            collection_name = f"chat_{chat_id}"
-            collection = self.client.get_collection(collection_name)
-            
             # Generar embedding de la pregunta
-            question_embedding = self.embedding_model.encode([question])
+            question_embedding = self.embedding_model.encode([question], normalize_embeddings=True)
             
-            # Buscar documentos similares
-            results = collection.query(
-                query_embeddings=question_embedding.tolist(),
-                n_results=top_k,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            # Formatear resultados
-            documents = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    documents.append({
-                        "content": doc,
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        "similarity_score": 1 - results['distances'][0][i] if results['distances'] and results['distances'][0] else 0
-                    })
+            documents = self.hydrate(self._query_collection(chat_id, question_embedding.tolist(), top_k, filters))
             
             logger.info(f"Retrieved {len(documents)} documents for chat_id: {chat_id}")
             return documents
@@ -50,13 +85,146 @@ class RAGService:
             logger.error(f"Error retrieving documents: {str(e)}")
             return []
     
+    def retrieve_from_collections(
+        self,
+        question: str,
+        chat_ids: List[str],
+        top_k: int = 5,
+        timeout: Optional[float] = None,
+        filters: Sequence[Optional[Dict[str, Any]]] = (None,)
+    ) -> List[Dict[str, Any]]:
+        """
+        Recuperar documentos de varios chats (p.ej. un framework y sus plugins)
+        
+        La pregunta se embebe una sola vez y las colecciones se consultan en
+        paralelo. Las similitudes son coseno en todas (también en colecciones
+        antiguas en L2), así que se pueden mezclar bajo un único ``top_k``. Las
+        colecciones que no responden dentro de ``timeout`` segundos se omiten.
+        ``filters`` se aplica en cada colección como en ``_query_collection``.
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        timeout = settings.rag_fanout_timeout_seconds if timeout is None else timeout
+        try:
+            question_embedding = self.embedding_model.encode([question], normalize_embeddings=True).tolist()
+            
+            with observe(CHROMA_QUERY_SECONDS, operation="fanout"):
+                futures = {
+                    get_fanout_executor().submit(self._query_collection, chat_id, question_embedding, top_k, filters): chat_id
+                    for chat_id in chat_ids
+                }
+                done, pending = wait(futures, timeout=timeout)
+            
+            for future in pending:
+                future.cancel()
+            if pending:
+                logger.warning(
+                    f"Fan-out search skipped {len(pending)} collections after {timeout}s: "
+                    f"{', '.join(sorted(futures[future] for future in pending))}"
+                )
+            
+            documents = []
+            for future in done:
+                try:
+                    documents.extend(future.result())
+                except Exception as e:
+                    logger.warning(f"Error retrieving documents for chat_id {futures[future]}: {str(e)}")
+            
+            merged = self.hydrate(merge_results(documents, top_k))
+            logger.info(f"Retrieved {len(merged)} documents from {len(done)}/{len(chat_ids)} chats")
+            return merged
+            
+        except Exception as e:
+            logger.error(f"Error retrieving documents: {str(e)}")
+            return []
+    
+    def _query_collection(
+        self,
+        chat_id: str,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        filters: Sequence[Optional[Dict[str, Any]]] = (None,)
+    ) -> List[Dict[str, Any]]:
+        """
+        Consultar la colección de un chat; cada documento lleva su chat_id y su similitud coseno
+        
+        Los filtros ``where`` de ``filters`` se prueban en orden hasta que uno
+        devuelve resultados (``None`` = sin filtro). En las colecciones con
+        almacén de textos el contenido queda en None, con su ``chunk_id``, y lo
+        rellena ``hydrate``.
+        """
+        # Obtener colección
+        collection = self.client.get_collection(collection_name(chat_id))
+        collection_lifecycle.touch(chat_id)
+        collection_metadata = collection.metadata or {}
+        text_store = bool(collection_metadata.get(TEXT_STORE_KEY))
+        # Sin textos en Chroma se identifica cada resultado por su id
+        hits_field = "ids" if text_store else "documents"
+        include = ["metadatas", "distances"] if text_store else ["documents", "metadatas", "distances"]
+        
+        # Buscar documentos similares
+        for where in filters:
+            kwargs = {"where": where} if where else {}
+            with observe(CHROMA_QUERY_SECONDS, operation="query"):
+                results = collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=top_k,
+                    include=include,
+                    **kwargs
+                )
+            if results[hits_field] and results[hits_field][0]:
+                break
+        
+        # Formatear resultados
+        space = collection_metadata.get("hnsw:space", "l2")
+        documents = []
+        if results[hits_field] and results[hits_field][0]:
+            for i, hit in enumerate(results[hits_field][0]):
+                metadata = results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {}
+                document = {
+                    "content": None if text_store else hit,
+                    "metadata": {**(metadata or {}), "chat_id": chat_id},
+                    "similarity_score": distance_to_similarity(results['distances'][0][i], space) if results['distances'] and results['distances'][0] else 0
+                }
+                if text_store:
+                    document["chunk_id"] = hit
+                documents.append(document)
+        return documents
+    
+    def hydrate(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Leer del almacén de textos el contenido de los documentos que no lo
+        traen, con una lectura por chat. Se llama solo con los resultados
+        finales; los documentos cuyo texto ya no existe se descartan.
+        """
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in documents:
+            if doc["content"] is None:
+                pending.setdefault(doc["metadata"]["chat_id"], []).append(doc)
+        if not pending:
+            return documents
+        
+        with observe(CHROMA_QUERY_SECONDS, operation="hydrate"):
+            for chat_id, docs in pending.items():
+                for doc, text in zip(docs, self.text_store.get_many(chat_id, [doc["chunk_id"] for doc in docs])):
+                    doc["content"] = text
+        
+        hydrated = [doc for doc in documents if doc["content"] is not None]
+        if len(hydrated) < len(documents):
+            logger.warning(f"Missing chunk texts for {len(documents) - len(hydrated)} documents")
+        return hydrated
+    
     def retrieve_code_documents(self, question: str, chat_id: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Recuperar documentos específicos de código
         """
-        # Para consultas de código, podemos ajustar la búsqueda
-        # Por ahora, usamos la misma lógica pero con más resultados
-        return self.retrieve_documents(question, chat_id, top_k * 2)
+        # Solo chunks con código (en el lenguaje de la pregunta, si lo menciona)
+        return self.retrieve_documents(question, chat_id, top_k, filters=code_filters(question))
+    
+    def retrieve_code_from_collections(self, question: str, chat_ids: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Recuperar documentos de código de varios chats
+        """
+        return self.retrieve_from_collections(question, chat_ids, top_k, filters=code_filters(question))
     
     def format_context(self, documents: List[Dict[str, Any]]) -> str:
         """
@@ -70,7 +238,9 @@ class RAGService:
             content = doc["content"]
             metadata = doc.get("metadata", {})
             source_url = metadata.get("source_url", "Fuente desconocida")
+            heading_path = metadata.get("heading_path")
+            section = f", Sección: {heading_path}" if heading_path else ""
             
-            context_parts.append(f"Documento {i} (Fuente: {source_url}):\n{content}\n")
+            context_parts.append(f"Documento {i} (Fuente: {source_url}{section}):\n{content}\n")
         
         return "\n".join(context_parts) 
\ No newline at end of file
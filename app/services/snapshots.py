@@ -0,0 +1,244 @@
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.chunk_text_store import ChunkTextStore, chunk_text_store, content_hash
+from app.services.collection_lifecycle import collection_lifecycle
+from app.services.vector_store import (
+    EMBEDDING_MODEL_KEY,
+    TEXT_STORE_KEY,
+    ShardedVectorStore,
+    collection_name,
+    get_vector_store,
+    index_metadata,
+    is_missing_collection,
+)
+import hashlib
+import io
+import json
+import logging
+import zipfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Versión del formato; un snapshot de otra versión no se importa
+SNAPSHOT_FORMAT = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl"
+
+# Registros leídos de ChromaDB por página al exportar
+EXPORT_PAGE_SIZE = 1000
+
+# Registros por llamada a ``add`` al importar (Chroma limita el tamaño de un lote)
+IMPORT_BATCH_SIZE = 5000
+
+# Campos del manifiesto que usa la importación y su tipo
+MANIFEST_FIELDS = {
+    "chat_id": str,
+    "embedding_model": str,
+    "source_url": str,
+    "count": int,
+    "dimension": int,
+    "checksums": dict,
+}
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido o incompatible con esta instalación"""
+
+
+def export_snapshot(
+    chat_id: str,
+    destination: BinaryIO,
+    store: Optional[ShardedVectorStore] = None,
+    text_store: Optional[ChunkTextStore] = None
+) -> Dict[str, Any]:
+    """
+    Escribir en ``destination`` un snapshot (zip) de la colección del chat
+    
+    Contiene los embeddings como matriz float32 de NumPy, los textos y
+    metadatos de los chunks en JSON Lines y un manifiesto con el modelo de
+    embeddings, la dimensión y las sumas SHA-256 de ambos ficheros. Devuelve
+    el manifiesto. Lanza ``ValueError`` si el chat no tiene colección.
+    """
+    store = store or get_vector_store()
+    text_store = text_store or chunk_text_store
+    collection = store.get_collection(collection_name(chat_id))
+    collection_metadata = collection.metadata or {}
+    
+    pages: List[np.ndarray] = []
+    records = io.BytesIO()
+    count = 0
+    while True:
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=EXPORT_PAGE_SIZE, offset=count
+        )
+        if not page["ids"]:
+            break
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        documents = page["documents"]
+        if collection_metadata.get(TEXT_STORE_KEY):
+            documents = text_store.get_many(chat_id, page["ids"])
+        for document, metadata in zip(documents, page["metadatas"]):
+            line = json.dumps({"document": document, "metadata": metadata or {}}, ensure_ascii=False)
+            records.write(line.encode("utf-8") + b"\n")
+        count += len(page["ids"])
+    
+    embeddings = np.concatenate(pages) if pages else np.empty((0, 0), dtype=np.float32)
+    embeddings_file = io.BytesIO()
+    np.save(embeddings_file, embeddings, allow_pickle=False)
+    
+    first = json.loads(records.getvalue().split(b"\n", 1)[0]) if count else {}
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "chat_id": chat_id,
+        "embedding_model": collection_metadata.get(EMBEDDING_MODEL_KEY, settings.embedding_model),
+        "dimension": int(embeddings.shape[1]) if count else 0,
+        "dtype": "float32",
+        "count": count,
+        "vector_space": collection_metadata.get("hnsw:space", "l2"),
+        "source_url": first.get("metadata", {}).get("source_url", ""),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "checksums": {
+            EMBEDDINGS_FILE: hashlib.sha256(embeddings_file.getvalue()).hexdigest(),
+            RECORDS_FILE: hashlib.sha256(records.getvalue()).hexdigest(),
+        },
+    }
+    
+    with zipfile.ZipFile(destination, "w") as archive:
+        archive.writestr(MANIFEST_FILE, json.dumps(manifest, indent=2, ensure_ascii=False), zipfile.ZIP_DEFLATED)
+        # Los float32 apenas se comprimen: se guardan tal cual y se leen sin descomprimir
+        archive.writestr(EMBEDDINGS_FILE, embeddings_file.getvalue(), zipfile.ZIP_STORED)
+        archive.writestr(RECORDS_FILE, records.getvalue(), zipfile.ZIP_DEFLATED)
+    
+    logger.info(f"Exported snapshot of chat_id {chat_id}: {count} chunks")
+    return manifest
+
+
+def read_snapshot(source: BinaryIO) -> Tuple[Dict[str, Any], np.ndarray, List[Dict[str, Any]]]:
+    """Leer y validar un snapshot: manifiesto, embeddings y registros"""
+    try:
+        with zipfile.ZipFile(source) as archive:
+            manifest = json.loads(archive.read(MANIFEST_FILE))
+            embeddings_data = archive.read(EMBEDDINGS_FILE)
+            records_data = archive.read(RECORDS_FILE)
+    except (zipfile.BadZipFile, KeyError, json.JSONDecodeError) as e:
+        raise SnapshotError(f"Invalid snapshot: {str(e)}") from e
+    
+    check_manifest(manifest)
+    for name, data in ((EMBEDDINGS_FILE, embeddings_data), (RECORDS_FILE, records_data)):
+        if hashlib.sha256(data).hexdigest() != manifest["checksums"].get(name):
+            raise SnapshotError(f"Checksum mismatch for {name}")
+    
+    try:
+        embeddings = np.load(io.BytesIO(embeddings_data), allow_pickle=False)
+        records = [json.loads(line) for line in records_data.decode("utf-8").splitlines() if line]
+    except ValueError as e:
+        raise SnapshotError(f"Invalid snapshot contents: {str(e)}") from e
+    for record in records:
+        if not (
+            isinstance(record, dict)
+            and isinstance(record.get("document"), str)
+            and isinstance(record.get("metadata"), (dict, type(None)))
+        ):
+            # Sin texto el chunk no sirve como contexto (ni cabe en el almacén de textos)
+            raise SnapshotError("Invalid snapshot records: expected objects with a text document and metadata")
+    count = manifest["count"]
+    if len(records) != count or (count and embeddings.shape != (count, manifest["dimension"])):
+        raise SnapshotError(
+            f"Snapshot contents do not match its manifest: {len(records)} records, embeddings {embeddings.shape}"
+        )
+    return manifest, embeddings, records
+
+
+def check_manifest(manifest: Any):
+    """Comprobar que el manifiesto tiene la versión, los campos y los tipos esperados"""
+    if not isinstance(manifest, dict):
+        raise SnapshotError("Invalid snapshot manifest: not an object")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format: {manifest.get('format')}")
+    for field, field_type in MANIFEST_FIELDS.items():
+        value = manifest.get(field)
+        # bool es subclase de int: un true no es un recuento válido
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            raise SnapshotError(f"Invalid snapshot manifest: {field} must be {field_type.__name__}")
+    if manifest["count"] < 0 or manifest["dimension"] < 0:
+        raise SnapshotError("Invalid snapshot manifest: negative count or dimension")
+
+
+def check_compatible(manifest: Dict[str, Any]):
+    """Los embeddings solo sirven si las preguntas se embeben con el mismo modelo"""
+    if manifest["embedding_model"] != settings.embedding_model:
+        raise SnapshotError(
+            f"Snapshot embeddings come from {manifest['embedding_model']}, "
+            f"this instance uses {settings.embedding_model}"
+        )
+
+
+def with_content_hash(metadata: Optional[Dict[str, Any]], document: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Metadatos del chunk con su ``content_hash``: los snapshots exportados antes
+    de existir la huella no la traen y sin ella la búsqueda no puede
+    deduplicar los resultados sin leer su texto.
+    """
+    metadata = dict(metadata or {})
+    if not metadata.get("content_hash") and document:
+        metadata["content_hash"] = content_hash(document)
+    return metadata or None
+
+
+def import_snapshot(
+    chat_id: str,
+    source: BinaryIO,
+    store: Optional[ShardedVectorStore] = None,
+    text_store: Optional[ChunkTextStore] = None
+) -> Dict[str, Any]:
+    """
+    Cargar un snapshot en la colección del chat, reemplazando su contenido
+    
+    Los embeddings se insertan directamente por lotes, sin descargar ni volver
+    a embeber la documentación; los textos van a Chroma o al almacén de
+    textos según ``chunk_text_store``. Lanza ``SnapshotError`` si el snapshot
+    está dañado o sus embeddings son de otro modelo. Devuelve el manifiesto.
+    """
+    manifest, embeddings, records = read_snapshot(source)
+    check_compatible(manifest)
+    
+    store = store or get_vector_store()
+    text_store = text_store or chunk_text_store
+    name = collection_name(chat_id)
+    try:
+        store.delete_collection(name)
+    except Exception as e:
+        if not is_missing_collection(e):
+            raise
+    # La distancia coseno no depende de la norma: las similitudes son las del origen
+    collection = store.create_collection(
+        name,
+        metadata={
+            **index_metadata(len(records)),
+            EMBEDDING_MODEL_KEY: manifest["embedding_model"],
+            TEXT_STORE_KEY: settings.chunk_text_store,
+        }
+    )
+    collection_lifecycle.touch(chat_id)
+    text_store.delete(chat_id)
+    
+    for start in range(0, len(records), IMPORT_BATCH_SIZE):
+        batch = records[start:start + IMPORT_BATCH_SIZE]
+        ids = [f"chunk_{chat_id}_{i}" for i in range(start, start + len(batch))]
+        documents = [record["document"] for record in batch]
+        metadatas = [with_content_hash(record.get("metadata"), record["document"]) for record in batch]
+        if settings.chunk_text_store:
+            text_store.append(chat_id, ids, documents)
+        collection.add(
+            ids=ids,
+            embeddings=embeddings[start:start + len(batch)].tolist(),
+            documents=None if settings.chunk_text_store else documents,
+            metadatas=metadatas
+        )
+    
+    logger.info(f"Imported snapshot of chat_id {manifest['chat_id']} into chat_id {chat_id}: {len(records)} chunks")
+    return manifest
@@ -0,0 +1,317 @@
+from bisect import bisect
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from app.config import settings
+import hashlib
+import logging
+
+# chromadb se importa al crear el cliente: la API no debe cargarlo al importar
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_PREFIX = "chat_"
+
+# Puntos por shard en el anillo: reparte las claves de forma uniforme
+DEFAULT_VNODES = 64
+
+# Registros copiados por lote al mover una colección entre shards
+MOVE_BATCH_SIZE = 500
+
+# Sufijo de la copia temporal mientras se mueve una colección
+STAGING_SUFFIX = "__moving"
+
+# Metadato de la colección con el modelo que generó sus embeddings
+EMBEDDING_MODEL_KEY = "embedding_model"
+
+# Metadato de las colecciones cuyos textos están en el ChunkTextStore y no en Chroma
+TEXT_STORE_KEY = "text_store"
+
+# Espacios admitidos para colecciones nuevas; los embeddings se normalizan, así
+# que en ambos la distancia es 1 - coseno
+VECTOR_SPACES = ("cosine", "ip")
+
+# Perfiles del índice HNSW: más vecinos (M) y candidatos (ef) dan más recall a
+# cambio de memoria y tiempo de construcción (ver benchmarks.recall). El valor
+# por defecto de Chroma (M=16, ef_search=10) queda por debajo de "fast".
+HNSW_PROFILES: Dict[str, Dict[str, int]] = {
+    "fast": {"M": 12, "ef_construction": 100, "ef_search": 48},
+    "balanced": {"M": 16, "ef_construction": 200, "ef_search": 128},
+    "accurate": {"M": 32, "ef_construction": 256, "ef_search": 200},
+}
+
+# Con hnsw_profile="auto": perfil según el número de chunks de la colección.
+# En colecciones pequeñas un ef bajo ya encuentra casi todos los vecinos
+# (benchmarks.recall, 1k: recall@5 0.93 "fast" / 0.999 "balanced") y un índice
+# mayor solo encarece la ingesta; "accurate" se reserva para las grandes, donde
+# "balanced" pierde recall (10k: 0.90 frente a 0.97).
+AUTO_PROFILE_THRESHOLDS = ((1000, "fast"), (50000, "balanced"))
+AUTO_PROFILE_LARGE = "accurate"
+
+
+def collection_name(chat_id: str) -> str:
+    """Nombre de la colección de ChromaDB de un chat"""
+    return f"{COLLECTION_PREFIX}{chat_id}"
+
+
+def chat_id_from_collection(name: str) -> Optional[str]:
+    """chat_id de una colección de chat, o None si la colección no es de un chat"""
+    if name.startswith(COLLECTION_PREFIX) and not name.endswith(STAGING_SUFFIX):
+        return name[len(COLLECTION_PREFIX):]
+    return None
+
+
+def select_index_profile(n_records: int, profile: Optional[str] = None) -> str:
+    """Perfil HNSW configurado, o el que corresponde al tamaño si es ``auto``"""
+    profile = profile or settings.hnsw_profile
+    if profile != "auto":
+        if profile not in HNSW_PROFILES:
+            raise ValueError(f"Unknown HNSW profile: {profile}")
+        return profile
+    for max_records, name in AUTO_PROFILE_THRESHOLDS:
+        if n_records <= max_records:
+            return name
+    return AUTO_PROFILE_LARGE
+
+
+def index_metadata(n_records: int = 0, profile: Optional[str] = None, space: Optional[str] = None) -> Dict[str, Any]:
+    """Metadatos de creación de una colección: espacio de distancias y parámetros HNSW"""
+    space = space or settings.vector_space
+    if space not in VECTOR_SPACES:
+        raise ValueError(f"Unsupported vector space: {space}")
+    name = select_index_profile(n_records, profile)
+    params = HNSW_PROFILES[name]
+    return {
+        "hnsw:space": space,
+        "hnsw:M": params["M"],
+        "hnsw:construction_ef": params["ef_construction"],
+        "hnsw:search_ef": params["ef_search"],
+        "index_profile": name,
+    }
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    Similitud coseno a partir de la distancia de Chroma. Las colecciones
+    antiguas en L2 (distancia euclídea al cuadrado) dan 2 - 2·coseno con
+    embeddings normalizados.
+    """
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def get_chroma_client(path: Optional[str] = None):
+    """
+    Cliente persistente de ChromaDB compartido en el proceso.
+    
+    ChromaDB no admite dos clientes sobre el mismo directorio con distinta
+    configuración, así que todos los usos pasan por aquí. Con
+    ``chroma_memory_limit_bytes`` los índices HNSW abiertos se descargan de
+    memoria por LRU en lugar de acumularse uno por colección consultada.
+    """
+    return _chroma_client(path or settings.chroma_persist_directory, settings.chroma_memory_limit_bytes)
+
+
+@lru_cache(maxsize=None)
+def _chroma_client(path: str, memory_limit_bytes: int):
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    
+    if memory_limit_bytes:
+        return chromadb.PersistentClient(
+            path=path,
+            settings=ChromaSettings(chroma_segment_cache_policy="LRU", chroma_memory_limit_bytes=memory_limit_bytes)
+        )
+    return chromadb.PersistentClient(path=path)
+
+
+@lru_cache(maxsize=None)
+def _http_client(url: str):
+    import chromadb
+    
+    parsed = urlparse(url)
+    return chromadb.HttpClient(
+        host=parsed.hostname,
+        port=parsed.port or (443 if parsed.scheme == "https" else 8000),
+        ssl=parsed.scheme == "https"
+    )
+
+
+def is_remote_shard(shard: str) -> bool:
+    return shard.startswith(("http://", "https://"))
+
+
+def is_missing_collection(error: Exception) -> bool:
+    """
+    Si el error indica que la colección no existe. ``PersistentClient`` lanza
+    ``ValueError`` y ``HttpClient`` (chromadb 0.4.x) un ``Exception`` genérico
+    con el cuerpo de la respuesta; ambos con el mensaje "Collection ... does
+    not exist". Otros ``ValueError`` (metadatos, dimensión) no cuentan.
+    """
+    return "does not exist" in str(error)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente con nodos virtuales.
+    
+    Al añadir un shard solo cambian de dueño las claves que pasan a caer en
+    sus puntos del anillo (~1/N del total); el resto no se mueve.
+    """
+    
+    def __init__(self, nodes: List[str], vnodes: int = DEFAULT_VNODES):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = list(nodes)
+        self._points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in self._points]
+    
+    def node_for(self, key: str) -> str:
+        index = bisect(self._hashes, _hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardedVectorStore:
+    """
+    Colecciones de ChromaDB repartidas entre varios stores (shards).
+    
+    Cada shard es un directorio local (``PersistentClient`` en este proceso)
+    o la URL de un servidor de Chroma (``HttpClient``). La colección de un
+    chat vive en el shard que indica el anillo para su chat_id. Expone la
+    parte de la interfaz del cliente de Chroma que usa la aplicación, así que
+    ``RAGService`` y la ingesta lo usan como si fuera un único cliente.
+    
+    Mientras se rebalancea tras añadir shards, una colección puede seguir en
+    su shard anterior: la lectura prueba primero el dueño y después el resto.
+    """
+    
+    def __init__(self, shards: List[str], vnodes: int = DEFAULT_VNODES):
+        self.shards = list(shards)
+        self.ring = HashRing(self.shards, vnodes)
+    
+    def client(self, shard: str):
+        return _http_client(shard) if is_remote_shard(shard) else get_chroma_client(shard)
+    
+    def shard_for(self, name: str) -> str:
+        return self.ring.node_for(chat_id_from_collection(name) or name)
+    
+    def local_directories(self) -> Dict[str, Path]:
+        """Directorio de cada shard local (los remotos gestionan su propio disco)"""
+        return {shard: Path(shard) for shard in self.shards if not is_remote_shard(shard)}
+    
+    def _candidates(self, name: str) -> List[str]:
+        owner = self.shard_for(name)
+        return [owner] + [shard for shard in self.shards if shard != owner]
+    
+    def get_collection(self, name: str, **kwargs):
+        for shard in self._candidates(name):
+            try:
+                return self.client(shard).get_collection(name, **kwargs)
+            except Exception as e:
+                if not is_missing_collection(e):
+                    raise
+        raise ValueError(f"Collection {name} does not exist.")
+    
+    def create_collection(self, name: str, **kwargs):
+        return self.client(self.shard_for(name)).create_collection(name, **kwargs)
+    
+    def get_or_create_collection(self, name: str, **kwargs):
+        return self.client(self.shard_for(name)).get_or_create_collection(name, **kwargs)
+    
+    def delete_collection(self, name: str):
+        """Borrar la colección de todos los shards que la tengan (p.ej. a medio mover)"""
+        deleted = False
+        for shard in self.shards:
+            try:
+                self.client(shard).delete_collection(name)
+                deleted = True
+            except Exception as e:
+                if not is_missing_collection(e):
+                    raise
+        if not deleted:
+            raise ValueError(f"Collection {name} does not exist.")
+    
+    def list_collections(self) -> list:
+        return [collection for shard in self.shards for collection in self.client(shard).list_collections()]
+    
+    def collections_by_shard(self) -> Dict[str, List[str]]:
+        return {shard: [collection.name for collection in self.client(shard).list_collections()] for shard in self.shards}
+    
+    def misplaced(self) -> List[Tuple[str, str, str]]:
+        """(colección, shard actual, shard dueño) de las colecciones que hay que mover"""
+        moves = []
+        for shard, names in self.collections_by_shard().items():
+            for name in names:
+                if chat_id_from_collection(name) is None:
+                    continue
+                owner = self.shard_for(name)
+                if owner != shard:
+                    moves.append((name, shard, owner))
+        return moves
+    
+    def move_collection(self, name: str, source: str, target: str, batch_size: int = MOVE_BATCH_SIZE) -> int:
+        """
+        Mover una colección de ``source`` a ``target``; devuelve los registros copiados.
+        
+        Se copia primero a una colección temporal que solo se renombra al
+        terminar: una copia interrumpida nunca deja una colección a medias con
+        el nombre definitivo. Si el destino ya tiene la colección (p.ej. se
+        reprocesó durante el rebalanceo), esa versión más reciente se conserva.
+        """
+        source_collection = self.client(source).get_collection(name)
+        target_client = self.client(target)
+        staging_name = f"{name}{STAGING_SUFFIX}"
+        try:
+            target_client.delete_collection(staging_name)
+        except Exception as e:
+            if not is_missing_collection(e):
+                raise
+        staging = target_client.create_collection(staging_name, metadata=source_collection.metadata)
+        
+        copied = 0
+        while True:
+            page = source_collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=copied
+            )
+            if not page["ids"]:
+                break
+            staging.add(
+                ids=page["ids"], embeddings=page["embeddings"],
+                documents=page["documents"], metadatas=page["metadatas"]
+            )
+            copied += len(page["ids"])
+        
+        try:
+            target_client.get_collection(name)
+            target_client.delete_collection(staging_name)
+            logger.info(f"Collection {name} already present on {target}, keeping it")
+        except Exception as e:
+            if not is_missing_collection(e):
+                raise
+            staging.modify(name=name)
+        self.client(source).delete_collection(name)
+        logger.info(f"Moved collection {name} ({copied} records) from {source} to {target}")
+        return copied
+
+
+def configured_shards() -> List[str]:
+    """Shards configurados; sin ``chroma_shards``, un único shard en ``chroma_persist_directory``"""
+    return list(settings.chroma_shards) or [settings.chroma_persist_directory]
+
+
+def get_vector_store() -> ShardedVectorStore:
+    """Store de colecciones según la configuración actual, compartido en el proceso"""
+    return _vector_store(tuple(configured_shards()))
+
+
+@lru_cache(maxsize=None)
+def _vector_store(shards: Tuple[str, ...]) -> ShardedVectorStore:
+    return ShardedVectorStore(list(shards))
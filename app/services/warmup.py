@@ -0,0 +1,97 @@
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class ComponentUnavailableError(Exception):
+    """Un componente pesado todavía no está listo o falló al iniciarse"""
+
+
+class LazyComponent(Generic[T]):
+    """
+    Componente pesado (modelo, cliente, conexión) que se construye una sola vez.
+    
+    La construcción corre en un hilo para no bloquear el event loop y ocurre en
+    el warm-up de arranque o, si llega antes una petición, en su primer uso.
+    Si falla, el siguiente ``get`` lo vuelve a intentar.
+    """
+    
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self._value: Optional[T] = None
+        self._lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+    
+    async def get(self) -> T:
+        if self._value is not None:
+            return self._value
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._value is None:
+                self.state = WARMING
+                start = time.perf_counter()
+                try:
+                    self._value = await asyncio.to_thread(self.factory)
+                except Exception as e:
+                    self.state = FAILED
+                    self.error = str(e)
+                    raise ComponentUnavailableError(f"{self.name} failed to initialize: {str(e)}") from e
+                finally:
+                    self.duration = time.perf_counter() - start
+                self.state = READY
+                self.error = None
+                logger.info(f"Component {self.name} ready in {self.duration:.2f}s")
+        return self._value
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "duration_seconds": round(self.duration, 3) if self.duration is not None else None,
+        }
+
+
+async def warm_up(components: List[LazyComponent], retry_seconds: float = 5.0, max_retry_seconds: float = 60.0):
+    """
+    Iniciar los componentes en paralelo, reintentando con backoff los que
+    fallen (p.ej. la base de datos aún no acepta conexiones).
+    """
+    
+    async def warm(component: LazyComponent):
+        delay = retry_seconds
+        while True:
+            try:
+                await component.get()
+                return
+            except ComponentUnavailableError as e:
+                logger.warning(f"{str(e)}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_retry_seconds)
+    
+    await asyncio.gather(*(warm(component) for component in components))
+
+
+def readiness(components: List[LazyComponent]) -> Dict[str, Any]:
+    """Estado agregado para /ready"""
+    return {
+        "ready": all(component.ready for component in components),
+        "components": {component.name: component.status() for component in components},
+    }
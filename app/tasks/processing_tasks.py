@@ -1,53 +1,240 @@
 import httpx
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
-from sentence_transformers import SentenceTransformer
-import chromadb
+from celery import chain
 from sqlalchemy.orm import Session
 from app.celery_app import celery_app
 from app.models.database import SessionLocal
 from app.models.processing_jobs import ProcessingJobs
+from app.services.progress import ProgressReporter
+from app.services.ingestion_registry import ingestion_registry
+from app.services.payload_store import payload_store
+from app.services.page_fetcher import UnsupportedContentError, fetch_page
+from app.services.domain_limiter import (
+    THROTTLE_STATUS_CODES,
+    DomainThrottledError,
+    domain_limiter,
+    retry_after_seconds,
+    url_domain,
+)
+from app.services.collection_lifecycle import collection_lifecycle
+from app.services.chunk_text_store import chunk_text_store, content_hash
+from app.services.vector_store import (
+    EMBEDDING_MODEL_KEY,
+    TEXT_STORE_KEY,
+    collection_name,
+    get_vector_store,
+    index_metadata,
+)
+from app.services.metrics import (
+    EMBEDDED_CHUNKS,
+    EMBEDDING_BATCH_SECONDS,
+    INGESTION_STAGE_SECONDS,
+    observe,
+)
+from app.utils.text_processing import (
+    extract_code_blocks,
+    extract_code_languages,
+    is_code_like,
+    tfidf_keywords,
+)
+from app.utils.html_sections import parse_sections
 from app.config import settings
+from functools import lru_cache
+import asyncio
 import logging
 
+# Playwright, sentence-transformers (torch) y ChromaDB se importan donde se usan:
+# la API importa este módulo solo para encolar tareas y los workers de I/O no
+# necesitan cargar el modelo de embeddings.
+
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(bind=True)
-def process_documentation_task(self, url: str, chat_id: str):
+# Prioridad de Celery por nivel (en Redis 0 es la más alta)
+PRIORITY_LEVELS = {"interactive": 0, "normal": 3, "batch": 6}
+
+# Espera inicial ante un 429/503 sin Retry-After; se duplica en cada reintento
+THROTTLE_BACKOFF_SECONDS = 10
+
+
+def start_ingestion(url: str, chat_id: str, task_id: str, priority: str = "interactive"):
     """
-    Tarea de Celery para procesar documentación desde una URL
+    Encolar la ingesta de una URL como cadena de dos etapas.
+    
+    La descarga va a la cola de I/O y los embeddings a la de CPU; ``task_id``
+    identifica la última etapa, cuyo resultado marca el fin de la ingesta.
+    Ambas etapas heredan la prioridad para que un trabajo interactivo no
+    espere detrás de un lote en ninguna de las dos colas.
+    """
+    level = PRIORITY_LEVELS[priority]
+    return chain(
+        fetch_documentation_task.s(url, chat_id).set(priority=level),
+        embed_documentation_task.s().set(priority=level)
+    ).apply_async(task_id=task_id)
+
+
+@celery_app.task(bind=True, max_retries=None)
+def fetch_documentation_task(self, url: str, chat_id: str, throttled: int = 0) -> dict:
+    """
+    Etapa de I/O: descargar, limpiar y segmentar la documentación
+    
+    Si el dominio ya tiene todas sus descargas ocupadas, la tarea se reprograma
+    en lugar de bloquear el worker; también si responde 429/503, tras su
+    Retry-After o con espera exponencial, hasta ``domain_throttle_max_retries``
+    veces (``throttled`` cuenta esos reintentos). Los chunks se dejan en Redis
+    y solo su referencia pasa a la siguiente etapa.
     """
+    progress = ProgressReporter(chat_id)
+    domain = url_domain(url)
+    wait = domain_limiter.try_acquire(domain, self.request.id)
+    if wait is not None:
+        if not self.request.retries:
+            progress.update(status="PENDING", stage="waiting_for_domain")
+        raise self.retry(countdown=wait)
+    
     try:
         # Actualizar estado a IN_PROGRESS
         update_processing_status(chat_id, "IN_PROGRESS")
+        progress.update(status="IN_PROGRESS", stage="scraping")
         
-        # 1. Web Scraping
+        # 1. Web Scraping y limpieza por secciones (incremental, durante la descarga)
         logger.info(f"Starting web scraping for {url}")
-        html_content = scrape_website(url)
-        
-        # 2. Limpieza del HTML
-        logger.info("Cleaning HTML content")
-        clean_text = clean_html_content(html_content)
+        with observe(INGESTION_STAGE_SECONDS, stage="scrape"):
+            sections = asyncio.run(scrape_website(url))
+        progress.update(stage="cleaning", pages_fetched=1)
         
-        # 3. Segmentación inteligente
+        # 2. Segmentación inteligente
         logger.info("Performing intelligent chunking")
-        chunks = intelligent_chunking(clean_text)
+        progress.update(stage="chunking")
+        with observe(INGESTION_STAGE_SECONDS, stage="chunk"):
+            chunks, metadatas = chunk_sections(sections)
+        progress.update(stage="queued_for_embedding", chunks_total=len(chunks))
+        
+        return {"url": url, "chat_id": chat_id, "payload_ref": payload_store.put_chunks(chunks, metadatas)}
+        
+    except DomainThrottledError as e:
+        if throttled >= settings.domain_throttle_max_retries:
+            logger.error(f"Error fetching documentation: {str(e)}")
+            fail_ingestion(url, chat_id, e)
+            raise
+        countdown = e.retry_after or THROTTLE_BACKOFF_SECONDS * 2 ** throttled
+        logger.warning(f"{str(e)}, retrying {url} in {countdown} s")
+        progress.update(status="PENDING", stage="waiting_for_domain")
+        raise self.retry(countdown=countdown, kwargs={"throttled": throttled + 1})
+        
+    except Exception as e:
+        logger.error(f"Error fetching documentation: {str(e)}")
+        fail_ingestion(url, chat_id, e)
+        raise
+    
+    finally:
+        domain_limiter.release(domain, self.request.id)
+
+
+@celery_app.task(bind=True)
+def embed_documentation_task(self, fetched: dict) -> dict:
+    """
+    Etapa de CPU: generar embeddings y almacenarlos en ChromaDB
+    
+    Los chats que pidieron la misma URL mientras la ingesta estaba en curso
+    (seguidores) reciben una copia de los chunks y embeddings en lugar de
+    repetir la descarga.
+    """
+    url, chat_id, payload_ref = fetched["url"], fetched["chat_id"], fetched["payload_ref"]
+    progress = ProgressReporter(chat_id)
+    followers: list[str] = []
+    try:
+        chunks, metadatas = payload_store.get_payload(payload_ref)
         
         # 4. Generación de embeddings y almacenamiento
         logger.info("Generating embeddings and storing in ChromaDB")
-        store_embeddings(chunks, chat_id, url)
+        progress.update(status="IN_PROGRESS", stage="embedding", pages_fetched=1, chunks_total=len(chunks))
+        with observe(INGESTION_STAGE_SECONDS, stage="embed"):
+            embeddings = embed_chunks(chunks, progress=progress)
+        with observe(INGESTION_STAGE_SECONDS, stage="store"):
+            write_embeddings(chunks, embeddings, chat_id, url, metadatas)
+        
+        # 5. Copiar el resultado a los chats que esperaban la misma URL
+        followers = ingestion_registry.complete_url(url)
+        for follower_id in followers:
+            with observe(INGESTION_STAGE_SECONDS, stage="store"):
+                write_embeddings(chunks, embeddings, follower_id, url, metadatas)
+            update_processing_status(follower_id, "COMPLETED")
+            ProgressReporter(follower_id).update(
+                status="COMPLETED", stage="done", chunks_total=len(chunks),
+                chunks_embedded=len(chunks), eta_seconds=0
+            )
         
-        # 5. Actualizar estado a COMPLETED
+        # 6. Actualizar estado a COMPLETED
         update_processing_status(chat_id, "COMPLETED")
-        logger.info(f"Documentation processing completed for chat_id: {chat_id}")
+        progress.update(status="COMPLETED", stage="done", eta_seconds=0)
+        logger.info(f"Documentation processing completed for chat_id: {chat_id} (shared with {len(followers)} chats)")
+        release_ingestion(chat_id, followers)
         
-        return {"status": "success", "chat_id": chat_id}
+        return {"status": "success", "chat_id": chat_id, "followers": followers}
         
     except Exception as e:
         logger.error(f"Error processing documentation: {str(e)}")
-        update_processing_status(chat_id, "FAILED", str(e))
+        fail_ingestion(url, chat_id, e, followers)
         raise
+    
+    finally:
+        payload_store.delete(payload_ref)
+
+
+@celery_app.task
+def maintain_collections_task() -> dict:
+    """
+    Tarea periódica: desalojar colecciones inactivas o que excedan la cuota de
+    disco y compactar el almacenamiento de ChromaDB
+    
+    Los chats desalojados conservan su historial; su trabajo pasa a EVICTED
+    y hay que volver a procesar la documentación para seguir preguntando.
+    """
+    evicted = collection_lifecycle.evict(on_evicted=lambda chat_id: update_processing_status(chat_id, "EVICTED"))
+    compaction = collection_lifecycle.compact()
+    usage = collection_lifecycle.disk_usage()
+    logger.info(f"Collection maintenance: evicted {len(evicted)} collections, disk usage {usage['total_bytes']} bytes")
+    return {"evicted": evicted, "compaction": compaction, "disk_usage": usage}
+
+
+@celery_app.task
+def rebalance_collections_task() -> dict:
+    """
+    Mover cada colección al shard que le asigna el anillo (lanzar tras añadir
+    shards a ``chroma_shards``). Es idempotente: se puede repetir si quedaron
+    colecciones sin mover por tener una ingesta en curso.
+    """
+    return collection_lifecycle.rebalance()
+
+
+def fail_ingestion(url: str, chat_id: str, error: Exception, followers: list[str] = None):
+    """Marcar como fallidos el chat y sus seguidores y liberar los locks de la ingesta"""
+    if not followers:
+        followers = _complete_url_safely(url)
+    for failed_id in [chat_id] + followers:
+        update_processing_status(failed_id, "FAILED", str(error))
+        ProgressReporter(failed_id).update(
+            status="FAILED", stage="failed", error_message=str(error), eta_seconds=None
+        )
+    release_ingestion(chat_id, followers)
+
+
+def release_ingestion(chat_id: str, followers: list[str]):
+    for done_id in [chat_id] + followers:
+        try:
+            ingestion_registry.release_chat(done_id)
+        except Exception as e:
+            logger.warning(f"Could not release ingestion lock for chat {done_id}: {str(e)}")
+
+
+def _complete_url_safely(url: str) -> list[str]:
+    """Cerrar la ingesta de la URL sin ocultar el error original de la tarea"""
+    try:
+        return ingestion_registry.complete_url(url)
+    except Exception as e:
+        logger.warning(f"Could not release ingestion lock for {url}: {str(e)}")
+        return []
 
 
 def update_processing_status(chat_id: str, status: str, error_message: str = None):
@@ -68,22 +255,49 @@ def update_processing_status(chat_id: str, status: str, error_message: str = Non
         db.close()
 
 
-async def scrape_website(url: str) -> str:
-    """Scraping de website usando httpx y BeautifulSoup, con fallback a Playwright"""
+async def scrape_website(url: str) -> list[dict]:
+    """
+    Scraping de website: secciones de la página descargada en streaming con
+    httpx, con fallback a Playwright
+    
+    Los tipos de contenido sin analizador (PDF, binarios) no pasan a
+    Playwright: el navegador no los procesaría mejor. Tampoco las respuestas
+    429/503, que lanzan ``DomainThrottledError``. Cada respuesta ajusta el
+    límite de descargas simultáneas del dominio.
+    """
+    domain = url_domain(url)
     try:
         # Intentar con httpx primero
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=30.0)
-            response.raise_for_status()
-            return response.text
+        page = await fetch_page(url)
+        domain_limiter.record_response(domain, page.status_code, page.latency_seconds)
+        return page.sections
+    except UnsupportedContentError:
+        raise
     except Exception as e:
+        if isinstance(e, httpx.HTTPStatusError):
+            status_code = e.response.status_code
+            retry_after = retry_after_seconds(e.response.headers.get("retry-after"))
+            if retry_after is not None:
+                retry_after = min(retry_after, settings.domain_max_retry_after_seconds)
+            domain_limiter.record_response(domain, status_code, retry_after=retry_after)
+            if status_code in THROTTLE_STATUS_CODES:
+                raise DomainThrottledError(domain, retry_after) from e
+        elif isinstance(e, httpx.TransportError):
+            domain_limiter.record_response(domain)
         logger.warning(f"httpx failed, trying Playwright: {str(e)}")
-        # Fallback a Playwright para SPAs
-        return await scrape_with_playwright(url)
+        # Fallback a Playwright para SPAs; el DOM renderizado ya está en memoria,
+        # pero se analiza con el mismo límite
+        html_content = await scrape_with_playwright(url)
+        if len(html_content) > settings.scrape_max_bytes:
+            logger.warning(f"Page {url} exceeds {settings.scrape_max_bytes} characters, truncating")
+            html_content = html_content[:settings.scrape_max_bytes]
+        return extract_sections(html_content)
 
 
 async def scrape_with_playwright(url: str) -> str:
     """Scraping con Playwright para manejar JavaScript"""
+    from playwright.async_api import async_playwright
+    
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
@@ -113,6 +327,48 @@ def clean_html_content(html_content: str) -> str:
     return '\n'.join(lines)
 
 
+def extract_sections(html_content: str) -> list[dict]:
+    """
+    Limpieza del HTML conservando la estructura de la página
+    
+    Devuelve las secciones en orden, cada una con la ruta de encabezados que
+    la contiene (``"Guía > Instalación"``) y sus párrafos. Los bloques
+    ``<pre>`` se conservan como bloques de código markdown con su lenguaje,
+    para que ``extract_code_blocks`` y los filtros de código los reconozcan.
+    Es el mismo análisis que hace ``fetch_page`` mientras descarga.
+    """
+    return parse_sections(html_content)
+
+
+def chunk_sections(sections: list[dict], max_chunk_size: int = 1000, overlap: int = 200) -> tuple[list[str], list[dict]]:
+    """Segmentar cada sección por separado; devuelve los chunks y sus metadatos"""
+    chunks, metadatas = [], []
+    for section in sections:
+        for chunk in intelligent_chunking('\n\n'.join(section["paragraphs"]), max_chunk_size, overlap):
+            chunks.append(chunk)
+            metadatas.append(chunk_metadata(chunk, section["heading_path"]))
+    return chunks, metadatas
+
+
+def chunk_metadata(chunk: str, heading_path: str = "") -> dict:
+    """
+    Metadatos de un chunk para filtrar en las búsquedas de código
+    
+    Chroma solo admite valores escalares, así que los lenguajes se guardan
+    como texto (``code_languages``) y como una marca ``lang_<lenguaje>`` por
+    lenguaje, que es la que usan los filtros ``where``.
+    """
+    languages = extract_code_languages(chunk)
+    metadata = {
+        "heading_path": heading_path,
+        "is_code_like": is_code_like(chunk),
+        "has_code": bool(extract_code_blocks(chunk)),
+        "code_languages": ",".join(languages),
+    }
+    metadata.update({f"lang_{language}": True for language in languages})
+    return metadata
+
+
 def intelligent_chunking(text: str, max_chunk_size: int = 1000, overlap: int = 200) -> list[str]:
     """Segmentación inteligente del texto"""
     chunks = []
@@ -129,6 +385,8 @@ def intelligent_chunking(text: str, max_chunk_size: int = 1000, overlap: int = 2
             # Mantener overlap
             words = current_chunk.split()
             overlap_text = ' '.join(words[-overlap//10:])  # Aproximadamente overlap caracteres
+            # Sin restos de un bloque de código: un ``` suelto desemparejaría los siguientes
+            overlap_text = overlap_text.rsplit('```', 1)[-1].strip()
             current_chunk = overlap_text + '\n\n' + paragraph
         else:
             current_chunk += '\n\n' + paragraph if current_chunk else paragraph
@@ -140,30 +398,77 @@ def intelligent_chunking(text: str, max_chunk_size: int = 1000, overlap: int = 2
     return chunks
 
 
-def store_embeddings(chunks: list[str], chat_id: str, source_url: str):
-    """Generar embeddings y almacenar en ChromaDB"""
-    # Inicializar modelo de embeddings
-    model = SentenceTransformer(settings.embedding_model)
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Modelo de embeddings cargado una vez por proceso del worker de CPU"""
+    from sentence_transformers import SentenceTransformer
+    
+    return SentenceTransformer(settings.embedding_model)
+
+
+def embed_chunks(chunks: list[str], progress: ProgressReporter = None) -> list[list[float]]:
+    """Generar embeddings por lotes para poder informar del progreso"""
+    model = get_embedding_model()
+    
+    batch_size = settings.embedding_batch_size
+    embeddings = []
+    if progress:
+        # Marcar el inicio para que la primera ETA refleje la duración del primer lote
+        progress.chunks_embedded(0)
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        with observe(EMBEDDING_BATCH_SECONDS):
+            # Normalizados: la distancia coseno/ip de Chroma es 1 - similitud
+            embeddings.extend(model.encode(batch, normalize_embeddings=True).tolist())
+        EMBEDDED_CHUNKS.inc(len(batch))
+        if progress:
+            progress.chunks_embedded(start + len(batch))
+    return embeddings
+
+
+def write_embeddings(
+    chunks: list[str], embeddings: list[list[float]], chat_id: str, source_url: str, chunk_metadatas: list[dict] = None
+):
+    """
+    Almacenar chunks y embeddings en la colección del chat, reemplazando su contenido
     
-    # Inicializar ChromaDB
-    client = chromadb.PersistentClient(path=settings.chroma_persist_directory)
+    Con ``chunk_text_store`` los textos van al ``ChunkTextStore`` (antes que
+    los vectores, para que ninguna consulta encuentre un chunk sin texto) y
+    la colección guarda solo embeddings y metadatos.
+    """
+    # La colección se crea en el shard que corresponde al chat
+    client = get_vector_store()
     
-    # Crear o obtener colección
-    collection_name = f"chat_{chat_id}"
+    # Un reprocesado reemplaza la colección para no mezclar chunks de dos ingestas
+    name = collection_name(chat_id)
     try:
-        collection = client.get_collection(collection_name)
-    except:
-        collection = client.create_collection(collection_name)
+        client.delete_collection(name)
+    except Exception:
+        pass
     
-    # Generar embeddings para cada chunk
-    embeddings = model.encode(chunks)
+    # Palabras clave por TF-IDF: una pasada sobre todos los chunks de la colección
+    chunk_keywords, collection_keywords = tfidf_keywords(chunks, settings.keywords_per_chunk)
+    
+    collection = client.create_collection(
+        name,
+        metadata={
+            **index_metadata(len(chunks)),
+            EMBEDDING_MODEL_KEY: settings.embedding_model,
+            TEXT_STORE_KEY: settings.chunk_text_store,
+            "keywords": ", ".join(collection_keywords)
+        }
+    )
+    collection_lifecycle.touch(chat_id)
     
     # Preparar metadatos
     metadatas = [
         {
+            **(chunk_metadatas[i] if chunk_metadatas else {}),
             "source_url": source_url,
             "chunk_index": i,
-            "chunk_size": len(chunk)
+            "chunk_size": len(chunk),
+            "content_hash": content_hash(chunk),
+            "keywords": ", ".join(chunk_keywords[i])
         }
         for i, chunk in enumerate(chunks)
     ]
@@ -171,12 +476,26 @@ def store_embeddings(chunks: list[str], chat_id: str, source_url: str):
     # IDs únicos para cada chunk
     ids = [f"chunk_{chat_id}_{i}" for i in range(len(chunks))]
     
+    if settings.chunk_text_store:
+        chunk_text_store.replace(chat_id, ids, chunks)
+    else:
+        # Textos de una ingesta anterior con el almacén activado
+        chunk_text_store.delete(chat_id)
+    
     # Almacenar en ChromaDB
-    collection.add(
-        embeddings=embeddings.tolist(),
-        documents=chunks,
-        metadatas=metadatas,
-        ids=ids
-    )
+    if chunks:
+        collection.add(
+            embeddings=embeddings,
+            documents=None if settings.chunk_text_store else chunks,
+            metadatas=metadatas,
+            ids=ids
+        )
     
-    logger.info(f"Stored {len(chunks)} chunks in ChromaDB for chat_id: {chat_id}") 
\ No newline at end of file
+    logger.info(f"Stored {len(chunks)} chunks in ChromaDB for chat_id: {chat_id}")
+
+
+def store_embeddings(
+    chunks: list[str], chat_id: str, source_url: str, progress: ProgressReporter = None, chunk_metadatas: list[dict] = None
+):
+    """Generar embeddings y almacenar en ChromaDB"""
+    write_embeddings(chunks, embed_chunks(chunks, progress=progress), chat_id, source_url, chunk_metadatas)
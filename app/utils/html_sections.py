@@ -0,0 +1,199 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from app.utils.text_processing import normalize_language
+import re
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+# Elementos que cierran un párrafo del texto extraído
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'li', 'ul', 'ol', 'dl', 'dt', 'dd', 'table', 'tr',
+    'td', 'th', 'blockquote', 'figure', 'figcaption', 'br', 'hr', 'details', 'summary',
+    'main', 'article', 'body',
+}
+
+# Elementos cuyo contenido no forma parte de la documentación
+SKIP_TAGS = {'head', 'nav', 'header', 'footer', 'aside', 'script', 'style', 'noscript', 'template'}
+
+# Elementos sin etiqueta de cierre
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr',
+}
+
+# Prefijos de clase con el lenguaje de un bloque <pre>/<code> (Prism, highlight.js, GitHub, Sphinx)
+CODE_CLASS_PREFIXES = ('language-', 'lang-', 'highlight-source-', 'highlight-', 'sourcecode-')
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+
+
+def code_language(class_lists: List[List[str]]) -> str:
+    """Primer lenguaje declarado en las clases dadas (en orden de prioridad); cadena vacía si no hay"""
+    for classes in class_lists:
+        for css_class in classes:
+            css_class = css_class.lower()
+            for prefix in CODE_CLASS_PREFIXES:
+                if css_class.startswith(prefix) and len(css_class) > len(prefix):
+                    return normalize_language(css_class[len(prefix):])
+    return ""
+
+
+class SectionParser(HTMLParser):
+    """
+    Extracción incremental de las secciones de una página HTML.
+    
+    Recibe el HTML por trozos con ``feed`` (p.ej. según se descarga) y solo
+    conserva el texto ya extraído, nunca el documento completo ni un árbol
+    DOM. Cada sección lleva la ruta de encabezados que la contiene
+    (``"Guía > Instalación"``) y sus párrafos; los bloques ``<pre>`` se
+    conservan como bloques de código markdown con su lenguaje.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections: List[Dict] = []
+        self._headings: List[Tuple[int, str]] = []
+        self._paragraphs: List[str] = []
+        self._words: List[str] = []
+        # Elementos abiertos con sus clases (para el lenguaje de un <pre> dentro de <div class="highlight-...">)
+        self._open: List[Tuple[str, List[str]]] = []
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._heading: Optional[Tuple[int, List[str]]] = None
+        self._pre: Optional[Dict] = None
+    
+    def handle_starttag(self, tag: str, attrs):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS:
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        
+        classes = (dict(attrs).get('class') or '').split()
+        if self._pre is not None:
+            if tag == 'code' and not self._pre["code_classes"]:
+                self._pre["code_classes"] = classes
+            return
+        if tag == 'pre':
+            self._end_paragraph()
+            parent_classes = self._open[-1][1] if self._open else []
+            self._pre = {"classes": classes, "code_classes": [], "parent_classes": parent_classes, "text": []}
+            return
+        if tag in HEADING_TAGS:
+            self._end_section()
+            self._heading = (int(tag[1]), [])
+            return
+        if tag in BLOCK_TAGS:
+            self._end_paragraph()
+        if tag not in VOID_TAGS:
+            self._open.append((tag, classes))
+    
+    def handle_startendtag(self, tag: str, attrs):
+        if self._skip_tag is None and self._pre is None and tag in BLOCK_TAGS:
+            self._end_paragraph()
+    
+    def handle_endtag(self, tag: str):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if self._pre is not None:
+            if tag == 'pre':
+                self._end_pre()
+            return
+        if self._heading is not None and tag in HEADING_TAGS:
+            self._end_heading()
+            return
+        if tag in BLOCK_TAGS:
+            self._end_paragraph()
+        # Cerrar también los elementos que quedaron sin cerrar dentro de este
+        for index in range(len(self._open) - 1, -1, -1):
+            if self._open[index][0] == tag:
+                del self._open[index:]
+                break
+    
+    def handle_data(self, data: str):
+        if self._skip_tag is not None:
+            return
+        if self._pre is not None:
+            self._pre["text"].append(data)
+        elif self._heading is not None:
+            self._heading[1].append(data)
+        else:
+            self._words.append(data)
+    
+    def close(self):
+        super().close()
+        if self._pre is not None:
+            self._end_pre()
+        if self._heading is not None:
+            self._end_heading()
+        self._end_section()
+    
+    def _end_paragraph(self):
+        if not self._words:
+            return
+        text = WHITESPACE_PATTERN.sub(' ', ' '.join(self._words)).strip()
+        self._words.clear()
+        if text:
+            self._paragraphs.append(text)
+    
+    def _end_section(self):
+        self._end_paragraph()
+        if self._paragraphs:
+            heading_path = " > ".join(title for _, title in self._headings)
+            self.sections.append({"heading_path": heading_path, "paragraphs": self._paragraphs})
+            self._paragraphs = []
+    
+    def _end_heading(self):
+        level, parts = self._heading
+        self._heading = None
+        # Sin el enlace permanente que añaden Sphinx y MkDocs ("Instalación ¶")
+        title = WHITESPACE_PATTERN.sub(' ', ' '.join(parts)).strip().rstrip('¶').strip()
+        while self._headings and self._headings[-1][0] >= level:
+            self._headings.pop()
+        if title:
+            self._headings.append((level, title))
+            self._paragraphs.append(title)
+    
+    def _end_pre(self):
+        pre, self._pre = self._pre, None
+        # Sin líneas vacías: el bloque es un único párrafo para la segmentación
+        code = BLANK_LINES_PATTERN.sub('\n', ''.join(pre["text"]).strip('\n'))
+        language = code_language([pre["classes"], pre["code_classes"], pre["parent_classes"]])
+        self._paragraphs.append(f"```{language}\n{code}\n```")
+
+
+class TextSectionParser:
+    """Texto plano con la misma interfaz que ``SectionParser``: una sección, párrafos por líneas en blanco"""
+    
+    def __init__(self):
+        self.sections: List[Dict] = []
+        self._paragraphs: List[str] = []
+        self._pending = ""
+    
+    def feed(self, data: str):
+        blocks = BLANK_LINES_PATTERN.split(self._pending + data)
+        self._pending = blocks.pop()
+        self._paragraphs.extend(block.strip() for block in blocks if block.strip())
+    
+    def close(self):
+        if self._pending.strip():
+            self._paragraphs.append(self._pending.strip())
+        self._pending = ""
+        if self._paragraphs:
+            self.sections.append({"heading_path": "", "paragraphs": self._paragraphs})
+            self._paragraphs = []
+
+
+def parse_sections(html_content: str) -> List[Dict]:
+    """Secciones de una página HTML ya descargada"""
+    parser = SectionParser()
+    parser.feed(html_content)
+    parser.close()
+    return parser.sections
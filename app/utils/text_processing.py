@@ -1,5 +1,27 @@
+from collections import Counter
+from typing import Iterable, Iterator, List, Sequence, Tuple
+import math
 import re
-from typing import List
+
+# Patrones compilados una vez: estas funciones se aplican a todos los chunks de una ingesta
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SENTENCE_PATTERN = re.compile(r'[^.!?]+')
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+QUESTION_WORD_PATTERN = re.compile(r'[\w+#]+')
+
+# Stop words básicas en español
+STOP_WORDS = frozenset({
+    'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'una', 'como', 'pero', 'sus', 'me', 'hasta', 'hay', 'donde', 'han', 'quien', 'están', 'estado', 'desde', 'todo', 'nos', 'durante', 'todos', 'uno', 'les', 'ni', 'contra', 'otros', 'ese', 'eso', 'ante', 'ellos', 'e', 'esto', 'mí', 'antes', 'algunos', 'qué', 'unos', 'yo', 'otro', 'otras', 'otra', 'él', 'tanto', 'esa', 'estos', 'mucho', 'quienes', 'nada', 'muchos', 'cual', 'poco', 'ella', 'estar', 'estas', 'algunas', 'algo', 'nosotros'
+})
+
+CODE_INDICATORS = (
+    'def ', 'class ', 'import ', 'from ', 'if __name__',
+    'function', 'var ', 'const ', 'let ', 'return ',
+    'for ', 'while ', 'if ', 'else:', 'elif ',
+    'try:', 'except:', 'finally:', 'with ',
+    'async def', 'await ', 'async with'
+)
 
 
 def clean_text(text: str) -> str:
@@ -7,15 +29,37 @@ def clean_text(text: str) -> str:
     Limpiar texto eliminando caracteres especiales y normalizando espacios
     """
     # Eliminar caracteres de control excepto saltos de línea
-    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', text)
-    
-    # Normalizar espacios
-    text = re.sub(r'\s+', ' ', text)
+    text = CONTROL_CHARS_PATTERN.sub('', text)
     
-    # Eliminar espacios al inicio y final
-    text = text.strip()
-    
-    return text
+    # Normalizar espacios y eliminar los del inicio y el final
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def clean_texts(texts: Iterable[str]) -> Iterator[str]:
+    """
+    ``clean_text`` sobre una secuencia de textos, uno a uno (p.ej. los chunks de una colección)
+    """
+    for text in texts:
+        yield clean_text(text)
+
+
+# Bloque de código markdown, también indentado: ```lenguaje ... ```
+CODE_BLOCK_PATTERN = re.compile(r'```([\w+#-]*)[ \t]*\n(.*?)\n[ \t]*```', re.DOTALL)
+
+# Nombres alternativos de lenguajes en clases de resaltado y en preguntas
+LANGUAGE_ALIASES = {
+    'py': 'python', 'python3': 'python',
+    'js': 'javascript', 'jsx': 'javascript', 'node': 'javascript', 'nodejs': 'javascript',
+    'ts': 'typescript', 'tsx': 'typescript',
+    'sh': 'bash', 'shell': 'bash', 'console': 'bash', 'zsh': 'bash',
+    'yml': 'yaml', 'golang': 'go', 'rs': 'rust', 'c++': 'cpp', 'cs': 'csharp', 'c#': 'csharp',
+}
+
+# Lenguajes que se reconocen al mencionarlos en una pregunta ("go" no: es ambiguo)
+KNOWN_LANGUAGES = {
+    'python', 'javascript', 'typescript', 'bash', 'java', 'rust', 'ruby', 'php',
+    'cpp', 'csharp', 'kotlin', 'swift', 'sql', 'html', 'css', 'json', 'yaml', 'toml',
+}
 
 
 def extract_code_blocks(text: str) -> List[str]:
@@ -23,63 +67,123 @@ def extract_code_blocks(text: str) -> List[str]:
     Extraer bloques de código del texto
     """
     # Buscar bloques de código con markdown
-    code_pattern = r'```(?:\w+)?\n(.*?)\n```'
-    matches = re.findall(code_pattern, text, re.DOTALL)
-    
-    return [match.strip() for match in matches]
+    return [code.strip() for _, code in CODE_BLOCK_PATTERN.findall(text)]
+
+
+def normalize_language(name: str) -> str:
+    """
+    Nombre canónico de un lenguaje (``py`` -> ``python``)
+    """
+    name = name.strip().lower()
+    return LANGUAGE_ALIASES.get(name, name)
+
+
+def extract_code_languages(text: str) -> List[str]:
+    """
+    Lenguajes de los bloques de código del texto, sin repetir y en orden de aparición
+    """
+    languages = (normalize_language(language) for language, _ in CODE_BLOCK_PATTERN.findall(text))
+    return list(dict.fromkeys(language for language in languages if language))
+
+
+def languages_in_question(question: str) -> List[str]:
+    """
+    Lenguajes mencionados en una pregunta (p.ej. "ejemplo en Python")
+    """
+    words = QUESTION_WORD_PATTERN.findall(question.lower())
+    languages = (normalize_language(word) for word in words)
+    return list(dict.fromkeys(language for language in languages if language in KNOWN_LANGUAGES))
 
 
 def is_code_like(text: str) -> bool:
     """
     Determinar si un texto parece ser código
     """
-    code_indicators = [
-        'def ', 'class ', 'import ', 'from ', 'if __name__',
-        'function', 'var ', 'const ', 'let ', 'return ',
-        'for ', 'while ', 'if ', 'else:', 'elif ',
-        'try:', 'except:', 'finally:', 'with ',
-        'async def', 'await ', 'async with'
-    ]
-    
     text_lower = text.lower()
-    return any(indicator in text_lower for indicator in code_indicators)
+    return any(indicator in text_lower for indicator in CODE_INDICATORS)
 
 
 def split_into_sentences(text: str) -> List[str]:
     """
     Dividir texto en oraciones
     """
-    # Patrón para dividir en oraciones
-    sentence_pattern = r'[.!?]+'
-    sentences = re.split(sentence_pattern, text)
-    
-    # Limpiar y filtrar oraciones vacías
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    return sentences
+    return list(iter_sentences(text))
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """
+    Oraciones del texto a medida que se encuentran, sin dividirlo entero antes
+    """
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if sentence:
+            yield sentence
+
+
+def iter_corpus_sentences(texts: Iterable[str]) -> Iterator[str]:
+    """
+    Oraciones de todos los textos de un corpus, en orden
+    """
+    for text in texts:
+        yield from iter_sentences(text)
+
+
+def keyword_counts(text: str) -> Counter:
+    """
+    Frecuencia de las palabras candidatas a palabra clave: en minúsculas, sin
+    signos, de más de dos letras y sin stop words
+    """
+    # Contar todas las palabras y descartar después: se filtran las distintas, no cada aparición
+    counts = Counter(NON_WORD_PATTERN.sub('', text.lower()).split())
+    for word in [word for word in counts if len(word) <= 2 or word in STOP_WORDS]:
+        del counts[word]
+    return counts
 
 
 def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
     """
     Extraer palabras clave del texto
     """
-    # Eliminar caracteres especiales y convertir a minúsculas
-    clean_text = re.sub(r'[^\w\s]', '', text.lower())
-    
-    # Dividir en palabras
-    words = clean_text.split()
-    
-    # Filtrar palabras comunes (stop words básicas)
-    stop_words = {
-        'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'una', 'como', 'pero', 'sus', 'me', 'hasta', 'hay', 'donde', 'han', 'quien', 'están', 'estado', 'desde', 'todo', 'nos', 'durante', 'todos', 'uno', 'les', 'ni', 'contra', 'otros', 'ese', 'eso', 'ante', 'ellos', 'e', 'esto', 'mí', 'antes', 'algunos', 'qué', 'unos', 'yo', 'otro', 'otras', 'otra', 'él', 'tanto', 'esa', 'estos', 'mucho', 'quienes', 'nada', 'muchos', 'cual', 'poco', 'ella', 'estar', 'estas', 'algunas', 'algo', 'nosotros'
-    }
+    # Palabras más frecuentes
+    return [word for word, _ in keyword_counts(text).most_common(max_keywords)]
+
+
+def extract_keywords_batch(texts: Iterable[str], max_keywords: int = 10) -> Iterator[List[str]]:
+    """
+    ``extract_keywords`` de cada texto de una secuencia
+    """
+    for text in texts:
+        yield extract_keywords(text, max_keywords)
+
+
+def tfidf_keywords(documents: Sequence[str], max_keywords: int = 10) -> Tuple[List[List[str]], List[str]]:
+    """
+    Palabras clave por TF-IDF de todo un corpus (p.ej. los chunks de una colección)
     
-    # Filtrar palabras cortas y stop words
-    keywords = [word for word in words if len(word) > 2 and word not in stop_words]
+    Una sola pasada tokeniza cada documento; las palabras que aparecen en
+    casi todos (nombre del producto, términos de navegación) pesan menos que
+    las propias de cada documento. Devuelve las palabras clave de cada
+    documento y las del corpus (mayor TF-IDF acumulado), con los empates
+    ordenados alfabéticamente.
+    """
+    counts = [keyword_counts(document) for document in documents]
+    document_frequency: Counter = Counter()
+    for count in counts:
+        document_frequency.update(count.keys())
     
-    # Contar frecuencia
-    from collections import Counter
-    word_counts = Counter(keywords)
+    # IDF suavizado: una palabra presente en todos los documentos conserva peso 1
+    n_documents = len(counts)
+    idf = {word: math.log((1 + n_documents) / (1 + df)) + 1 for word, df in document_frequency.items()}
     
-    # Obtener las palabras más frecuentes
-    return [word for word, count in word_counts.most_common(max_keywords)] 
\ No newline at end of file
+    per_document = []
+    corpus_scores: Counter = Counter()
+    for count in counts:
+        total = sum(count.values())
+        scores = {word: frequency / total * idf[word] for word, frequency in count.items()}
+        corpus_scores.update(scores)
+        per_document.append(_top_words(scores, max_keywords))
+    return per_document, _top_words(corpus_scores, max_keywords)
+
+
+def _top_words(scores: dict, limit: int) -> List[str]:
+    return [word for word, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]]
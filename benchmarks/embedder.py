@@ -0,0 +1,43 @@
+from typing import Optional, Sequence
+import hashlib
+import re
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Embedder determinista sin descargas para ejecutar los benchmarks offline.
+    
+    Proyecta los tokens del texto sobre ``dimension`` componentes mediante
+    hashing y normaliza el vector. Expone la misma interfaz ``encode`` que
+    SentenceTransformer, de modo que lo que se mide es el resto del pipeline
+    (segmentación, escritura y consulta en ChromaDB), no el modelo.
+    """
+    
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+    
+    def _bucket(self, token: str) -> int:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.dimension
+    
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _TOKEN_PATTERN.findall(text.lower()):
+                vectors[row, self._bucket(token)] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+
+def load_embedder(model_path: Optional[str] = None):
+    """Modelo real si se indica una ruta local; si no, el embedder por hashing"""
+    if model_path:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_path)
+    return HashingEmbedder()
@@ -0,0 +1,81 @@
+"""
+Generar los corpus HTML de los benchmarks.
+
+Los ficheros generados se versionan junto al script; solo hace falta volver a
+ejecutarlo si cambia el generador (los resultados dejarían de ser comparables
+con el baseline):
+
+    python -m benchmarks.fixtures.generate
+"""
+from pathlib import Path
+import html
+import random
+
+FIXTURES_DIR = Path(__file__).parent
+
+# Nombre del corpus -> número de secciones (~1 KB de HTML por sección)
+SIZES = {
+    "small": 10,
+    "medium": 100,
+    "large": 500,
+}
+
+_WORDS = (
+    "configuración servicio cliente servidor petición respuesta parámetro "
+    "opcional valor por defecto función método clase módulo paquete instalar "
+    "ejecutar comando entorno variable base de datos conexión índice consulta "
+    "documento colección embedding modelo token caché latencia memoria proceso "
+    "tarea cola worker API endpoint esquema validación error excepción registro"
+).split()
+
+_CODE_SNIPPETS = (
+    "from app.config import settings\nclient = Client(url=settings.redis_url)\nclient.ping()",
+    "def handler(event):\n    result = process(event)\n    return {'status': 'ok', 'result': result}",
+    "async def main():\n    async with httpx.AsyncClient() as client:\n        response = await client.get(URL)\n        return response.json()",
+    "const config = { retries: 3, timeout: 5000 };\nexport default config;",
+)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def _section(rng: random.Random, index: int) -> str:
+    parts = [f"<section id=\"s{index}\"><h2>Sección {index}: {rng.choice(_WORDS)}</h2>"]
+    for _ in range(rng.randint(2, 4)):
+        parts.append("<p>" + " ".join(_sentence(rng) for _ in range(rng.randint(2, 5))) + "</p>")
+    if rng.random() < 0.4:
+        parts.append("<pre><code>" + html.escape(rng.choice(_CODE_SNIPPETS)) + "</code></pre>")
+    if rng.random() < 0.3:
+        items = "".join(f"<li>{_sentence(rng)}</li>" for _ in range(rng.randint(2, 5)))
+        parts.append(f"<ul>{items}</ul>")
+    parts.append("</section>")
+    return "\n".join(parts)
+
+
+def generate(name: str, sections: int, seed: int = 0) -> str:
+    """HTML de documentación con la estructura típica de un sitio real"""
+    rng = random.Random(f"{name}:{seed}")
+    body = "\n".join(_section(rng, i) for i in range(sections))
+    nav = "".join(f"<a href=\"/docs/{i}\">{rng.choice(_WORDS)}</a>" for i in range(30))
+    return (
+        "<!DOCTYPE html>\n<html lang=\"es\"><head><title>Documentación</title>"
+        "<style>body { font-family: sans-serif; }</style>"
+        "<script>window.analytics = { enabled: true };</script></head>\n<body>"
+        f"<header><h1>Documentación ({name})</h1></header>\n<nav>{nav}</nav>\n"
+        f"<main>\n{body}\n</main>\n"
+        "<aside>Enlaces relacionados</aside><footer>© Ejemplo</footer>\n"
+        "</body></html>\n"
+    )
+
+
+def main():
+    for name, sections in SIZES.items():
+        path = FIXTURES_DIR / f"docs_{name}.html"
+        path.write_text(generate(name, sections), encoding="utf-8")
+        print(f"{path.name}: {path.stat().st_size / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
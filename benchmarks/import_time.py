@@ -0,0 +1,65 @@
+"""
+Perfil del tiempo de importación (arranque en frío) de los puntos de entrada.
+
+    python -m benchmarks.import_time app.main --top 20
+
+Cada medida se hace en un proceso nuevo, así que incluye el coste real de
+cargar las dependencias. ``run.py`` usa ``import_module_in_subprocess`` para
+vigilar regresiones del arranque frente al baseline.
+"""
+from pathlib import Path
+from typing import List, Tuple
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Puntos de entrada cuyo arranque en frío se mide: la API y los workers de Celery
+ENTRY_POINTS = ("app.main", "app.tasks.processing_tasks")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("ANONYMIZED_TELEMETRY", "False")
+    return env
+
+
+def import_module_in_subprocess(module: str) -> str:
+    """Importar ``module`` en un intérprete nuevo; devuelve la salida de -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    return result.stderr
+
+
+def parse_importtime(output: str) -> List[Tuple[str, float, float]]:
+    """(módulo, propio en s, acumulado en s) de cada línea de -X importtime"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        rows.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tiempo de importación por módulo")
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=15, help="módulos más costosos a mostrar")
+    args = parser.parse_args(argv)
+    
+    rows = parse_importtime(import_module_in_subprocess(args.module))
+    total = next((cumulative for name, _, cumulative in rows if name == args.module), None)
+    print(f"import {args.module}: {total:.3f}s" if total is not None else f"import {args.module}")
+    print(f"{'module':<60} {'self s':>8} {'cumulative s':>13}")
+    for name, own, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{name:<60} {own:>8.3f} {cumulative:>13.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
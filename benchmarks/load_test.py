@@ -0,0 +1,348 @@
+"""
+Prueba de carga local de la API a concurrencia creciente.
+
+Sirve los corpus de ``benchmarks/fixtures`` como sitio de documentación local y
+lanza peticiones a ``/api/v1/chat`` y ``/api/v1/process-documentation`` en
+escalones de concurrencia. Por escalón informa throughput, p50/p95/p99 y tasa
+de errores, y guarda los resultados en JSON ordenado para poder compararlos
+con ``git diff``. Antes de la carga de preguntas se procesa un documento del
+sitio para el chat de cada usuario, de modo que cada pregunta recorre el RAG,
+el grafo del agente y el LLM.
+
+La API debe usar el LLM de pruebas (``LLM_PROVIDER=fake``) para que la carga
+no dependa de un proveedor externo. Con ``--start-api`` el script la arranca
+así; Postgres, Redis y los workers de Celery tienen que estar levantados.
+
+    python -m benchmarks.load_test --start-api --steps 1,2,4,8,16,32
+    python -m benchmarks.load_test --base-url http://localhost:8000 --scenario chat
+"""
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import httpx
+
+BENCHMARKS_DIR = Path(__file__).parent
+FIXTURES_DIR = BENCHMARKS_DIR / "fixtures"
+REPO_ROOT = BENCHMARKS_DIR.parent
+
+SCENARIOS = ("chat", "ingest", "mixed")
+
+QUESTIONS = (
+    "¿Cómo configurar la conexión a la base de datos?",
+    "Muéstrame un ejemplo de función async con httpx",
+    "¿Qué parámetro controla la latencia de la caché?",
+    "¿Puedes explicarlo con más detalle?",
+)
+
+# Respuestas de ``process_question`` cuando el chat no tiene documentación
+# procesada: devuelven 200 sin pasar por el RAG ni el LLM y cuentan como error
+NO_DOCUMENTATION_ANSWERS = (
+    "La documentación aún se está procesando",
+    "Hubo un error procesando la documentación",
+    "No se encontró documentación procesada",
+    "La documentación de estos chats no está disponible",
+)
+
+# Espera entre consultas de estado al preparar los chats
+PREPARE_POLL_SECONDS = 1.0
+
+# Un escalón está saturado si el throughput crece menos que esto respecto al anterior...
+SATURATION_MIN_GAIN = 0.10
+# ...o si la tasa de errores supera este valor
+SATURATION_MAX_ERROR_RATE = 0.01
+
+
+@dataclass
+class StepResult:
+    concurrency: int
+    duration: float
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+    
+    def record(self, latency: float, status: str, ok: bool):
+        self.latencies.append(latency)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+    
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "throughput_rps": round(self.requests / self.duration, 2) if self.duration else 0.0,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "p50_ms": _ms(percentile(ordered, 0.50)),
+            "p95_ms": _ms(percentile(ordered, 0.95)),
+            "p99_ms": _ms(percentile(ordered, 0.99)),
+            "status_codes": dict(sorted(self.status_codes.items())),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def chat_answered(response: httpx.Response) -> bool:
+    """Si la respuesta de ``/api/v1/chat`` viene del agente y no del aviso de chat sin documentación"""
+    if not response.is_success:
+        return False
+    try:
+        answer = response.json().get("response") or ""
+    except ValueError:
+        return False
+    return not answer.startswith(NO_DOCUMENTATION_ANSWERS)
+
+
+def find_saturation(steps: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Concurrencia a partir de la cual añadir usuarios ya no aporta throughput
+    (o empiezan los errores). None si no se alcanzó en los escalones medidos.
+    """
+    previous = None
+    for step in steps:
+        if step["error_rate"] > SATURATION_MAX_ERROR_RATE:
+            return step["concurrency"]
+        if previous and previous["throughput_rps"]:
+            gain = step["throughput_rps"] / previous["throughput_rps"] - 1
+            if gain < SATURATION_MIN_GAIN:
+                return previous["concurrency"]
+        previous = step
+    return None
+
+
+class FixtureSite:
+    """Sitio de documentación local con los corpus HTML de los benchmarks"""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, public_url: Optional[str] = None):
+        handler = partial(_QuietHandler, directory=str(FIXTURES_DIR))
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        # URL con la que los workers alcanzan el sitio (p.ej. desde Docker)
+        self.public_url = public_url
+    
+    @property
+    def base_url(self) -> str:
+        if self.public_url:
+            return self.public_url.rstrip("/")
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def urls(self) -> List[str]:
+        return [f"{self.base_url}/{path.name}" for path in sorted(FIXTURES_DIR.glob("docs_*.html"))]
+    
+    def __enter__(self) -> "FixtureSite":
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadGenerator:
+    """Usuarios concurrentes en bucle cerrado: cada uno lanza la siguiente petición al recibir la anterior"""
+    
+    def __init__(self, client: httpx.AsyncClient, scenario: str, doc_urls: List[str], run_id: str):
+        self.client = client
+        self.scenario = scenario
+        self.doc_urls = doc_urls
+        self.run_id = run_id
+        self._counter = 0
+    
+    def chat_id(self, worker: int) -> str:
+        return f"load_{self.run_id}_chat_{worker}"
+    
+    async def prepare_chats(self, workers: int, timeout: float):
+        """
+        Procesar un documento del sitio para el chat de cada usuario y esperar
+        a que todos estén en COMPLETED. Lanza ``RuntimeError`` si alguno falla
+        o no termina en ``timeout`` segundos.
+        """
+        pending = set()
+        for worker in range(workers):
+            url = f"{self.doc_urls[worker % len(self.doc_urls)]}?load={self.run_id}-chat-{worker}"
+            response = await self.client.post(
+                "/api/v1/process-documentation", json={"url": url, "chatId": self.chat_id(worker)}
+            )
+            response.raise_for_status()
+            pending.add(self.chat_id(worker))
+        
+        deadline = time.monotonic() + timeout
+        while pending:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Chats not processed after {timeout}s: {', '.join(sorted(pending))}")
+            for chat_id in sorted(pending):
+                response = await self.client.get(f"/api/v1/processing-status/{chat_id}")
+                response.raise_for_status()
+                status = response.json()["status"]
+                if status == "COMPLETED":
+                    pending.discard(chat_id)
+                elif status in ("FAILED", "EVICTED"):
+                    raise RuntimeError(f"Could not prepare chat {chat_id}: {status}")
+            if pending:
+                await asyncio.sleep(PREPARE_POLL_SECONDS)
+    
+    def _next_request(self, worker: int) -> tuple:
+        self._counter += 1
+        n = self._counter
+        kind = self.scenario
+        if kind == "mixed":
+            # Una ingesta por cada nueve preguntas
+            kind = "ingest" if n % 10 == 0 else "chat"
+        if kind == "chat":
+            return "POST", f"/api/v1/chat/{self.chat_id(worker)}", {"question": QUESTIONS[n % len(QUESTIONS)]}
+        # URL única por petición para que la deduplicación de ingestas no colapse la carga
+        url = f"{self.doc_urls[n % len(self.doc_urls)]}?load={self.run_id}-{n}"
+        return "POST", "/api/v1/process-documentation", {"url": url, "chatId": f"load_{self.run_id}_ingest_{n}"}
+    
+    async def _user(self, worker: int, deadline: float, result: StepResult):
+        while time.perf_counter() < deadline:
+            method, path, payload = self._next_request(worker)
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, json=payload)
+                latency = time.perf_counter() - start
+                if path.startswith("/api/v1/chat/") and response.is_success and not chat_answered(response):
+                    result.record(latency, "no_documentation", False)
+                else:
+                    result.record(latency, str(response.status_code), response.is_success)
+            except httpx.HTTPError as e:
+                result.record(time.perf_counter() - start, type(e).__name__, False)
+    
+    async def run_step(self, concurrency: int, duration: float) -> StepResult:
+        start = time.perf_counter()
+        result = StepResult(concurrency=concurrency, duration=duration)
+        deadline = start + duration
+        await asyncio.gather(*(self._user(worker, deadline, result) for worker in range(concurrency)))
+        # Las últimas peticiones pueden terminar después del plazo
+        result.duration = time.perf_counter() - start
+        return result
+
+
+async def run_load_test(
+    base_url: str,
+    scenario: str,
+    steps: List[int],
+    step_duration: float,
+    doc_urls: List[str],
+    timeout: float,
+    prepare_timeout: float = 600.0,
+) -> List[Dict[str, Any]]:
+    run_id = str(int(time.time()))
+    limits = httpx.Limits(max_connections=max(steps), max_keepalive_connections=max(steps))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        generator = LoadGenerator(client, scenario, doc_urls, run_id)
+        if scenario in ("chat", "mixed"):
+            print(f"Preparing {max(steps)} chats...", file=sys.stderr)
+            await generator.prepare_chats(max(steps), prepare_timeout)
+        summaries = []
+        for concurrency in steps:
+            summary = (await generator.run_step(concurrency, step_duration)).summary()
+            summaries.append(summary)
+            print(
+                f"c={concurrency:<4} rps={summary['throughput_rps']:<8} p50={summary['p50_ms']}ms "
+                f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms errors={summary['error_rate']:.2%}",
+                file=sys.stderr
+            )
+    return summaries
+
+
+def start_api(port: int, ready_timeout: float = 300.0) -> subprocess.Popen:
+    """Arrancar la API con el LLM de pruebas y esperar a /ready"""
+    env = dict(os.environ, LLM_PROVIDER="fake")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env
+    )
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API process exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=2).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError(f"API not ready after {ready_timeout}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga local de la API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-api", action="store_true", help="arrancar la API con LLM_PROVIDER=fake")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--steps", default="1,2,4,8,16,32", help="concurrencias separadas por comas")
+    parser.add_argument("--step-duration", type=float, default=20.0, help="segundos por escalón")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por petición")
+    parser.add_argument("--prepare-timeout", type=float, default=600.0, help="segundos para procesar los chats de la prueba")
+    parser.add_argument("--output", type=Path, default=BENCHMARKS_DIR / "results" / "load_test.json")
+    parser.add_argument("--site-host", default="127.0.0.1", help="interfaz del sitio de documentación local")
+    parser.add_argument("--site-port", type=int, default=0)
+    parser.add_argument("--site-url", help="URL pública del sitio si los workers no lo ven en localhost")
+    args = parser.parse_args(argv)
+    
+    steps = [int(step) for step in args.steps.split(",") if step.strip()]
+    api = None
+    base_url = args.base_url
+    if args.start_api:
+        port = httpx.URL(base_url).port or 8000
+        api = start_api(port)
+    try:
+        with FixtureSite(args.site_host, args.site_port, args.site_url) as site:
+            summaries = asyncio.run(
+                run_load_test(
+                    base_url, args.scenario, steps, args.step_duration, site.urls(), args.timeout, args.prepare_timeout
+                )
+            )
+    finally:
+        if api:
+            api.terminate()
+            api.wait()
+    
+    report = {
+        "scenario": args.scenario,
+        "step_duration_seconds": args.step_duration,
+        "steps": summaries,
+        "saturation_concurrency": find_saturation(summaries),
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    print(f"Saturation at concurrency: {report['saturation_concurrency'] or 'not reached'}")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Recall frente a latencia de los perfiles HNSW por tamaño de corpus.
+
+Para cada tamaño construye una colección por perfil con embeddings sintéticos
+agrupados (parecidos a los de chunks de documentación), lanza las mismas
+consultas y compara los resultados con el top-k exacto por fuerza bruta:
+
+    python -m benchmarks.recall --sizes 1000,10000,50000 --profiles fast,balanced,accurate
+
+Sirve para fijar ``AUTO_PROFILE_THRESHOLDS`` en ``app.services.vector_store``.
+"""
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+DEFAULT_SIZES = "1000,10000,50000"
+DEFAULT_DIMENSION = 384
+ADD_BATCH_SIZE = 5000
+
+
+@dataclass
+class RecallResult:
+    profile: str
+    size: int
+    recall: float
+    p50_ms: float
+    p95_ms: float
+    build_seconds: float
+
+
+def synthetic_embeddings(size: int, dimension: int, seed: int = 0, clusters: int = 50) -> np.ndarray:
+    """Vectores normalizados alrededor de ``clusters`` temas, como chunks de varias páginas"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(clusters, size=size)] + rng.normal(scale=0.8, size=(size, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top_k(data: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Vecinos exactos por similitud coseno (vectores ya normalizados)"""
+    scores = queries @ data.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def measure_profile(client, profile: str, data: np.ndarray, queries: np.ndarray, truth: List[set], k: int) -> RecallResult:
+    from app.services.vector_store import index_metadata
+    
+    name = f"recall_{profile}_{len(data)}"
+    start = time.perf_counter()
+    collection = client.create_collection(name, metadata=index_metadata(len(data), profile=profile))
+    for offset in range(0, len(data), ADD_BATCH_SIZE):
+        batch = data[offset:offset + ADD_BATCH_SIZE]
+        collection.add(ids=[str(i) for i in range(offset, offset + len(batch))], embeddings=batch.tolist())
+    build_seconds = time.perf_counter() - start
+    
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {int(i) for i in result["ids"][0]})
+    client.delete_collection(name)
+    
+    latencies.sort()
+    return RecallResult(
+        profile=profile,
+        size=len(data),
+        recall=round(hits / (len(queries) * k), 4),
+        p50_ms=round(statistics.median(latencies) * 1000, 3),
+        p95_ms=round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+        build_seconds=round(build_seconds, 2),
+    )
+
+
+def run_recall(sizes: List[int], profiles: List[str], queries: int, k: int, dimension: int, chroma_dir: str) -> List[RecallResult]:
+    from app.services.vector_store import get_chroma_client
+    
+    client = get_chroma_client(chroma_dir)
+    results = []
+    for size in sizes:
+        data = synthetic_embeddings(size, dimension)
+        query_vectors = synthetic_embeddings(queries, dimension, seed=1)
+        truth = exact_top_k(data, query_vectors, k)
+        for profile in profiles:
+            result = measure_profile(client, profile, data, query_vectors, truth, k)
+            results.append(result)
+            print(
+                f"{profile:<10} n={size:<8} recall@{k}={result.recall:.3f} p50={result.p50_ms:.2f}ms "
+                f"p95={result.p95_ms:.2f}ms build={result.build_seconds:.1f}s",
+                file=sys.stderr
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.services.vector_store import HNSW_PROFILES
+    
+    parser = argparse.ArgumentParser(description="Recall frente a latencia de los perfiles HNSW")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="tamaños de corpus separados por comas")
+    parser.add_argument("--profiles", default=",".join(HNSW_PROFILES), help="perfiles separados por comas")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5, help="resultados por consulta (top_k de RAGService)")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION)
+    parser.add_argument("--output", type=Path, help="guardar los resultados en JSON")
+    args = parser.parse_args(argv)
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    profiles = [profile.strip() for profile in args.profiles.split(",") if profile.strip()]
+    chroma_dir = tempfile.mkdtemp(prefix="bench_recall_")
+    try:
+        results = run_recall(sizes, profiles, args.queries, args.k, args.dimension, chroma_dir)
+    finally:
+        shutil.rmtree(chroma_dir, ignore_errors=True)
+    
+    print(f"{'profile':<10} {'size':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    for r in results:
+        print(f"{r.profile:<10} {r.size:>8} {r.recall:>7.3f} {r.p50_ms:>8.2f} {r.p95_ms:>8.2f} {r.build_seconds:>8.1f}")
+    
+    if args.output:
+        args.output.write_text(json.dumps([asdict(r) for r in results], indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Benchmarks de la ingesta y la recuperación.
+
+Se ejecutan offline sobre los corpus HTML de ``benchmarks/fixtures`` y un
+directorio local de ChromaDB, junto con el tiempo de importación en frío de
+la API y los workers, y se comparan con ``benchmarks/baseline.json``:
+
+    python -m benchmarks.run                     # comparar con el baseline
+    python -m benchmarks.run --update-baseline   # registrar un nuevo baseline
+    python -m benchmarks.run --filter chunking --repeat 10
+
+Termina con código 1 si algún caso supera su umbral de regresión o no tiene
+entrada en el baseline: un caso nuevo, o uno cuyo coste cambia a propósito, se
+registra con ``--update-baseline`` en el mismo commit que lo introduce, con la
+regresión aceptada explicada en el mensaje del commit.
+"""
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# ChromaDB no debe intentar enviar telemetría: los benchmarks son offline
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+BENCHMARKS_DIR = Path(__file__).parent
+FIXTURES_DIR = BENCHMARKS_DIR / "fixtures"
+BASELINE_PATH = BENCHMARKS_DIR / "baseline.json"
+
+# Un caso es regresión si su mediana supera la del baseline por este factor...
+DEFAULT_THRESHOLD = 1.3
+# ...y además por más de este margen absoluto (ruido en casos de microsegundos)
+MIN_DELTA_SECONDS = 0.002
+
+CORPUS_SIZES = ("small", "medium", "large")
+
+# El corpus "multi-MB" repite el texto de "large" hasta unos 2.5 MB, en chunks
+# de 1000 caracteres como los de una colección grande
+MULTI_MB_REPEAT = 4
+MULTI_MB_CHUNK_SIZE = 1000
+
+QUESTIONS = (
+    "¿Cómo configurar la conexión a la base de datos?",
+    "¿Qué parámetro opcional controla la latencia de la caché?",
+    "Ejemplo de función async con httpx",
+    "¿Cómo registrar un worker en la cola de tareas?",
+)
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    median: float
+    minimum: float
+    repeats: int
+
+
+def measure(name: str, fn: Callable[[], Any], repeat: int, warmup: int = 1) -> BenchmarkResult:
+    """Ejecutar ``fn`` varias veces y quedarse con la mediana y el mínimo"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return BenchmarkResult(name, statistics.median(timings), min(timings), repeat)
+
+
+def load_corpora() -> Dict[str, str]:
+    return {
+        size: (FIXTURES_DIR / f"docs_{size}.html").read_text(encoding="utf-8")
+        for size in CORPUS_SIZES
+    }
+
+
+def build_cases(corpora: Dict[str, str], embedder) -> List[Case]:
+    """
+    Casos en orden de ejecución: primero el arranque en frío de los puntos de
+    entrada; después, por corpus, la escritura en ChromaDB va antes de su
+    consulta, que lee la colección que deja escrita.
+    """
+    from app.services.rag_service import RAGService
+    from app.services.vector_store import get_vector_store
+    from app.tasks.processing_tasks import (
+        chunk_sections, clean_html_content, extract_sections, intelligent_chunking, store_embeddings
+    )
+    from app.utils import text_processing
+    from benchmarks.import_time import ENTRY_POINTS, import_module_in_subprocess
+    
+    cases: List[Case] = [
+        (f"import[{module}]", lambda module=module: import_module_in_subprocess(module))
+        for module in ENTRY_POINTS
+    ]
+    rag = RAGService(embedding_model=embedder, client=get_vector_store())
+    for size, html in corpora.items():
+        text = clean_html_content(html)
+        chunks = intelligent_chunking(text)
+        chat_id = f"bench_{size}"
+        cases += [
+            (f"clean_html_content[{size}]", lambda html=html: clean_html_content(html)),
+            (f"intelligent_chunking[{size}]", lambda text=text: intelligent_chunking(text)),
+            (f"extract_sections[{size}]", lambda html=html: extract_sections(html)),
+            (f"chunk_sections[{size}]", lambda sections=extract_sections(html): chunk_sections(sections)),
+            (f"text_processing.clean_text[{size}]", lambda text=text: text_processing.clean_text(text)),
+            (f"text_processing.extract_code_blocks[{size}]", lambda text=text: text_processing.extract_code_blocks(text)),
+            (f"text_processing.split_into_sentences[{size}]", lambda text=text: text_processing.split_into_sentences(text)),
+            (f"text_processing.extract_keywords[{size}]", lambda text=text: text_processing.extract_keywords(text)),
+            (f"store_embeddings[{size}]", lambda chunks=chunks, chat_id=chat_id: store_embeddings(chunks, chat_id, "https://bench.local/docs")),
+            (f"retrieve_documents[{size}]", lambda chat_id=chat_id: [rag.retrieve_documents(q, chat_id) for q in QUESTIONS]),
+        ]
+    return cases + multi_mb_cases(clean_html_content(corpora["large"]) * MULTI_MB_REPEAT)
+
+
+def multi_mb_cases(text: str) -> List[Case]:
+    """text_processing sobre varios MB: el texto entero y sus chunks, uno a uno o por lotes"""
+    from app.utils import text_processing
+    
+    chunks = [text[i:i + MULTI_MB_CHUNK_SIZE] for i in range(0, len(text), MULTI_MB_CHUNK_SIZE)]
+    return [
+        ("text_processing.clean_text[multi_mb]", lambda: text_processing.clean_text(text)),
+        ("text_processing.split_into_sentences[multi_mb]", lambda: text_processing.split_into_sentences(text)),
+        ("text_processing.iter_sentences[multi_mb]", lambda: sum(1 for _ in text_processing.iter_sentences(text))),
+        ("text_processing.extract_keywords[multi_mb]", lambda: text_processing.extract_keywords(text)),
+        ("text_processing.clean_texts[multi_mb_chunks]", lambda: list(text_processing.clean_texts(chunks))),
+        ("text_processing.iter_corpus_sentences[multi_mb_chunks]", lambda: sum(1 for _ in text_processing.iter_corpus_sentences(chunks))),
+        ("text_processing.extract_keywords_batch[multi_mb_chunks]", lambda: list(text_processing.extract_keywords_batch(chunks))),
+        ("text_processing.tfidf_keywords[multi_mb_chunks]", lambda: text_processing.tfidf_keywords(chunks)),
+    ]
+
+
+def run_benchmarks(repeat: int, name_filter: Optional[str], chroma_dir: str, embedder) -> List[BenchmarkResult]:
+    from app.config import settings
+    from app.services.collection_lifecycle import collection_lifecycle
+    import app.tasks.processing_tasks as processing_tasks
+    
+    settings.chroma_persist_directory = chroma_dir
+    # Sin Redis: el registro de accesos de las colecciones no forma parte de lo medido
+    with patch.object(processing_tasks, "get_embedding_model", return_value=embedder), \
+            patch.object(collection_lifecycle, "touch"):
+        cases = build_cases(load_corpora(), embedder)
+        results = []
+        for name, fn in cases:
+            if name_filter and name_filter not in name:
+                # La escritura se ejecuta igualmente para que exista la colección a consultar
+                if name.startswith("store_embeddings"):
+                    fn()
+                continue
+            result = measure(name, fn, repeat)
+            results.append(result)
+            print(f"{name:<50} {result.median * 1000:>10.2f} ms", file=sys.stderr)
+    return results
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Dict[str, Any]:
+    if not path.exists():
+        return {"threshold": DEFAULT_THRESHOLD, "results": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Comparar cada resultado con el baseline y marcar las regresiones"""
+    default_threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+    rows = []
+    for result in results:
+        base = baseline.get("results", {}).get(result.name)
+        row = {
+            "name": result.name, "median": result.median, "baseline": None, "ratio": None,
+            "regression": False, "missing": not base,
+        }
+        if base:
+            threshold = base.get("threshold", default_threshold)
+            row["baseline"] = base["median"]
+            row["ratio"] = result.median / base["median"] if base["median"] else None
+            row["regression"] = (
+                result.median > base["median"] * threshold
+                and result.median - base["median"] > MIN_DELTA_SECONDS
+            )
+        rows.append(row)
+    return rows
+
+
+def build_baseline(results: List[BenchmarkResult], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Nuevo baseline conservando los umbrales por caso ya ajustados"""
+    previous_results = previous.get("results", {})
+    entries = {}
+    for result in results:
+        entry = {"median": round(result.median, 6), "min": round(result.minimum, 6)}
+        if "threshold" in previous_results.get(result.name, {}):
+            entry["threshold"] = previous_results[result.name]["threshold"]
+        entries[result.name] = entry
+    return {
+        "threshold": previous.get("threshold", DEFAULT_THRESHOLD),
+        "environment": {
+            "python": platform.python_version(),
+            "system": platform.system(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": {**previous_results, **entries},
+    }
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    print(f"{'benchmark':<50} {'median ms':>10} {'baseline ms':>12} {'ratio':>7}")
+    for row in rows:
+        baseline = f"{row['baseline'] * 1000:.2f}" if row["baseline"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+        flag = "  REGRESSION" if row["regression"] else "  NO BASELINE" if row.get("missing") else ""
+        print(f"{row['name']:<50} {row['median'] * 1000:>10.2f} {baseline:>12} {ratio:>7}{flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de ingesta y recuperación")
+    parser.add_argument("--repeat", type=int, default=5, help="repeticiones medidas por caso")
+    parser.add_argument("--filter", dest="name_filter", help="ejecutar solo los casos que contengan este texto")
+    parser.add_argument("--update-baseline", action="store_true", help="guardar los resultados como baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--output", type=Path, help="guardar también los resultados en JSON")
+    parser.add_argument("--chroma-dir", help="directorio de ChromaDB (por defecto uno temporal)")
+    parser.add_argument("--embedding-model", help="ruta local a un modelo de SentenceTransformer")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("chromadb").setLevel(logging.ERROR)
+    from benchmarks.embedder import load_embedder
+    
+    chroma_dir = args.chroma_dir or tempfile.mkdtemp(prefix="bench_chroma_")
+    try:
+        results = run_benchmarks(args.repeat, args.name_filter, chroma_dir, load_embedder(args.embedding_model))
+    finally:
+        if not args.chroma_dir:
+            shutil.rmtree(chroma_dir, ignore_errors=True)
+    
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline)
+    print_report(rows)
+    
+    if args.output:
+        args.output.write_text(json.dumps({"results": [asdict(r) for r in results], "comparison": rows}, indent=2))
+    
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(build_baseline(results, baseline), indent=2, ensure_ascii=False) + "\n")
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    
+    status = 0
+    regressions = [row["name"] for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        status = 1
+    missing = [row["name"] for row in rows if row["missing"]]
+    if missing:
+        print(f"{len(missing)} benchmark(s) without baseline (record them with --update-baseline): {', '.join(missing)}")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -107,7 +107,8 @@ def start_services():
     # Iniciar Celery worker en background
     print("📋 Iniciando Celery worker...")
     celery_process = subprocess.Popen(
-        ["celery", "-A", "app.celery_app", "worker", "--loglevel=info"],
+        # -B: beat embebido para las tareas periódicas (solo en desarrollo, un único worker)
+        ["celery", "-A", "app.celery_app", "worker", "-Q", "io,cpu", "-B", "--loglevel=info"],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
     )
@@ -0,0 +1,52 @@
+from unittest.mock import Mock, patch
+from benchmarks.embedder import HashingEmbedder
+from benchmarks.run import BenchmarkResult, build_baseline, build_cases, compare, load_baseline, load_corpora
+
+
+class TestBenchmarkBaseline:
+    
+    def test_regression_needs_ratio_and_absolute_delta(self):
+        """Test only slowdowns above the threshold and the noise floor are regressions"""
+        baseline = {"threshold": 1.3, "results": {
+            "slow": {"median": 0.100},
+            "tiny": {"median": 0.0001},
+            "tuned": {"median": 0.100, "threshold": 2.0},
+        }}
+        results = [
+            BenchmarkResult("slow", 0.150, 0.140, 5),
+            BenchmarkResult("tiny", 0.0005, 0.0004, 5),
+            BenchmarkResult("tuned", 0.150, 0.140, 5),
+            BenchmarkResult("new", 1.0, 1.0, 5),
+        ]
+        
+        rows = compare(results, baseline)
+        
+        assert {row["name"] for row in rows if row["regression"]} == {"slow"}
+        assert {row["name"] for row in rows if row["missing"]} == {"new"}
+    
+    def test_every_case_has_a_baseline(self):
+        """Test new benchmark cases are recorded in baseline.json instead of being skipped"""
+        with patch("app.services.vector_store.get_vector_store", return_value=Mock()):
+            cases = [name for name, _ in build_cases(load_corpora(), HashingEmbedder(dimension=8))]
+        recorded = load_baseline()["results"]
+        
+        assert [name for name in cases if name not in recorded] == []
+    
+    def test_update_keeps_per_case_thresholds(self):
+        """Test refreshing the baseline keeps tuned thresholds"""
+        previous = {"threshold": 1.3, "results": {"tuned": {"median": 0.1, "threshold": 2.0}}}
+        
+        baseline = build_baseline([BenchmarkResult("tuned", 0.2, 0.19, 5)], previous)
+        
+        assert baseline["results"]["tuned"] == {"median": 0.2, "min": 0.19, "threshold": 2.0}
+    
+    def test_hashing_embedder_is_deterministic_and_normalized(self):
+        """Test the offline embedder is stable across calls"""
+        embedder = HashingEmbedder(dimension=64)
+        
+        first = embedder.encode(["configurar la base de datos", ""])
+        second = embedder.encode(["configurar la base de datos", ""])
+        
+        assert (first == second).all()
+        assert abs(float((first[0] ** 2).sum()) - 1.0) < 1e-5
+        assert float(abs(first[1]).sum()) == 0.0
@@ -0,0 +1,138 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.models import Base, ChatHistory, ProcessingJobs
+from app.models.database import TimedQueuePool, pool_metrics
+from app.services.chat_service import ChatService, decode_cursor
+
+
+class TestChatService:
+    
+    @pytest_asyncio.fixture
+    async def chat_service(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        TestingSession = async_sessionmaker(engine, expire_on_commit=False)
+        async with TestingSession() as session:
+            session.add(ProcessingJobs(chat_id="chat_1", source_url="http://test.com", status="COMPLETED"))
+            await session.commit()
+            yield ChatService(session)
+        await engine.dispose()
+    
+    async def _add_exchanges(self, service, count):
+        for i in range(count):
+            await service.save_message("chat_1", "user", f"Pregunta número {i}. Detalle extra")
+            await service.save_message("chat_1", "agent", f"Respuesta número {i}. Más texto")
+    
+    @pytest.mark.asyncio
+    async def test_history_is_limited_to_recent_exchanges(self, chat_service):
+        """Test only the most recent exchanges are returned, in order"""
+        await self._add_exchanges(chat_service, 6)
+        
+        history = await chat_service.get_chat_history("chat_1", max_exchanges=3)
+        
+        assert [user for user, _ in history] == [
+            "Pregunta número 3. Detalle extra",
+            "Pregunta número 4. Detalle extra",
+            "Pregunta número 5. Detalle extra"
+        ]
+        assert history[0][1] == "Respuesta número 3. Más texto"
+    
+    @pytest.mark.asyncio
+    async def test_history_pairs_by_sender(self, chat_service):
+        """Test an unanswered question does not shift the pairs"""
+        await self._add_exchanges(chat_service, 1)
+        await chat_service.save_message("chat_1", "user", "Sin respuesta")
+        
+        history = await chat_service.get_chat_history("chat_1", max_exchanges=3)
+        
+        assert history == [("Pregunta número 0. Detalle extra", "Respuesta número 0. Más texto")]
+    
+    @pytest.mark.asyncio
+    async def test_rolling_summary_covers_older_exchanges(self, chat_service):
+        """Test exchanges outside the window are folded into the summary"""
+        with patch('app.services.chat_service.settings') as mock_settings:
+            mock_settings.chat_history_window = 2
+            mock_settings.chat_summary_batch_size = 20
+            mock_settings.chat_summary_max_chars = 2000
+            await self._add_exchanges(chat_service, 5)
+            assert await chat_service.update_rolling_summary("chat_1")
+            # Una segunda llamada sin mensajes nuevos no cambia nada
+            assert await chat_service.update_rolling_summary("chat_1")
+        
+        summary = await chat_service.get_history_summary("chat_1")
+        lines = summary.splitlines()
+        assert len(lines) == 3
+        assert lines[0] == "- Usuario preguntó: Pregunta número 0 | Asistente: Respuesta número 0"
+        assert "Pregunta número 3" not in summary
+    
+    @pytest.mark.asyncio
+    async def test_rolling_summary_is_bounded(self, chat_service):
+        """Test the summary drops the oldest lines past the size limit"""
+        with patch('app.services.chat_service.settings') as mock_settings:
+            mock_settings.chat_history_window = 1
+            mock_settings.chat_summary_batch_size = 20
+            mock_settings.chat_summary_max_chars = 150
+            await self._add_exchanges(chat_service, 6)
+            await chat_service.update_rolling_summary("chat_1")
+        
+        summary = await chat_service.get_history_summary("chat_1")
+        assert len(summary) <= 150
+        assert "Pregunta número 4" in summary
+        assert "Pregunta número 0" not in summary
+    
+    @pytest.mark.asyncio
+    async def test_processing_status(self, chat_service):
+        """Test processing status lookup"""
+        assert await chat_service.check_processing_status("chat_1") == "COMPLETED"
+        assert await chat_service.check_processing_status("missing") is None
+    
+    
+    @pytest.mark.asyncio
+    async def test_connection_is_checked_out_lazily_and_released(self, tmp_path):
+        """Test sessions take a pool connection on first query and release_connection returns it"""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        pool = engine.sync_engine.pool
+        checkouts = pool_metrics.checkouts
+        
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            service = ChatService(session)
+            assert pool.checkedout() == 0
+            await service.get_chat_history("chat_1")
+            assert pool.checkedout() == 1
+            await service.release_connection()
+            assert pool.checkedout() == 0
+        
+        assert pool_metrics.checkouts == checkouts + 1
+        await engine.dispose()
+    
+    @pytest.mark.asyncio
+    async def test_messages_page_keyset_pagination(self, chat_service):
+        """Test pages follow the cursor without gaps or repeats"""
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        for i in range(5):
+            # Dos mensajes con el mismo created_at: el desempate es message_id
+            chat_service.db.add(ChatHistory(
+                chat_id="chat_1", sender="user", message_text=f"m{i}",
+                created_at=base + timedelta(seconds=i // 2)
+            ))
+        await chat_service.db.commit()
+        
+        first, cursor = await chat_service.get_messages_page("chat_1", limit=2)
+        second, cursor = await chat_service.get_messages_page("chat_1", cursor, limit=2)
+        third, last_cursor = await chat_service.get_messages_page("chat_1", cursor, limit=2)
+        
+        texts = [m.message_text for m in first + second + third]
+        assert texts == ["m0", "m1", "m2", "m3", "m4"]
+        assert last_cursor is None
+    
+    def test_invalid_cursor(self):
+        """Test malformed cursors are rejected"""
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
@@ -0,0 +1,64 @@
+import pytest
+from app.services.chunk_text_store import ChunkTextStore, content_hash
+
+
+@pytest.fixture
+def text_store(tmp_path):
+    return ChunkTextStore(str(tmp_path))
+
+
+def make_texts(count, size=1000):
+    return [f"Chunk {i}: configuración del cliente " + "x" * size for i in range(count)]
+
+
+class TestChunkTextStore:
+    
+    def test_round_trip_by_id(self, text_store):
+        """Test texts are read back by chunk id, in the order asked for"""
+        texts = make_texts(100)
+        ids = [f"chunk_chat_{i}" for i in range(100)]
+        text_store.replace("chat", ids, texts)
+        
+        assert text_store.get_many("chat", ["chunk_chat_99", "chunk_chat_0", "unknown"]) == [texts[99], texts[0], None]
+        assert text_store.get_many("other", ["chunk_chat_0"]) == [None]
+    
+    def test_texts_are_compressed_in_blocks(self, text_store):
+        """Test chunks are grouped in compressed blocks smaller than the raw text"""
+        texts = make_texts(100)
+        text_store.replace("chat", [str(i) for i in range(100)], texts)
+        
+        directory = text_store.chat_directory("chat")
+        (data_file,) = directory.glob("texts-*.zst")
+        assert data_file.stat().st_size < sum(len(text.encode("utf-8")) for text in texts) / 3
+        assert len(list(directory.iterdir())) == 2
+    
+    def test_append_and_replace(self, text_store):
+        """Test appends are visible to open readers and replace drops previous texts"""
+        text_store.replace("chat", ["a"], ["primero"])
+        assert text_store.get_many("chat", ["a"]) == ["primero"]
+        
+        text_store.append("chat", ["b", "a"], ["segundo", "corregido"])
+        assert text_store.get_many("chat", ["a", "b"]) == ["corregido", "segundo"]
+        
+        text_store.replace("chat", ["c"], ["nuevo"])
+        assert text_store.get_many("chat", ["a", "c"]) == [None, "nuevo"]
+        assert len(list(text_store.chat_directory("chat").glob("texts-*.zst"))) == 1
+    
+    def test_delete(self, text_store):
+        """Test deleting a chat removes its files"""
+        text_store.replace("chat", ["a"], ["texto"])
+        
+        assert text_store.delete("chat") is True
+        assert text_store.delete("chat") is False
+        assert text_store.get_many("chat", ["a"]) == [None]
+    
+    def test_rejects_unsafe_chat_ids(self, text_store):
+        """Test chat ids cannot point outside the store directory"""
+        with pytest.raises(ValueError):
+            text_store.replace("../fuera", ["a"], ["texto"])
+        assert text_store.delete("..") is False
+    
+    def test_content_hash(self):
+        """Test equal texts share their hash"""
+        assert content_hash("hola") == content_hash("hola") != content_hash("adiós")
+        assert len(content_hash("hola")) == 16
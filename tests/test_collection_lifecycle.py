@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.config import settings
+from app.services.collection_lifecycle import CollectionLifecycle, LAST_ACCESS_KEY, plan_evictions
+
+
+@pytest.fixture
+def lifecycle(tmp_path):
+    lifecycle = CollectionLifecycle(client=Mock(), persist_directory=str(tmp_path))
+    with patch("app.services.collection_lifecycle.ingestion_registry") as registry:
+        registry.try_claim_chat.return_value = True
+        yield lifecycle
+
+
+def add_collection(lifecycle, chat_id, size=500):
+    collection = lifecycle.store.create_collection(f"chat_{chat_id}")
+    collection.add(
+        ids=[str(i) for i in range(size)],
+        embeddings=np.random.default_rng(0).random((size, 32)).tolist(),
+        documents=["documentación " * 40] * size
+    )
+
+
+class TestCollectionLifecycle:
+    
+    def test_plan_evictions(self):
+        """Test idle collections expire and the rest are returned least recently used first"""
+        last_access = {"a": 100.0, "b": 900.0, "c": 500.0}
+        
+        assert plan_evictions(last_access, now=1000.0, idle_ttl_seconds=600) == (["a"], ["c", "b"])
+        assert plan_evictions(last_access, now=1000.0, idle_ttl_seconds=0) == ([], ["a", "c", "b"])
+    
+    def test_touch_is_throttled(self, lifecycle):
+        """Test access tracking writes at most once per interval and chat"""
+        lifecycle.touch("chat_1", now=1000.0)
+        lifecycle.touch("chat_1", now=1000.0 + settings.collection_touch_interval_seconds / 2)
+        
+        lifecycle.client.zadd.assert_called_once_with(LAST_ACCESS_KEY, {"chat_1": 1000.0})
+    
+    def test_touch_throttle_is_pruned(self, lifecycle):
+        """Test throttle entries older than the interval are dropped instead of piling up"""
+        interval = settings.collection_touch_interval_seconds
+        for i in range(100):
+            lifecycle.touch(f"chat_{i}", now=1000.0 + i * interval)
+        
+        assert list(lifecycle._touched) == ["chat_99"]
+        lifecycle.touch("chat_99", now=1000.0 + 99 * interval + interval / 2)
+        assert lifecycle.client.zadd.call_count == 100
+    
+    def test_evict_idle_collections(self, lifecycle):
+        """Test collections idle past the TTL are deleted and active ones kept"""
+        add_collection(lifecycle, "old")
+        add_collection(lifecycle, "new")
+        now = 10_000_000.0
+        lifecycle.client.zmscore.side_effect = lambda key, ids: [
+            now - settings.collection_idle_ttl_seconds - 1 if chat_id == "old" else now for chat_id in ids
+        ]
+        
+        assert lifecycle.evict(now) == ["old"]
+        assert lifecycle.list_chat_ids() == ["new"]
+    
+    def test_evicted_callback_runs_while_chat_is_claimed(self, lifecycle):
+        """Test the evicted status is recorded before the chat lock is released"""
+        add_collection(lifecycle, "old", size=10)
+        lifecycle.client.zmscore.side_effect = lambda key, ids: [0.0 for _ in ids]
+        calls = []
+        
+        with patch("app.services.collection_lifecycle.ingestion_registry") as registry:
+            registry.try_claim_chat.return_value = True
+            registry.release_chat.side_effect = lambda chat_id, owner: calls.append(("release", chat_id))
+            lifecycle.evict(10_000_000.0, on_evicted=lambda chat_id: calls.append(("evicted", chat_id)))
+        
+        assert calls == [("evicted", "old"), ("release", "old")]
+    
+    def test_evict_over_disk_quota(self, lifecycle):
+        """Test least recently used collections are evicted until usage fits the quota"""
+        last_access = {"a": 1.0, "b": 3.0, "c": 2.0}
+        for chat_id in last_access:
+            add_collection(lifecycle, chat_id)
+        lifecycle.client.zmscore.side_effect = lambda key, ids: [last_access[chat_id] for chat_id in ids]
+        
+        with patch.object(settings, "collection_idle_ttl_seconds", 0), \
+                patch.object(settings, "collection_disk_quota_bytes", lifecycle.disk_usage()["used_bytes"] - 1):
+            evicted = lifecycle.evict(now=10.0)
+        
+        assert evicted == ["a"]
+        assert sorted(lifecycle.list_chat_ids()) == ["b", "c"]
+    
+    def test_ingesting_collection_not_evicted(self, lifecycle):
+        """Test a collection whose chat is being ingested is skipped"""
+        add_collection(lifecycle, "busy")
+        lifecycle.client.zmscore.return_value = [0.0]
+        
+        with patch("app.services.collection_lifecycle.ingestion_registry") as registry:
+            registry.try_claim_chat.return_value = False
+            assert lifecycle.evict(now=10_000_000_000.0) == []
+        assert lifecycle.list_chat_ids() == ["busy"]
+    
+    def test_compact_reclaims_deleted_space(self, lifecycle):
+        """Test deleting frees SQLite pages and compaction returns them to disk"""
+        add_collection(lifecycle, "keep")
+        add_collection(lifecycle, "drop", size=2000)
+        
+        assert lifecycle.delete_collection("drop")
+        assert not lifecycle.delete_collection("drop")
+        freed = lifecycle.disk_usage()
+        result = lifecycle.compact()
+        
+        assert freed["free_bytes"] > 0
+        assert result["vacuumed"]
+        assert result["reclaimed_bytes"] > 0
+        assert lifecycle.disk_usage()["free_bytes"] == 0
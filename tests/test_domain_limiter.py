@@ -0,0 +1,87 @@
+from unittest.mock import Mock, patch
+from app.services.domain_limiter import DomainLimiter, domain_active_key, retry_after_seconds, url_domain
+
+
+class TestDomainLimiter:
+    
+    def test_url_domain(self):
+        """Test limits are keyed by host"""
+        assert url_domain("https://Docs.Example.com/guide?x=1") == "docs.example.com"
+    
+    def test_acquire_and_wait(self):
+        """Test a free slot is reserved and a busy domain returns the wait in seconds"""
+        client = Mock()
+        limiter = DomainLimiter(client=client)
+        
+        client.eval.return_value = -1
+        assert limiter.try_acquire("docs.example.com", "task_1") is None
+        
+        client.eval.return_value = 1500
+        assert limiter.try_acquire("docs.example.com", "task_2") == 1.5
+    
+    def test_concurrency_override(self):
+        """Test per-domain overrides replace the default limit"""
+        limiter = DomainLimiter(client=Mock())
+        with patch('app.services.domain_limiter.settings') as mock_settings:
+            mock_settings.domain_max_concurrency = 2
+            mock_settings.domain_concurrency_overrides = {"docs.python.org": 4}
+            
+            assert limiter.limit_for("docs.python.org") == 4
+            assert limiter.limit_for("docs.example.com") == 2
+    
+    def test_release_removes_own_slot(self):
+        """Test releasing only frees the caller's slot"""
+        client = Mock()
+        DomainLimiter(client=client).release("docs.example.com", "task_1")
+        
+        client.zrem.assert_called_once_with(domain_active_key("docs.example.com"), "task_1")
+    
+    def test_retry_after_seconds(self):
+        """Test Retry-After in seconds and as an HTTP date"""
+        assert retry_after_seconds("120") == 120.0
+        assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert retry_after_seconds("pronto") is None
+        assert retry_after_seconds(None) is None
+    
+    def test_record_response_adjusts_limit(self):
+        """Test fast responses raise the limit and throttling lowers it with its Retry-After"""
+        client = Mock()
+        limiter = DomainLimiter(client=client)
+        
+        client.eval.return_value = b"2.5"
+        assert limiter.record_response("docs.example.com", 200, latency=0.3) == 2.5
+        assert client.eval.call_args.args[5] == "up"
+        
+        client.eval.return_value = b"1.25"
+        assert limiter.record_response("docs.example.com", 429, retry_after=30) == 1.25
+        assert client.eval.call_args.args[5] == "down"
+        assert client.eval.call_args.args[12] == 30000
+        
+        limiter.record_response("docs.example.com", 200, latency=60)
+        assert client.eval.call_args.args[5] == "down"
+        limiter.record_response("docs.example.com")
+        assert client.eval.call_args.args[5] == "down"
+    
+    def test_record_response_never_fails(self):
+        """Test the controller can be disabled and Redis errors are not raised"""
+        client = Mock()
+        client.eval.side_effect = ConnectionError("redis down")
+        limiter = DomainLimiter(client=client)
+        
+        assert limiter.record_response("docs.example.com", 200, latency=0.1) is None
+        with patch('app.services.domain_limiter.settings') as mock_settings:
+            mock_settings.domain_adaptive_concurrency = False
+            client.eval.reset_mock()
+            assert limiter.record_response("docs.example.com", 503) is None
+            client.eval.assert_not_called()
+    
+    def test_adaptive_ceiling(self):
+        """Test overrides pin the ceiling of their domain"""
+        limiter = DomainLimiter(client=Mock())
+        with patch('app.services.domain_limiter.settings') as mock_settings:
+            mock_settings.domain_max_concurrency = 2
+            mock_settings.domain_adaptive_max_concurrency = 8
+            mock_settings.domain_concurrency_overrides = {"docs.python.org": 4}
+            
+            assert limiter.ceiling_for("docs.python.org") == 4
+            assert limiter.ceiling_for("docs.example.com") == 8
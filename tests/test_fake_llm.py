@@ -0,0 +1,49 @@
+import pytest
+from app.services.fake_llm import FakeLLM
+
+
+class TestFakeLLM:
+    
+    @pytest.fixture
+    def llm(self):
+        return FakeLLM(
+            response_tokens=12,
+            latency_ms=0,
+            latency_distribution="constant",
+            tokens_per_second=0
+        )
+    
+    def test_response_is_deterministic(self, llm):
+        """Test same prompt produces same text"""
+        first = llm.invoke("¿Cómo configuro el servidor?")
+        second = llm.invoke("¿Cómo configuro el servidor?")
+        assert first == second
+        assert len(first.split()) == 12
+    
+    def test_response_depends_on_prompt(self, llm):
+        """Test different prompts produce different text"""
+        assert llm.invoke("pregunta uno") != llm.invoke("pregunta dos")
+    
+    def test_classification_prompt_returns_label(self, llm):
+        """Test intent prompts get one of the expected labels"""
+        prompt = "Clasifica como general_query, code_query o follow_up_question"
+        assert llm.invoke(prompt) in llm.intent_labels
+    
+    def test_stream_matches_invoke(self, llm):
+        """Test streamed chunks join into the same text"""
+        prompt = "explica la configuración"
+        streamed = "".join(llm.stream(prompt))
+        assert streamed == llm.invoke(prompt)
+    
+    def test_latency_distribution_is_reproducible(self):
+        """Test latency samples follow the configured seed"""
+        first = FakeLLM(latency_ms=100, latency_stddev_ms=20, seed=7)
+        second = FakeLLM(latency_ms=100, latency_stddev_ms=20, seed=7)
+        samples = [first.sample_latency() for _ in range(5)]
+        assert samples == [second.sample_latency() for _ in range(5)]
+        assert all(sample > 0 for sample in samples)
+    
+    def test_invalid_distribution(self):
+        """Test unknown latency distributions are rejected"""
+        with pytest.raises(ValueError):
+            FakeLLM(latency_distribution="pareto")
@@ -0,0 +1,94 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock
+from app.services.ingestion_registry import (
+    _CLAIM_CHAT_SCRIPT,
+    _RELEASE_CHAT_SCRIPT,
+    IdempotencyKeyMismatchError,
+    IngestionRegistry,
+    chat_lock_key,
+    request_fingerprint,
+)
+
+
+@pytest.fixture
+def registry():
+    registry = IngestionRegistry()
+    registry._async_client = AsyncMock()
+    registry._sync_client = Mock()
+    return registry
+
+
+class TestIngestionRegistry:
+
+    @pytest.mark.asyncio
+    async def test_claim_chat_returns_running_ingestion(self, registry):
+        """Test a second submission for the same chat attaches to the running task"""
+        registry.async_client.eval.return_value = json.dumps({"task_id": "t1", "url": "https://x"})
+        
+        running = await registry.claim_chat("chat_1", "https://x", "t2")
+        
+        assert running == {"task_id": "t1", "url": "https://x"}
+        script, keys, key, value, _ = registry.async_client.eval.call_args[0]
+        assert (script, keys, key) == (_CLAIM_CHAT_SCRIPT, 1, chat_lock_key("chat_1"))
+        assert json.loads(value) == {"task_id": "t2", "url": "https://x"}
+    
+    @pytest.mark.asyncio
+    async def test_claim_chat_free(self, registry):
+        """Test a free chat is claimed"""
+        registry.async_client.eval.return_value = None
+        
+        assert await registry.claim_chat("chat_1", "https://x", "t1") is None
+        registry.async_client.get.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_release_chat_checks_owner(self, registry):
+        """Test releasing a chat only deletes the lock held by the same owner"""
+        registry.async_client.eval.return_value = 0
+        
+        assert await registry.release_chat_async("chat_1", "delete:1") is False
+        registry.async_client.eval.assert_called_once_with(_RELEASE_CHAT_SCRIPT, 1, chat_lock_key("chat_1"), "delete:1")
+        registry.async_client.delete.assert_not_called()
+    
+    def test_release_chat_from_worker(self, registry):
+        """Test workers release their own claims by owner and finished ingestions unconditionally"""
+        registry.sync_client.eval.return_value = 1
+        
+        assert registry.release_chat("chat_1", "evict:1") is True
+        registry.sync_client.eval.assert_called_once_with(_RELEASE_CHAT_SCRIPT, 1, chat_lock_key("chat_1"), "evict:1")
+        
+        registry.release_chat("chat_2")
+        registry.sync_client.delete.assert_called_once_with(chat_lock_key("chat_2"))
+    
+    @pytest.mark.asyncio
+    async def test_idempotency_key_is_bound_to_the_request(self, registry):
+        """Test a reused Idempotency-Key returns the stored response only for the same request"""
+        request = {"url": "https://x", "chatId": "chat_1", "priority": "interactive"}
+        await registry.store_idempotent_response("key", request_fingerprint(request), {"taskId": "t1"})
+        registry.async_client.get.return_value = registry.async_client.set.call_args[0][1]
+        
+        reordered = {"priority": "interactive", "chatId": "chat_1", "url": "https://x"}
+        assert await registry.get_idempotent_response("key", request_fingerprint(reordered)) == {"taskId": "t1"}
+        with pytest.raises(IdempotencyKeyMismatchError):
+            await registry.get_idempotent_response("key", request_fingerprint({**request, "chatId": "chat_2"}))
+    
+    @pytest.mark.asyncio
+    async def test_join_url_as_follower(self, registry):
+        """Test a chat requesting a URL already being ingested becomes a follower"""
+        registry.async_client.eval.return_value = "t1"
+        
+        assert await registry.join_url("https://x", "chat_2", "t2") == (False, "t1")
+    
+    @pytest.mark.asyncio
+    async def test_join_url_as_leader(self, registry):
+        """Test the first chat requesting a URL leads its ingestion"""
+        registry.async_client.eval.return_value = None
+        
+        assert await registry.join_url("https://x", "chat_1", "t1") == (True, "t1")
+    
+    def test_complete_url_returns_followers(self, registry):
+        """Test completing a URL hands back its followers"""
+        pipe = registry.sync_client.pipeline.return_value
+        pipe.execute.return_value = [{"chat_3", "chat_2"}, 1, 1]
+        
+        assert registry.complete_url("https://x") == ["chat_2", "chat_3"]
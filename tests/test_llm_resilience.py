@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.services.llm_resilience import CircuitBreaker, LLMUnavailableError
+from app.services.llm_service import LLMService
+
+
+class StubLLM:
+    """Cliente mínimo con latencia y fallo configurables"""
+    
+    def __init__(self, text: str, delay: float = 0.0, fail: bool = False):
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+    
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return self.text
+
+
+class TestCircuitBreaker:
+    
+    def test_opens_after_threshold(self):
+        """Test breaker opens after consecutive failures"""
+        breaker = CircuitBreaker("ollama", failure_threshold=2, cooldown=60)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+    
+    def test_half_open_allows_single_probe(self):
+        """Test breaker lets one probe through after cooldown"""
+        breaker = CircuitBreaker("ollama", failure_threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestResilientGeneration:
+    
+    @pytest.fixture
+    def llm_service(self):
+        with patch('app.services.llm_service.settings') as mock_settings:
+            mock_settings.llm_provider = "fake"
+            mock_settings.llm_routes = {}
+            mock_settings.llm_fallback = "fake:backup"
+            mock_settings.llm_timeout_seconds = 0.5
+            mock_settings.llm_route_timeouts = {}
+            mock_settings.llm_hedge_enabled = True
+            mock_settings.llm_hedge_min_samples = 20
+            mock_settings.llm_hedge_initial_delay_seconds = 0.05
+            mock_settings.llm_hedge_min_delay_seconds = 0.01
+            mock_settings.llm_circuit_failure_threshold = 2
+            mock_settings.llm_circuit_cooldown_seconds = 60
+            mock_settings.fake_llm_response_tokens = 4
+            mock_settings.fake_llm_latency_ms = 0
+            mock_settings.fake_llm_latency_stddev_ms = 0
+            mock_settings.fake_llm_latency_distribution = "constant"
+            mock_settings.fake_llm_tokens_per_second = 0
+            mock_settings.fake_llm_seed = 0
+            service = LLMService()
+            yield service
+    
+    def _stub(self, service, primary, fallback):
+        # Proveedor de respaldo distinto para que tenga su propio circuito
+        service.fallback = ("backup", None)
+        service._clients[("fake", None)] = primary
+        service._clients[service.fallback] = fallback
+        service._latencies[service.fallback] = service._latencies[("fake", "backup")]
+        service.breakers["backup"] = CircuitBreaker("backup")
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged(self, llm_service):
+        """Test a slow primary is hedged to the fallback"""
+        primary = StubLLM("lento", delay=0.3)
+        fallback = StubLLM("rápido")
+        self._stub(llm_service, primary, fallback)
+        
+        assert await llm_service.generate_response("hola") == "rápido"
+        stats = llm_service.get_route_stats()["default"]
+        assert stats["hedged"] == 1
+        assert stats["fallbacks"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_primary_uses_fallback(self, llm_service):
+        """Test a failing primary falls back without waiting for the hedge"""
+        self._stub(llm_service, StubLLM("", fail=True), StubLLM("respaldo"))
+        assert await llm_service.generate_response("hola") == "respaldo"
+    
+    @pytest.mark.asyncio
+    async def test_deadline_raises_unavailable(self, llm_service):
+        """Test the call is bounded by its deadline"""
+        self._stub(llm_service, StubLLM("", delay=2), StubLLM("", delay=2))
+        with pytest.raises(LLMUnavailableError):
+            await llm_service.generate_response("hola")
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_provider(self, llm_service):
+        """Test providers with an open circuit are not called"""
+        primary = StubLLM("", fail=True)
+        self._stub(llm_service, primary, StubLLM("respaldo"))
+        for _ in range(2):
+            await llm_service.generate_response("hola")
+        assert llm_service.breakers["fake"].state == CircuitBreaker.OPEN
+        
+        calls = primary.calls
+        assert await llm_service.generate_response("hola") == "respaldo"
+        assert primary.calls == calls
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import patch
+from app.services.llm_service import LLMService, parse_route_spec
+
+
+class TestLLMService:
+    
+    @pytest.fixture
+    def llm_service(self):
+        with patch('app.services.llm_service.settings') as mock_settings:
+            mock_settings.llm_provider = "fake"
+            mock_settings.llm_routes = {"analyze_intent": "fake:tiny", "code_query": "fake"}
+            mock_settings.llm_fallback = None
+            mock_settings.llm_timeout_seconds = 5
+            mock_settings.llm_route_timeouts = {}
+            mock_settings.llm_circuit_failure_threshold = 5
+            mock_settings.llm_circuit_cooldown_seconds = 30
+            mock_settings.fake_llm_response_tokens = 8
+            mock_settings.fake_llm_latency_ms = 0
+            mock_settings.fake_llm_latency_stddev_ms = 0
+            mock_settings.fake_llm_latency_distribution = "constant"
+            mock_settings.fake_llm_tokens_per_second = 0
+            mock_settings.fake_llm_seed = 0
+            yield LLMService()
+    
+    def test_parse_route_spec(self):
+        """Test provider/model spec parsing"""
+        assert parse_route_spec("openai:gpt-4o") == ("openai", "gpt-4o")
+        assert parse_route_spec("Ollama") == ("ollama", None)
+    
+    def test_unconfigured_route_uses_default(self, llm_service):
+        """Test routes without mapping fall back to the default model"""
+        assert llm_service.resolve_route("general_query") == "default"
+        assert llm_service.resolve_route("code_query") == "code_query"
+    
+    def test_clients_are_shared_per_model(self, llm_service):
+        """Test routes with the same provider/model reuse one client"""
+        assert llm_service._get_client("fake", None) is llm_service.llm
+        assert len(llm_service._clients) == 2
+    
+    @pytest.mark.asyncio
+    async def test_stats_recorded_per_route(self, llm_service):
+        """Test latency and token usage are recorded per route"""
+        await llm_service.generate_response("hola mundo", route="code_query")
+        await llm_service.analyze_intent("¿Qué es?", [])
+        
+        stats = llm_service.get_route_stats()
+        assert stats["code_query"]["calls"] == 1
+        assert stats["code_query"]["prompt_tokens"] == 2
+        assert stats["code_query"]["completion_tokens"] == 8
+        assert stats["analyze_intent"]["calls"] == 1
+        assert stats["default"]["calls"] == 0
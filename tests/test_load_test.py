@@ -0,0 +1,97 @@
+import httpx
+import pytest
+from benchmarks.load_test import FixtureSite, LoadGenerator, StepResult, chat_answered, find_saturation, percentile
+
+
+def api_client(statuses):
+    """API falsa: ingesta aceptada, estados de ``statuses`` por consulta y respuestas del chat"""
+    requests = []
+    
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.url.path == "/api/v1/process-documentation":
+            return httpx.Response(200, json={"status": "PENDING"})
+        if request.url.path.startswith("/api/v1/processing-status/"):
+            return httpx.Response(200, json={"status": statuses.pop(0) if len(statuses) > 1 else statuses[0]})
+        return httpx.Response(200, json={"response": "Respuesta del agente"})
+    
+    client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler))
+    return client, requests
+
+
+class TestLoadTestReport:
+    
+    def test_percentiles_nearest_rank(self):
+        """Test percentiles use the nearest-rank method"""
+        ordered = [i / 100 for i in range(1, 101)]
+        
+        assert percentile(ordered, 0.50) == 0.50
+        assert percentile(ordered, 0.99) == 0.99
+        assert percentile([], 0.5) is None
+    
+    def test_step_summary(self):
+        """Test throughput and error rate per step"""
+        step = StepResult(concurrency=2, duration=2.0)
+        for _ in range(9):
+            step.record(0.1, "200", True)
+        step.record(0.5, "503", False)
+        
+        summary = step.summary()
+        
+        assert summary["throughput_rps"] == 5.0
+        assert summary["error_rate"] == 0.1
+        assert summary["p99_ms"] == 500.0
+        assert summary["status_codes"] == {"200": 9, "503": 1}
+    
+    def test_saturation_point(self):
+        """Test saturation is where extra users stop adding throughput or errors start"""
+        steps = [
+            {"concurrency": 1, "throughput_rps": 10.0, "error_rate": 0.0},
+            {"concurrency": 2, "throughput_rps": 19.0, "error_rate": 0.0},
+            {"concurrency": 4, "throughput_rps": 20.0, "error_rate": 0.0},
+        ]
+        
+        assert find_saturation(steps) == 2
+        assert find_saturation(steps[:2]) is None
+        assert find_saturation([{"concurrency": 8, "throughput_rps": 5.0, "error_rate": 0.2}]) == 8
+    
+    def test_chat_without_documentation_is_an_error(self):
+        """Test the early "no documentation" answer does not count as a served chat"""
+        request = httpx.Request("POST", "http://api/api/v1/chat/c")
+        
+        assert chat_answered(httpx.Response(200, json={"response": "Respuesta del agente"}, request=request))
+        assert not chat_answered(httpx.Response(200, json={
+            "response": "No se encontró documentación procesada para este chat. Por favor, procesa una documentación primero."
+        }, request=request))
+        assert not chat_answered(httpx.Response(503, json={"detail": "LLM down"}, request=request))
+    
+    @pytest.mark.asyncio
+    async def test_chats_are_ingested_before_the_load(self, monkeypatch):
+        """Test each user's chat is processed and polled until COMPLETED"""
+        monkeypatch.setattr("benchmarks.load_test.PREPARE_POLL_SECONDS", 0)
+        client, requests = api_client(["PENDING", "IN_PROGRESS", "COMPLETED"])
+        async with client:
+            generator = LoadGenerator(client, "chat", ["http://site/docs_a.html"], "run")
+            await generator.prepare_chats(2, timeout=5)
+        
+        assert requests.count(("POST", "/api/v1/process-documentation")) == 2
+        assert requests[-1] == ("GET", "/api/v1/processing-status/load_run_chat_1")
+    
+    @pytest.mark.asyncio
+    async def test_failed_preparation_stops_the_test(self):
+        """Test a chat whose ingestion fails aborts the load test"""
+        client, _ = api_client(["FAILED"])
+        async with client:
+            generator = LoadGenerator(client, "chat", ["http://site/docs_a.html"], "run")
+            with pytest.raises(RuntimeError, match="load_run_chat_0"):
+                await generator.prepare_chats(1, timeout=5)
+    
+    def test_fixture_site_serves_corpora(self):
+        """Test the local docs site serves the bundled HTML"""
+        with FixtureSite() as site:
+            urls = site.urls()
+            response = httpx.get(urls[0])
+        
+        assert len(urls) == 3
+        assert response.status_code == 200
+        assert "<main>" in response.text
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.models import Base, ChatHistory, ProcessingJobs
+from app.services.chat_service import ChatService
+from app.services.message_writer import MessageWriteBehind
+
+
+class TestMessageWriteBehind:
+    
+    @pytest_asyncio.fixture
+    async def session_factory(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        TestingSession = async_sessionmaker(engine, expire_on_commit=False)
+        async with TestingSession() as session:
+            session.add(ProcessingJobs(chat_id="chat_1", source_url="http://test.com", status="COMPLETED"))
+            await session.commit()
+        with patch('app.services.message_writer.AsyncSessionLocal', TestingSession):
+            yield TestingSession
+        await engine.dispose()
+    
+    @pytest.mark.asyncio
+    async def test_flushes_pending_exchanges_on_stop(self, session_factory):
+        """Test queued exchanges are persisted when the writer stops"""
+        writer = MessageWriteBehind(max_queue=10, batch_size=50, flush_interval=10)
+        await writer.start()
+        
+        await writer.enqueue("chat_1", "pregunta 1", "respuesta 1")
+        await writer.enqueue("chat_1", "pregunta 2", "respuesta 2")
+        assert writer.pending_exchanges("chat_1")[0] == ("pregunta 1", "respuesta 1")
+        
+        await writer.stop()
+        
+        async with session_factory() as session:
+            result = await session.execute(select(ChatHistory).order_by(ChatHistory.message_id))
+            messages = result.scalars().all()
+        assert [(m.sender, m.message_text) for m in messages] == [
+            ("user", "pregunta 1"),
+            ("agent", "respuesta 1"),
+            ("user", "pregunta 2"),
+            ("agent", "respuesta 2")
+        ]
+        assert writer.pending_exchanges("chat_1") == []
+    
+    @pytest.mark.asyncio
+    async def test_bad_exchange_does_not_drop_the_batch(self, session_factory):
+        """Test a failing exchange is dropped alone, not with the rest of its batch"""
+        save_exchanges = ChatService.save_exchanges
+        
+        async def failing_on_bad_chat(service, exchanges):
+            if any(chat_id == "bad" for chat_id, _, _ in exchanges):
+                return False
+            return await save_exchanges(service, exchanges)
+        
+        writer = MessageWriteBehind()
+        with patch.object(ChatService, "save_exchanges", failing_on_bad_chat):
+            await writer._flush([("chat_1", "p1", "r1"), ("bad", "p2", "r2"), ("chat_2", "p3", "r3")])
+        
+        async with session_factory() as session:
+            result = await session.execute(select(ChatHistory.chat_id, ChatHistory.message_text).where(ChatHistory.sender == "user"))
+            assert sorted(result.all()) == [("chat_1", "p1"), ("chat_2", "p3")]
+    
+    @pytest.mark.asyncio
+    async def test_unexpected_error_does_not_stop_the_writer(self, session_factory):
+        """Test the writer keeps running after an error and /ready reports it if the task dies"""
+        writer = MessageWriteBehind(max_queue=10, batch_size=1, flush_interval=0)
+        await writer.start()
+        
+        with patch.object(writer, "_flush", side_effect=[RuntimeError("boom"), None]) as failing:
+            await writer.enqueue("chat_1", "pregunta 1", "respuesta 1")
+            await writer.enqueue("chat_1", "pregunta 2", "respuesta 2")
+            while failing.call_count < 2:
+                await asyncio.sleep(0.01)
+        
+        assert writer.ready
+        assert writer.status()["errors"] == 1
+        assert writer.pending_exchanges("chat_1") == []
+        
+        writer._task.cancel()
+        await asyncio.sleep(0)
+        assert not writer.ready
+        assert writer.status()["state"] == "failed"
+    
+    @pytest.mark.asyncio
+    async def test_writes_directly_when_not_started(self, session_factory):
+        """Test exchanges are written immediately without a running writer"""
+        writer = MessageWriteBehind()
+        await writer.enqueue("chat_1", "pregunta", "respuesta")
+        
+        async with session_factory() as session:
+            assert await session.scalar(select(func.count()).select_from(ChatHistory)) == 2
@@ -0,0 +1,38 @@
+import pytest
+from prometheus_client import REGISTRY
+from app.services.metrics import AGENT_NODE_SECONDS, observe, render_metrics, timed_node
+
+
+def _count(node: str) -> float:
+    return REGISTRY.get_sample_value("agent_node_duration_seconds_count", {"node": node}) or 0.0
+
+
+class TestMetrics:
+    
+    @pytest.mark.asyncio
+    async def test_timed_node_observes_duration(self):
+        """Test graph nodes are timed under their name"""
+        async def node(state):
+            return {**state, "done": True}
+        
+        before = _count("test_node")
+        result = await timed_node("test_node", node)({"question": "q"})
+        
+        assert result["done"] is True
+        assert _count("test_node") == before + 1
+    
+    def test_observe_records_failures(self):
+        """Test failing blocks are still observed"""
+        before = _count("failing_node")
+        with pytest.raises(RuntimeError):
+            with observe(AGENT_NODE_SECONDS, node="failing_node"):
+                raise RuntimeError("boom")
+        
+        assert _count("failing_node") == before + 1
+    
+    def test_render_metrics_exposition(self):
+        """Test the exposition includes the ingestion and LLM histograms"""
+        output = render_metrics().decode()
+        
+        assert "ingestion_stage_duration_seconds" in output
+        assert "llm_request_duration_seconds" in output
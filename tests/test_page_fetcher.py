@@ -0,0 +1,69 @@
+import httpx
+import pytest
+from app.services.page_fetcher import UnsupportedContentError, detect_charset, fetch_page
+
+
+def client_for(body: bytes, content_type: str = "text/html; charset=utf-8") -> httpx.AsyncClient:
+    headers = {"content-type": content_type} if content_type else {}
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, headers=headers, content=body)))
+
+
+class TestPageFetcher:
+    
+    @pytest.mark.asyncio
+    async def test_sections_from_stream(self):
+        """Test the page is parsed into sections while it is read"""
+        body = "<html><body><nav>Menú</nav><h1>Guía</h1><p>Configuración del cliente</p></body></html>".encode("utf-8")
+        async with client_for(body) as client:
+            page = await fetch_page("https://docs.example.com", client)
+        
+        assert page.sections == [{"heading_path": "Guía", "paragraphs": ["Guía", "Configuración del cliente"]}]
+        assert page.bytes_read == len(body)
+        assert page.truncated is False
+    
+    @pytest.mark.asyncio
+    async def test_truncates_at_byte_cap(self):
+        """Test downloads stop at max_bytes and keep what was read"""
+        body = b"<h1>Inicio</h1>" + b"<p>parrafo</p>" * 10000
+        async with client_for(body) as client:
+            page = await fetch_page("https://docs.example.com", client, max_bytes=5000)
+        
+        assert page.truncated is True
+        assert page.bytes_read == 5000
+        assert 300 < len(page.sections[0]["paragraphs"]) < 400
+    
+    @pytest.mark.asyncio
+    async def test_charset_from_meta(self):
+        """Test pages without charset header are decoded with their <meta charset>"""
+        body = '<meta charset="iso-8859-1"><p>Configuración</p>'.encode("latin-1")
+        async with client_for(body, content_type="text/html") as client:
+            page = await fetch_page("https://docs.example.com", client)
+        
+        assert page.encoding == "iso8859-1"
+        assert page.sections[0]["paragraphs"] == ["Configuración"]
+    
+    @pytest.mark.asyncio
+    async def test_rejects_unsupported_content(self):
+        """Test PDFs and binaries are rejected before reading them"""
+        async with client_for(b"%PDF-1.7", content_type="application/pdf") as client:
+            with pytest.raises(UnsupportedContentError, match="application/pdf"):
+                await fetch_page("https://docs.example.com/manual.pdf", client)
+    
+    @pytest.mark.asyncio
+    async def test_plain_text(self):
+        """Test text/plain is split into paragraphs by blank lines"""
+        body = b"Primer parrafo\nsigue\n\nSegundo parrafo\n"
+        async with client_for(body, content_type="text/plain") as client:
+            page = await fetch_page("https://docs.example.com/README.txt", client)
+        
+        assert page.sections == [{"heading_path": "", "paragraphs": ["Primer parrafo\nsigue", "Segundo parrafo"]}]
+    
+    def test_detect_charset_priority(self):
+        """Test BOM beats the header, which beats <meta charset>"""
+        head = b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">'
+        
+        assert detect_charset(b"\xef\xbb\xbf" + head, "latin-1") == "utf-8-sig"
+        assert detect_charset(head, "latin-1") == "iso8859-1"
+        assert detect_charset(head) == "cp1252"
+        assert detect_charset(head, "no-such-charset") == "cp1252"
+        assert detect_charset(b"<p>hola</p>") == "utf-8"
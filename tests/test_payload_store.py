@@ -0,0 +1,44 @@
+import json
+import zlib
+import pytest
+from unittest.mock import Mock
+from app.services.payload_store import PayloadStore, payload_key
+
+
+class TestPayloadStore:
+    
+    def test_chunks_round_trip_by_reference(self):
+        """Test chunks are stored compressed and read back from their reference"""
+        stored = {}
+        client = Mock()
+        client.set.side_effect = lambda key, value, ex: stored.__setitem__(key, value)
+        client.get.side_effect = stored.get
+        store = PayloadStore(client=client)
+        chunks = ["primer chunk", "segundo chunk con acentos: configuración"]
+        
+        ref = store.put_chunks(chunks)
+        
+        assert payload_key(ref) in stored
+        assert store.get_chunks(ref) == chunks
+    
+    def test_chunk_metadata_round_trip(self):
+        """Test chunk metadata travels with the chunks; old payloads have none"""
+        stored = {}
+        client = Mock()
+        client.set.side_effect = lambda key, value, ex: stored.__setitem__(key, value)
+        client.get.side_effect = stored.get
+        store = PayloadStore(client=client)
+        
+        ref = store.put_chunks(["chunk"], [{"heading_path": "Guía", "has_code": False}])
+        stored[payload_key("legacy")] = zlib.compress(json.dumps(["old chunk"]).encode("utf-8"))
+        
+        assert store.get_payload(ref) == (["chunk"], [{"heading_path": "Guía", "has_code": False}])
+        assert store.get_payload("legacy") == (["old chunk"], [])
+    
+    def test_missing_payload(self):
+        """Test an expired reference raises"""
+        client = Mock()
+        client.get.return_value = None
+        
+        with pytest.raises(KeyError):
+            PayloadStore(client=client).get_chunks("missing")
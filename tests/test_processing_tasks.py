@@ -0,0 +1,101 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.domain_limiter import DomainThrottledError
+from app.tasks.processing_tasks import (
+    chunk_metadata,
+    chunk_sections,
+    extract_sections,
+    intelligent_chunking,
+    scrape_website,
+)
+
+
+HTML = """
+<html><body>
+<nav>Menú</nav>
+<main>
+<h1>Guía</h1>
+<p>Introducción al <code>cliente</code>.</p>
+<h2>Instalación</h2>
+<ul><li>Requisitos</li><li>Pasos</li></ul>
+<div class="highlight-python"><pre>import os
+
+print(os.getcwd())</pre></div>
+<h3>Detalles</h3>
+<pre><code class="language-js">const a = 1;</code></pre>
+<h2>API</h2>
+<p>Referencia<!-- comentario --></p>
+</main>
+</body></html>
+"""
+
+
+class TestProcessingTasks:
+    
+    def test_extract_sections_heading_path(self):
+        """Test sections keep their heading path and drop navigation"""
+        sections = extract_sections(HTML)
+        
+        assert [section["heading_path"] for section in sections] == [
+            "Guía", "Guía > Instalación", "Guía > Instalación > Detalles", "Guía > API"
+        ]
+        assert sections[0]["paragraphs"] == ["Guía", "Introducción al cliente ."]
+        assert sections[3]["paragraphs"] == ["API", "Referencia"]
+        assert "Menú" not in str(sections)
+    
+    def test_extract_sections_code_blocks(self):
+        """Test <pre> blocks become single markdown paragraphs with their language"""
+        sections = extract_sections(HTML)
+        
+        assert sections[1]["paragraphs"][-1] == "```python\nimport os\nprint(os.getcwd())\n```"
+        assert sections[2]["paragraphs"][-1] == "```javascript\nconst a = 1;\n```"
+    
+    def test_chunk_sections_metadata(self):
+        """Test every chunk carries its section and code metadata"""
+        chunks, metadatas = chunk_sections(extract_sections(HTML))
+        
+        assert len(chunks) == len(metadatas) == 4
+        assert metadatas[1] == {
+            "heading_path": "Guía > Instalación",
+            "is_code_like": True,
+            "has_code": True,
+            "code_languages": "python",
+            "lang_python": True,
+        }
+        assert metadatas[3]["has_code"] is False
+        assert "lang_python" not in metadatas[3]
+    
+    def test_chunk_metadata_without_language(self):
+        """Test code blocks without a declared language"""
+        metadata = chunk_metadata("```\nmake install\n```")
+        
+        assert metadata["has_code"] is True
+        assert metadata["code_languages"] == ""
+    
+    def test_chunking_overlap_does_not_split_code_fences(self):
+        """Test the overlap carried into the next chunk never starts with a stray fence"""
+        code = "```python\n" + "\n".join(f"x_{i} = {i}" for i in range(60)) + "\n```"
+        text = "\n\n".join([code, "Texto posterior " * 20])
+        
+        chunks = intelligent_chunking(text, max_chunk_size=500)
+        
+        assert len(chunks) == 2
+        assert "```" not in chunks[1]
+    
+    @pytest.mark.asyncio
+    async def test_scrape_throttled_does_not_fall_back(self):
+        """Test a 429 lowers the domain limit and is not retried with Playwright"""
+        request = httpx.Request("GET", "https://docs.example.com")
+        response = httpx.Response(429, headers={"retry-after": "20"}, request=request)
+        error = httpx.HTTPStatusError("429", request=request, response=response)
+        
+        with patch("app.tasks.processing_tasks.fetch_page", AsyncMock(side_effect=error)), \
+                patch("app.tasks.processing_tasks.scrape_with_playwright", AsyncMock()) as playwright, \
+                patch("app.tasks.processing_tasks.domain_limiter") as limiter:
+            with pytest.raises(DomainThrottledError) as raised:
+                await scrape_website("https://docs.example.com")
+        
+        assert raised.value.retry_after == 20.0
+        limiter.record_response.assert_called_once_with("docs.example.com", 429, retry_after=20.0)
+        playwright.assert_not_called()
@@ -0,0 +1,110 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.config import settings
+from app.services.progress import ProgressReporter, progress_channel, progress_key, stream_progress
+from app.tasks.processing_tasks import embed_chunks
+
+
+class FakeModel:
+    """Modelo de embeddings que tarda 10 s (de reloj simulado) por lote"""
+    
+    def __init__(self, clock):
+        self.clock = clock
+    
+    def encode(self, batch, normalize_embeddings=True):
+        self.clock[0] += 10.0
+        return Mock(tolist=lambda: [[0.0] for _ in batch])
+
+
+def redis_with(last=None, published=()):
+    """Cliente Redis async con ``last`` como último estado y ``published`` como mensajes del canal"""
+    client = Mock()
+    client.get = AsyncMock(return_value=json.dumps(last) if last else None)
+    client.aclose = AsyncMock()
+    pubsub = client.pubsub.return_value
+    pubsub.subscribe = pubsub.unsubscribe = pubsub.aclose = AsyncMock()
+    pubsub.get_message = AsyncMock(side_effect=[{"data": json.dumps(event)} for event in published])
+    return client
+
+
+async def collect(chat_id, job_status, client):
+    with patch('app.services.progress.aioredis.Redis.from_url', return_value=client):
+        return [event async for event in stream_progress(chat_id, job_status)]
+
+
+class TestProgressReporter:
+    
+    def test_update_publishes_and_stores_snapshot(self):
+        """Test updates are published and kept as last state"""
+        client = Mock()
+        pipe = client.pipeline.return_value
+        reporter = ProgressReporter("chat_1", client=client)
+        
+        reporter.update(status="IN_PROGRESS", stage="scraping")
+        
+        key, payload = pipe.set.call_args[0]
+        assert key == progress_key("chat_1")
+        assert json.loads(payload)["stage"] == "scraping"
+        pipe.publish.assert_called_once_with(progress_channel("chat_1"), payload)
+    
+    def test_eta_from_embedding_throughput(self):
+        """Test the first ETA after embed_chunks' first batch already reflects its duration"""
+        clock = [100.0]
+        reporter = ProgressReporter("chat_1", client=Mock())
+        reporter.update(chunks_total=100)
+        etas = []
+        record = reporter.update
+        
+        def update(**fields):
+            record(**fields)
+            etas.append((reporter.state["chunks_embedded"], reporter.state["eta_seconds"]))
+        
+        with patch('app.services.progress.time.time', side_effect=lambda: clock[0]), \
+                patch('app.tasks.processing_tasks.get_embedding_model', return_value=FakeModel(clock)), \
+                patch.object(settings, "embedding_batch_size", 25), \
+                patch.object(reporter, "update", side_effect=update):
+            embeddings = embed_chunks(["chunk"] * 100, progress=reporter)
+        
+        assert len(embeddings) == 100
+        assert etas == [(0, None), (25, 30.0), (50, 20.0), (75, 10.0), (100, 0.0)]
+    
+    @pytest.mark.asyncio
+    async def test_finished_job_with_expired_progress(self):
+        """Test a completed job whose progress key expired ends the stream at once"""
+        client = redis_with(last=None)
+        
+        events = await collect("chat_1", "COMPLETED", client)
+        
+        assert [(event["status"], event["stage"]) for event in events] == [("COMPLETED", "done")]
+        client.pubsub.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_imported_chat(self):
+        """Test a chat restored from a snapshot ends with its database status, not a stale ingestion"""
+        client = redis_with(last={"chat_id": "chat_1", "status": "IN_PROGRESS", "stage": "embedding"})
+        
+        events = await collect("chat_1", "COMPLETED", client)
+        
+        assert [event["status"] for event in events] == ["COMPLETED"]
+        client.pubsub.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_evicted_job(self):
+        """Test evicted jobs end the stream, whether read from the database or published"""
+        client = redis_with(last={"chat_id": "chat_1", "status": "COMPLETED", "stage": "done"})
+        assert [event["status"] for event in await collect("chat_1", "EVICTED", client)] == ["EVICTED"]
+        
+        client = redis_with(last=None, published=[{"status": "IN_PROGRESS"}, {"status": "EVICTED"}])
+        events = await collect("chat_1", "PENDING", client)
+        assert [event["status"] for event in events] == ["IN_PROGRESS", "EVICTED"]
+    
+    def test_redis_errors_do_not_break_ingestion(self):
+        """Test publishing failures are swallowed"""
+        client = Mock()
+        client.pipeline.side_effect = ConnectionError("redis down")
+        reporter = ProgressReporter("chat_1", client=client)
+        
+        reporter.update(stage="embedding")
+        
+        assert reporter.state["stage"] == "embedding"
@@ -1,6 +1,7 @@
+import time
 import pytest
 from unittest.mock import Mock, patch
-from app.services.rag_service import RAGService
+from app.services.rag_service import RAGService, code_filters, merge_results
 
 
 class TestRAGService:
@@ -8,7 +9,7 @@ class TestRAGService:
     @pytest.fixture
     def rag_service(self):
         with patch('app.services.rag_service.SentenceTransformer'):
-            with patch('app.services.rag_service.chromadb'):
+            with patch('app.services.rag_service.get_vector_store'):
                 return RAGService()
     
     def test_retrieve_documents_empty_collection(self, rag_service):
@@ -36,6 +37,7 @@ class TestRAGService:
             'metadatas': [[{'source_url': 'http://test.com'}, {'source_url': 'http://test2.com'}]],
             'distances': [[0.1, 0.3]]
         }
+        mock_collection.metadata = {'hnsw:space': 'cosine'}
         
         rag_service.client.get_collection.return_value = mock_collection
         
@@ -47,6 +49,162 @@ class TestRAGService:
         assert documents[1]['content'] == 'Document 2'
         assert documents[1]['similarity_score'] == 0.7  # 1 - 0.3
     
+    def test_retrieve_documents_legacy_l2_collection(self, rag_service):
+        """Test similarity is cosine also for collections created in L2 space"""
+        mock_collection = Mock()
+        mock_collection.query.return_value = {
+            'documents': [['Document 1']],
+            'metadatas': [[{}]],
+            'distances': [[0.2]]
+        }
+        mock_collection.metadata = None
+        
+        rag_service.client.get_collection.return_value = mock_collection
+        
+        documents = rag_service.retrieve_documents("test question", "test_chat_id")
+        
+        assert documents[0]['similarity_score'] == 0.9  # 1 - 0.2 / 2
+    
+    def test_retrieve_code_documents_filters_code_chunks(self, rag_service):
+        """Test code questions query only chunks with code in the language asked for"""
+        mock_collection = Mock()
+        mock_collection.query.return_value = {
+            'documents': [['```python\nimport os\n```']],
+            'metadatas': [[{'has_code': True, 'lang_python': True}]],
+            'distances': [[0.2]]
+        }
+        mock_collection.metadata = {'hnsw:space': 'cosine'}
+        rag_service.client.get_collection.return_value = mock_collection
+        
+        documents = rag_service.retrieve_code_documents("Ejemplo en Python", "test_chat_id")
+        
+        assert len(documents) == 1
+        kwargs = mock_collection.query.call_args.kwargs
+        assert kwargs['where'] == {'lang_python': True}
+        assert kwargs['n_results'] == 5
+    
+    def test_retrieve_code_documents_falls_back_without_metadata(self, rag_service):
+        """Test collections without code metadata are queried again without filter"""
+        empty = {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        found = {'documents': [['Document 1']], 'metadatas': [[{}]], 'distances': [[0.1]]}
+        mock_collection = Mock()
+        mock_collection.query.side_effect = [empty, found]
+        mock_collection.metadata = {'hnsw:space': 'cosine'}
+        rag_service.client.get_collection.return_value = mock_collection
+        
+        documents = rag_service.retrieve_code_documents("¿Cómo se usa el cliente?", "test_chat_id")
+        
+        assert [doc['content'] for doc in documents] == ['Document 1']
+        wheres = [call.kwargs.get('where') for call in mock_collection.query.call_args_list]
+        assert wheres == [{'has_code': True}, None]
+        rag_service.client.get_collection.assert_called_once()
+    
+    def test_code_filters(self):
+        """Test filters go from the languages in the question to no filter"""
+        assert code_filters("hola") == [{'has_code': True}, None]
+        assert code_filters("py o JS?") == [
+            {'$or': [{'lang_python': True}, {'lang_javascript': True}]}, {'has_code': True}, None
+        ]
+    
+    def test_text_store_collection_hydrates_final_results(self, rag_service):
+        """Test collections without texts in Chroma read them only for the returned chunks"""
+        mock_collection = Mock()
+        mock_collection.query.return_value = {
+            'ids': [['chunk_chat_4', 'chunk_chat_9']],
+            'documents': None,
+            'metadatas': [[{'content_hash': 'a'}, {'content_hash': 'b'}]],
+            'distances': [[0.1, 0.2]]
+        }
+        mock_collection.metadata = {'hnsw:space': 'cosine', 'text_store': True}
+        rag_service.client.get_collection.return_value = mock_collection
+        rag_service.text_store = Mock()
+        rag_service.text_store.get_many.return_value = ['Texto 4', None]
+        
+        documents = rag_service.retrieve_documents("test question", "chat")
+        
+        assert [doc['content'] for doc in documents] == ['Texto 4']
+        assert mock_collection.query.call_args.kwargs['include'] == ['metadatas', 'distances']
+        rag_service.text_store.get_many.assert_called_once_with("chat", ['chunk_chat_4', 'chunk_chat_9'])
+    
+    def test_merge_results_deduplicates_by_content_hash(self):
+        """Test duplicates are detected before their texts are read"""
+        documents = [
+            {'content': None, 'metadata': {'content_hash': 'a'}, 'similarity_score': 0.9},
+            {'content': None, 'metadata': {'content_hash': 'a'}, 'similarity_score': 0.8},
+            {'content': None, 'metadata': {'content_hash': 'b'}, 'similarity_score': 0.7},
+        ]
+        
+        assert [doc['similarity_score'] for doc in merge_results(documents, 5)] == [0.9, 0.7]
+    
+    def test_merge_results_without_hash_or_content(self):
+        """Test chunks with neither hash nor text are told apart by chat and chunk id"""
+        documents = [
+            {'content': None, 'chunk_id': 'chunk_a_0', 'metadata': {'chat_id': 'a'}, 'similarity_score': 0.9},
+            {'content': None, 'chunk_id': 'chunk_a_1', 'metadata': {'chat_id': 'a'}, 'similarity_score': 0.8},
+            {'content': None, 'chunk_id': 'chunk_a_0', 'metadata': {'chat_id': 'b'}, 'similarity_score': 0.7},
+            {'content': None, 'chunk_id': 'chunk_a_0', 'metadata': {'chat_id': 'a'}, 'similarity_score': 0.6},
+        ]
+        
+        assert [doc['similarity_score'] for doc in merge_results(documents, 5)] == [0.9, 0.8, 0.7]
+    
+    def _collection(self, documents, distances, delay=0.0):
+        collection = Mock()
+        collection.metadata = {'hnsw:space': 'cosine'}
+        
+        def query(**kwargs):
+            time.sleep(delay)
+            return {'documents': [documents], 'metadatas': [[{}] * len(documents)], 'distances': [distances]}
+        
+        collection.query.side_effect = query
+        return collection
+    
+    def test_retrieve_from_collections_merges_by_similarity(self, rag_service):
+        """Test results from several chats are merged under one top_k"""
+        collections = {
+            'chat_framework': self._collection(['F1', 'F2', 'shared'], [0.1, 0.5, 0.2]),
+            'chat_plugin': self._collection(['P1', 'shared'], [0.05, 0.3]),
+        }
+        rag_service.client.get_collection.side_effect = lambda name: collections[name]
+        
+        documents = rag_service.retrieve_from_collections("q", ["framework", "plugin"], top_k=3)
+        
+        assert [doc['content'] for doc in documents] == ['P1', 'F1', 'shared']
+        assert [doc['metadata']['chat_id'] for doc in documents] == ['plugin', 'framework', 'framework']
+        rag_service.embedding_model.encode.assert_called_once()
+    
+    def test_retrieve_from_collections_time_budget(self, rag_service):
+        """Test collections slower than the budget are skipped and the rest returned"""
+        collections = {
+            'chat_fast': self._collection(['fast'], [0.1]),
+            'chat_slow': self._collection(['slow'], [0.0], delay=1.0),
+            'chat_missing': None,
+        }
+        
+        def get_collection(name):
+            if collections[name] is None:
+                raise ValueError("Collection does not exist")
+            return collections[name]
+        
+        rag_service.client.get_collection.side_effect = get_collection
+        
+        start = time.perf_counter()
+        documents = rag_service.retrieve_from_collections("q", ["fast", "slow", "missing"], timeout=0.2)
+        
+        assert time.perf_counter() - start < 0.9
+        assert [doc['content'] for doc in documents] == ['fast']
+    
+    def test_merge_results_deduplicates_content(self):
+        """Test identical chunks from two collections appear once with the best score"""
+        documents = [
+            {'content': 'a', 'similarity_score': 0.5, 'metadata': {'chat_id': 'x'}},
+            {'content': 'a', 'similarity_score': 0.7, 'metadata': {'chat_id': 'y'}},
+            {'content': 'b', 'similarity_score': 0.6, 'metadata': {'chat_id': 'x'}},
+        ]
+        
+        merged = merge_results(documents, top_k=5)
+        
+        assert [(doc['content'], doc['metadata']['chat_id']) for doc in merged] == [('a', 'y'), ('b', 'x')]
+    
     def test_format_context_empty_documents(self, rag_service):
         """Test formatting context with empty documents"""
         context = rag_service.format_context([])
@@ -61,7 +219,7 @@ class TestRAGService:
             },
             {
                 'content': 'Test content 2',
-                'metadata': {'source_url': 'http://test2.com'}
+                'metadata': {'source_url': 'http://test2.com', 'heading_path': 'Guía > API'}
             }
         ]
         
@@ -72,4 +230,5 @@ class TestRAGService:
         assert 'Test content 1' in context
         assert 'Test content 2' in context
         assert 'http://test.com' in context
-        assert 'http://test2.com' in context 
\ No newline at end of file
+        assert 'http://test2.com' in context
+        assert 'Sección: Guía > API' in context 
\ No newline at end of file
@@ -0,0 +1,187 @@
+import hashlib
+import io
+import json
+import zipfile
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.config import settings
+from app.services.chunk_text_store import ChunkTextStore, content_hash
+from app.services.snapshots import (
+    EMBEDDINGS_FILE,
+    MANIFEST_FILE,
+    RECORDS_FILE,
+    SnapshotError,
+    export_snapshot,
+    import_snapshot,
+    read_snapshot,
+)
+from app.services.vector_store import EMBEDDING_MODEL_KEY, TEXT_STORE_KEY, ShardedVectorStore, index_metadata
+
+
+@pytest.fixture
+def store(tmp_path):
+    with patch("app.services.snapshots.collection_lifecycle"):
+        yield ShardedVectorStore([str(tmp_path)])
+
+
+def add_chat(store, chat_id, size=30, model=None):
+    embeddings = np.random.default_rng(0).normal(size=(size, 16)).astype(np.float32)
+    collection = store.create_collection(
+        f"chat_{chat_id}", metadata={**index_metadata(size), EMBEDDING_MODEL_KEY: model or settings.embedding_model}
+    )
+    collection.add(
+        ids=[f"chunk_{chat_id}_{i}" for i in range(size)],
+        embeddings=embeddings.tolist(),
+        documents=[f"chunk {i} con acentos: configuración" for i in range(size)],
+        metadatas=[{"source_url": "https://docs.example.com", "chunk_index": i, "has_code": i % 2 == 0} for i in range(size)]
+    )
+    return embeddings
+
+
+class TestSnapshots:
+    
+    def test_round_trip(self, store):
+        """Test a snapshot restores texts, metadata and embeddings into another chat"""
+        embeddings = add_chat(store, "origin")
+        snapshot = io.BytesIO()
+        
+        manifest = export_snapshot("origin", snapshot, store=store)
+        snapshot.seek(0)
+        imported = import_snapshot("copy", snapshot, store=store)
+        
+        assert manifest == imported
+        assert manifest["count"] == 30
+        assert manifest["dimension"] == 16
+        assert manifest["embedding_model"] == settings.embedding_model
+        assert manifest["source_url"] == "https://docs.example.com"
+        
+        copy = store.get_collection("chat_copy")
+        page = copy.get(include=["embeddings", "documents", "metadatas"])
+        order = np.argsort([metadata["chunk_index"] for metadata in page["metadatas"]])
+        assert np.allclose(np.asarray(page["embeddings"])[order], embeddings)
+        assert page["documents"][order[3]] == "chunk 3 con acentos: configuración"
+        assert page["metadatas"][order[2]]["has_code"] is True
+        assert copy.metadata[EMBEDDING_MODEL_KEY] == settings.embedding_model
+    
+    def test_import_replaces_existing_collection(self, store):
+        """Test importing over a chat replaces its previous chunks"""
+        add_chat(store, "origin", size=10)
+        add_chat(store, "target", size=50)
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        snapshot.seek(0)
+        
+        import_snapshot("target", snapshot, store=store)
+        
+        assert store.get_collection("chat_target").count() == 10
+    
+    def test_rejects_other_embedding_model(self, store):
+        """Test embeddings from another model are not loaded"""
+        add_chat(store, "origin", model="other/model")
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        snapshot.seek(0)
+        
+        with pytest.raises(SnapshotError, match="other/model"):
+            import_snapshot("copy", snapshot, store=store)
+        with pytest.raises(ValueError):
+            store.get_collection("chat_copy")
+    
+    def test_rejects_corrupted_snapshot(self, store):
+        """Test checksums detect modified embeddings"""
+        add_chat(store, "origin")
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        
+        tampered = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(snapshot.getvalue())) as source, zipfile.ZipFile(tampered, "w") as target:
+            for name in source.namelist():
+                data = source.read(name)
+                if name == EMBEDDINGS_FILE:
+                    data = data[:-4] + b"\x00\x00\x80\x3f"
+                target.writestr(name, data)
+        tampered.seek(0)
+        
+        with pytest.raises(SnapshotError, match="Checksum"):
+            read_snapshot(tampered)
+        with pytest.raises(SnapshotError):
+            read_snapshot(io.BytesIO(b"not a zip"))
+    
+    @pytest.mark.parametrize("manifest", [
+        [1, 2],
+        {"format": 1},
+        {"format": 1, "chat_id": "a", "embedding_model": "m", "source_url": "", "count": "10", "dimension": 16, "checksums": {}},
+        {"format": 1, "chat_id": "a", "embedding_model": "m", "source_url": "", "count": 10, "dimension": 16, "checksums": []},
+    ])
+    def test_rejects_malformed_manifest(self, store, manifest):
+        """Test manifests with a wrong shape are reported as invalid snapshots"""
+        add_chat(store, "origin", size=5)
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        
+        tampered = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(snapshot.getvalue())) as source, zipfile.ZipFile(tampered, "w") as target:
+            for name in source.namelist():
+                target.writestr(name, json.dumps(manifest) if name == MANIFEST_FILE else source.read(name))
+        tampered.seek(0)
+        
+        with pytest.raises(SnapshotError, match="manifest"):
+            read_snapshot(tampered)
+    
+    def test_rejects_records_without_text(self, store, tmp_path):
+        """Test records with a null document are rejected before reaching the text store"""
+        add_chat(store, "origin", size=3)
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        
+        tampered = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(snapshot.getvalue())) as source, zipfile.ZipFile(tampered, "w") as target:
+            records = source.read(RECORDS_FILE).replace(b'"document": "chunk 1', b'"document": null, "was": "chunk 1')
+            manifest = json.loads(source.read(MANIFEST_FILE))
+            manifest["checksums"][RECORDS_FILE] = hashlib.sha256(records).hexdigest()
+            target.writestr(MANIFEST_FILE, json.dumps(manifest))
+            target.writestr(EMBEDDINGS_FILE, source.read(EMBEDDINGS_FILE))
+            target.writestr(RECORDS_FILE, records)
+        tampered.seek(0)
+        
+        text_store = ChunkTextStore(str(tmp_path / "texts"))
+        with patch("app.services.snapshots.settings.chunk_text_store", True):
+            with pytest.raises(SnapshotError, match="records"):
+                import_snapshot("copy", tampered, store=store, text_store=text_store)
+        assert text_store.get_many("copy", ["chunk_copy_0"]) == [None]
+    
+    def test_manifest_is_readable_json(self, store):
+        """Test the manifest can be inspected without loading the snapshot"""
+        add_chat(store, "origin", size=5)
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        
+        with zipfile.ZipFile(snapshot) as archive:
+            manifest = json.loads(archive.read(MANIFEST_FILE))
+        
+        assert manifest["format"] == 1
+        assert set(manifest["checksums"]) == {"embeddings.npy", "records.jsonl"}
+    
+    def test_round_trip_with_text_store(self, store, tmp_path):
+        """Test snapshots move texts between Chroma and the chunk text store"""
+        add_chat(store, "origin", size=10)
+        text_store = ChunkTextStore(str(tmp_path / "texts"))
+        snapshot = io.BytesIO()
+        export_snapshot("origin", snapshot, store=store)
+        snapshot.seek(0)
+        
+        with patch("app.services.snapshots.settings.chunk_text_store", True):
+            import_snapshot("copy", snapshot, store=store, text_store=text_store)
+        copy = store.get_collection("chat_copy")
+        assert copy.metadata[TEXT_STORE_KEY]
+        assert copy.get(ids=["chunk_copy_3"])["documents"] == [None]
+        assert text_store.get_many("copy", ["chunk_copy_3"]) == ["chunk 3 con acentos: configuración"]
+        # El snapshot de origen no trae la huella: se calcula al importar
+        assert copy.get(ids=["chunk_copy_3"])["metadatas"][0]["content_hash"] == content_hash("chunk 3 con acentos: configuración")
+        
+        exported = io.BytesIO()
+        manifest = export_snapshot("copy", exported, store=store, text_store=text_store)
+        _, _, records = read_snapshot(io.BytesIO(exported.getvalue()))
+        assert manifest["count"] == 10
+        assert {record["document"] for record in records} == {f"chunk {i} con acentos: configuración" for i in range(10)}
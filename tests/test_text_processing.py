@@ -1,10 +1,17 @@
 import pytest
 from app.utils.text_processing import (
     clean_text,
+    clean_texts,
     extract_code_blocks,
+    extract_code_languages,
+    languages_in_question,
     is_code_like,
     split_into_sentences,
-    extract_keywords
+    iter_sentences,
+    iter_corpus_sentences,
+    extract_keywords,
+    extract_keywords_batch,
+    tfidf_keywords
 )
 
 
@@ -40,6 +47,17 @@ class TestTextProcessing:
         assert "def hello():" in code_blocks[0]
         assert "function test()" in code_blocks[1]
     
+    def test_extract_code_languages(self):
+        """Test code block languages are normalized and deduplicated"""
+        text = "```py\nimport os\n```\n\n```\nplain\n```\n\n```js\nlet a\n```\n\n```python\nx = 1\n```"
+        
+        assert extract_code_languages(text) == ["python", "javascript"]
+    
+    def test_languages_in_question(self):
+        """Test languages mentioned in a question"""
+        assert languages_in_question("¿Un ejemplo en Python o en TS?") == ["python", "typescript"]
+        assert languages_in_question("How do I go to the settings?") == []
+    
     def test_is_code_like(self):
         """Test code detection"""
         # Should be detected as code
@@ -74,4 +92,28 @@ class TestTextProcessing:
         # Should not include stop words
         assert "es" not in keywords
         assert "un" not in keywords
-        assert "de" not in keywords 
\ No newline at end of file
+        assert "de" not in keywords
+    
+    def test_batch_variants_match_single_calls(self):
+        """Test batch and generator variants give the same results as the single-text functions"""
+        texts = ["  Hola   mundo. ¿Qué tal?  ", "Python\x00 es popular! Python es rápido.", ""]
+        
+        assert list(clean_texts(texts)) == [clean_text(text) for text in texts]
+        assert list(iter_sentences(texts[1])) == split_into_sentences(texts[1])
+        assert list(iter_corpus_sentences(texts)) == [s for text in texts for s in split_into_sentences(text)]
+        assert list(extract_keywords_batch(texts, 3)) == [extract_keywords(text, 3) for text in texts]
+    
+    def test_tfidf_keywords(self):
+        """Test words present in every document rank below the distinctive ones"""
+        documents = [
+            "framework cliente cliente conexión",
+            "framework servidor puerto",
+            "framework cliente",
+        ]
+        
+        per_document, corpus = tfidf_keywords(documents, max_keywords=2)
+        
+        assert per_document[0] == ["cliente", "conexión"]
+        assert per_document[1] == ["puerto", "servidor"]
+        assert corpus[0] == "cliente"
+        assert tfidf_keywords([]) == ([], [])
@@ -0,0 +1,154 @@
+import pytest
+from unittest.mock import patch
+from app.services.collection_lifecycle import CollectionLifecycle
+from app.services.vector_store import (
+    HashRing,
+    ShardedVectorStore,
+    collection_name,
+    index_metadata,
+    is_missing_collection,
+    select_index_profile,
+)
+
+
+class RemoteClientStub:
+    """Cliente local que falla como ``HttpClient`` de chromadb 0.4.x: ``Exception`` con el cuerpo de la respuesta"""
+    
+    def __init__(self, client):
+        self._client = client
+    
+    def __getattr__(self, attribute):
+        method = getattr(self._client, attribute)
+        
+        def call(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except ValueError as e:
+                raise Exception(f'{{"error":"ValueError(\'{e}\')"}}') from None
+        return call
+
+
+def add_chat(store, chat_id, size=3):
+    store.create_collection(collection_name(chat_id), metadata={"chat": chat_id}).add(
+        ids=[f"{chat_id}_{i}" for i in range(size)],
+        embeddings=[[float(i), 1.0] for i in range(size)],
+        documents=[f"doc {i}" for i in range(size)]
+    )
+
+
+class TestHashRing:
+    
+    def test_keys_spread_across_nodes(self):
+        """Test every node owns a reasonable share of the keys"""
+        ring = HashRing(["a", "b", "c"])
+        owners = [ring.node_for(f"chat_{i}") for i in range(3000)]
+        
+        assert all(owners.count(node) > 600 for node in "abc")
+    
+    def test_adding_node_moves_only_its_share(self):
+        """Test adding a node only reassigns keys to the new node"""
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        keys = [f"chat_{i}" for i in range(3000)]
+        
+        moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+        
+        assert all(after.node_for(key) == "d" for key in moved)
+        assert len(moved) < len(keys) * 0.4
+
+
+class TestIndexProfiles:
+    
+    def test_auto_profile_by_size(self):
+        """Test the auto profile keeps small collections cheap and only large ones accurate"""
+        assert select_index_profile(100, "auto") == "fast"
+        assert select_index_profile(1000, "auto") == "fast"
+        assert select_index_profile(1001, "auto") == "balanced"
+        assert select_index_profile(50000, "auto") == "balanced"
+        assert select_index_profile(50001, "auto") == "accurate"
+        assert select_index_profile(1_000_000, "auto") == "accurate"
+        assert select_index_profile(1_000_000, "fast") == "fast"
+    
+    def test_index_metadata(self):
+        """Test collections are created in cosine space with the profile's HNSW parameters"""
+        metadata = index_metadata(10, profile="balanced", space="cosine")
+        
+        assert metadata == {
+            "hnsw:space": "cosine", "hnsw:M": 16, "hnsw:construction_ef": 200,
+            "hnsw:search_ef": 128, "index_profile": "balanced",
+        }
+        with pytest.raises(ValueError):
+            index_metadata(10, space="l2")
+
+
+class TestShardedVectorStore:
+    
+    @pytest.fixture
+    def shards(self, tmp_path):
+        return [str(tmp_path / "shard0"), str(tmp_path / "shard1")]
+    
+    def test_collections_live_on_their_shard(self, shards):
+        """Test a chat collection is created on the shard the ring assigns"""
+        store = ShardedVectorStore(shards)
+        for i in range(6):
+            add_chat(store, f"c{i}")
+        
+        for shard, names in store.collections_by_shard().items():
+            assert all(store.shard_for(name) == shard for name in names)
+        assert store.get_collection(collection_name("c3")).count() == 3
+    
+    def test_rebalance_after_adding_shard(self, shards):
+        """Test collections move to their new owner with their records and stay readable"""
+        chat_ids = [f"c{i}" for i in range(12)]
+        old = ShardedVectorStore(shards[:1])
+        for chat_id in chat_ids:
+            add_chat(old, chat_id)
+        store = ShardedVectorStore(shards)
+        
+        misplaced = store.misplaced()
+        # Antes de mover, la lectura encuentra la colección en su shard anterior
+        assert store.get_collection(misplaced[0][0]).count() == 3
+        
+        lifecycle = CollectionLifecycle(store=store)
+        with patch("app.services.collection_lifecycle.ingestion_registry") as registry:
+            registry.try_claim_chat.return_value = True
+            result = lifecycle.rebalance()
+        
+        assert len(result["moved"]) == len(misplaced) > 0
+        assert store.misplaced() == []
+        for chat_id in chat_ids:
+            collection = store.get_collection(collection_name(chat_id))
+            assert collection.count() == 3
+            assert collection.metadata == {"chat": chat_id}
+        assert sorted(lifecycle.list_chat_ids()) == sorted(chat_ids)
+    
+    def test_only_missing_collection_errors_are_missing(self):
+        """Test other Chroma ValueErrors are not mistaken for a missing collection"""
+        assert is_missing_collection(ValueError("Collection chat_a does not exist."))
+        assert is_missing_collection(Exception('{"error":"ValueError(\'Collection chat_a does not exist.\')"}'))
+        assert not is_missing_collection(ValueError("Expected metadata value to be a str, int, float or bool"))
+        assert not is_missing_collection(Exception("Embedding dimension 16 does not match collection dimensionality 32"))
+    
+    def test_remote_shards_missing_collection(self, shards):
+        """Test HttpClient errors for missing collections fall through to the other shards"""
+        remote = ["http://chroma-0:8000", "http://chroma-1:8000"]
+        local = ShardedVectorStore(shards)
+        store = ShardedVectorStore(remote)
+        clients = {shard: RemoteClientStub(local.client(path)) for shard, path in zip(remote, shards)}
+        
+        with patch.object(ShardedVectorStore, "client", lambda self, shard: clients[shard]):
+            # c0 se crea en el primer shard, pero su dueño es el segundo
+            add_chat(ShardedVectorStore(remote[:1]), "c0")
+            name = collection_name("c0")
+            assert store.shard_for(name) == remote[1]
+            
+            assert store.get_collection(name).count() == 3
+            assert store.move_collection(name, remote[0], remote[1]) == 3
+            assert store.misplaced() == []
+            assert store.get_collection(name).count() == 3
+            
+            store.delete_collection(name)
+            with pytest.raises(ValueError):
+                store.get_collection(name)
+            with pytest.raises(ValueError):
+                store.delete_collection(name)
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from app.services.warmup import ComponentUnavailableError, LazyComponent, readiness, warm_up
+
+
+class TestLazyComponent:
+    
+    @pytest.mark.asyncio
+    async def test_builds_once_under_concurrent_gets(self):
+        """Test concurrent first uses share a single initialization"""
+        calls = []
+        component = LazyComponent("model", lambda: calls.append(1) or object())
+        
+        first, second = await asyncio.gather(component.get(), component.get())
+        
+        assert first is second
+        assert len(calls) == 1
+        assert component.ready
+    
+    @pytest.mark.asyncio
+    async def test_failure_is_reported_and_retried(self):
+        """Test a failed initialization is visible and retried on next use"""
+        attempts = []
+        
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("database down")
+            return "engine"
+        
+        component = LazyComponent("database", factory)
+        with pytest.raises(ComponentUnavailableError):
+            await component.get()
+        
+        assert component.status()["state"] == "failed"
+        assert "database down" in component.status()["error"]
+        assert await component.get() == "engine"
+        assert component.ready
+    
+    @pytest.mark.asyncio
+    async def test_warm_up_retries_until_ready(self):
+        """Test background warm-up keeps retrying failing components"""
+        attempts = []
+        
+        def factory():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("not yet")
+            return "ok"
+        
+        components = [LazyComponent("database", factory), LazyComponent("agent", lambda: "agent")]
+        assert readiness(components)["ready"] is False
+        
+        await asyncio.wait_for(warm_up(components, retry_seconds=0.01), timeout=2)
+        
+        state = readiness(components)
+        assert state["ready"] is True
+        assert set(state["components"]) == {"database", "agent"}